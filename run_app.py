@@ -1,9 +1,26 @@
 """Entry launcher that imports the `app` package cleanly and runs the GUI.
 
 Using a package-style import ensures that `app` is available when frozen by PyInstaller.
+
+`--startup-profile` prints a JSON line with the time spent importing the GUI,
+building the window and reaching the first paint, then exits. Combine it with
+`python -X importtime run_app.py --startup-profile` to see which imports cost
+the most, and `--startup-budget MS` to fail when time-to-first-window exceeds
+the budget (useful with QT_QPA_PLATFORM=offscreen in CI).
+
+`--attach [URL]` connects the window to a running download daemon
+(`python src/cli/main.py serve`) instead of starting its own workers; without
+URL the daemon is looked up in the data folder.
 """
+import time
+_T0 = time.perf_counter()
+
+import argparse
+import json
+import multiprocessing
 import sys
 from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QObject, QEvent, QTimer
 
 try:
     from app.windows.main_window import MainWindow
@@ -11,13 +28,78 @@ except Exception:
     # fallback: try relative import if running unpacked
     from src.app.windows.main_window import MainWindow
 
+_T_IMPORTED = time.perf_counter()
+
+
+class _FirstPaint(QObject):
+    """Event filter que llama a `callback` la primera vez que se pinta la ventana."""
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.callback is not None:
+            callback, self.callback = self.callback, None
+            QTimer.singleShot(0, callback)
+        return False
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--startup-profile", action="store_true")
+    parser.add_argument("--startup-budget", type=float, metavar="MS")
+    parser.add_argument("--attach", nargs="?", const="auto", metavar="URL")
+    return parser.parse_known_args(argv)[0]
+
+
+def _daemon(url):
+    try:
+        from app.core.remote import DaemonClient, DaemonError, find_daemon
+    except Exception:
+        from src.app.core.remote import DaemonClient, DaemonError, find_daemon
+    if url == "auto":
+        client = find_daemon()
+    else:
+        client = DaemonClient(url)
+        try:
+            client.health()
+        except (OSError, DaemonError):
+            client = None
+    if client is None:
+        sys.exit("No running VideoLeech daemon found; start one with 'python src/cli/main.py serve'")
+    return client
+
 
 def main():
+    args = _parse_args(sys.argv[1:])
     app = QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(daemon=_daemon(args.attach) if args.attach else None)
+    t_built = time.perf_counter()
+
+    def _on_first_paint():
+        t_painted = time.perf_counter()
+        if args.startup_profile or args.startup_budget is not None:
+            report = {
+                "import_ms": round((_T_IMPORTED - _T0) * 1000, 1),
+                "window_ms": round((t_built - _T_IMPORTED) * 1000, 1),
+                "first_window_ms": round((t_painted - _T0) * 1000, 1),
+                "yt_dlp_loaded": "yt_dlp" in sys.modules,
+            }
+            print(json.dumps(report), file=sys.stderr)
+            over = args.startup_budget is not None and report["first_window_ms"] > args.startup_budget
+            app.exit(1 if over else 0)
+            return
+        from app.core.session import prewarm
+        prewarm()
+
+    window._first_paint = _FirstPaint(_on_first_paint)
+    window.installEventFilter(window._first_paint)
     window.show()
     sys.exit(app.exec())
 
 
 if __name__ == '__main__':
+    # los procesos de descarga (app.core.procpool) arrancan este mismo ejecutable cuando está congelado
+    multiprocessing.freeze_support()
     main()
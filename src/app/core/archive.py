@@ -0,0 +1,200 @@
+"""Archivo indexado de descargas ya realizadas (SQLite).
+
+Guarda extractor + id + tipo (video/audio) + perfil -> ruta, tamaño,
+formato, fecha y huella del fichero (`integrity.py`, calculada al descargar).
+El perfil es lo que pidió el trabajo (`DownloadJob.profile`: calidad de
+vídeo o formato de audio), así otra calidad u otro formato no cuentan como
+ya descargados.
+Antes de extraer nada se comprueba si el id se puede deducir de la URL y si
+el fichero registrado sigue en disco y dentro de la carpeta del trabajo; en
+ese caso el trabajo se omite sin tocar la red. Lo comparten la GUI y la CLI.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from .cache import url_video_id
+from .paths import user_data_dir
+
+MEDIA_EXTS = {".mp4", ".mkv", ".webm", ".mov", ".avi", ".flv", ".m4a", ".mp3", ".opus", ".ogg", ".aac", ".flac", ".wav"}
+AUDIO_EXTS = {".m4a", ".mp3", ".opus", ".ogg", ".aac", ".flac", ".wav"}
+
+# formatos de audio que se reconocen por la extensión al reindexar (ver `jobs.AUDIO_FORMATS`)
+AUDIO_PROFILES = {".mp3": "mp3", ".m4a": "m4a", ".opus": "opus"}
+
+# atributo extendido estándar con la URL de origen (Linux)
+ORIGIN_XATTR = "user.xdg.origin.url"
+
+
+def output_path(info: dict) -> str | None:
+    """Ruta final de la descarga, tras merge y postprocesado."""
+    downloads = info.get("requested_downloads") or []
+    if downloads and downloads[-1].get("filepath"):
+        return downloads[-1]["filepath"]
+    return info.get("filepath") or info.get("_filename")
+
+
+class DownloadArchive:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else user_data_dir() / "archive.sqlite3"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(items)")}
+        if columns and "profile" not in columns:
+            # archivos anteriores al perfil: sus entradas quedan con perfil desconocido ("")
+            # y no bastan para omitir un trabajo
+            self._db.execute("ALTER TABLE items RENAME TO items_old")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " extractor TEXT NOT NULL, video_id TEXT NOT NULL, kind TEXT NOT NULL, profile TEXT NOT NULL DEFAULT '',"
+            " path TEXT NOT NULL, size INTEGER, format TEXT, downloaded REAL NOT NULL, digest TEXT,"
+            " PRIMARY KEY (extractor, video_id, kind, profile))"
+        )
+        if columns and "profile" not in columns:
+            digest = "digest" if "digest" in columns else "NULL"
+            self._db.execute(
+                "INSERT OR IGNORE INTO items (extractor, video_id, kind, path, size, format, downloaded, digest)"
+                f" SELECT extractor, video_id, kind, path, size, format, downloaded, {digest} FROM items_old"
+            )
+            self._db.execute("DROP TABLE items_old")
+        self._db.commit()
+
+    def lookup(self, extractor: str, video_id: str, kind: str, profile: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, size, format, downloaded, digest FROM items"
+                " WHERE extractor=? AND video_id=? AND kind=? AND profile=?",
+                (extractor.lower(), video_id, kind, profile),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"path": row[0], "size": row[1], "format": row[2], "downloaded": row[3], "digest": row[4]}
+
+    def find_url(self, url: str, kind: str, profile: str, directory=None) -> dict | None:
+        """Entrada del archivo para `url` si su fichero sigue en disco.
+
+        Solo usa el id deducible de la URL (sin red). Con `directory`, el
+        fichero tiene que estar dentro de esa carpeta. Las entradas cuyo
+        fichero ha desaparecido se eliminan.
+        """
+        found = url_video_id(url)
+        if not found or not found[1]:
+            return None
+        entry = self.lookup(found[0], found[1], kind, profile)
+        if entry is None:
+            return None
+        if not os.path.exists(entry["path"]):
+            self.remove(found[0], found[1], kind, profile)
+            return None
+        if directory is not None and not Path(entry["path"]).resolve().is_relative_to(Path(directory).resolve()):
+            return None
+        return entry
+
+    def add(self, extractor: str, video_id: str, kind: str, path: str, size: int | None = None, fmt: str | None = None,
+            downloaded: float | None = None, digest: str | None = None, profile: str = ""):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO items (extractor, video_id, kind, profile, path, size, format, downloaded, digest)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (extractor.lower(), video_id, kind, profile, str(path), size, fmt, downloaded or time.time(), digest),
+            )
+            self._db.commit()
+
+    def record(self, info: dict, kind: str, profile: str, url: str | None = None):
+        """Registrar una descarga terminada a partir de su info de yt_dlp."""
+        path = output_path(info)
+        if not path or not info.get("id") or not info.get("extractor_key"):
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        self.add(info["extractor_key"], info["id"], kind, path, size, info.get("format_id"), digest=info.get("digest"),
+                 profile=profile)
+        origin = url or info.get("webpage_url")
+        if origin and hasattr(os, "setxattr"):
+            try:
+                os.setxattr(path, ORIGIN_XATTR, origin.encode("utf-8"))
+            except OSError:
+                pass
+
+    def remove(self, extractor: str, video_id: str, kind: str, profile: str):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM items WHERE extractor=? AND video_id=? AND kind=? AND profile=?",
+                (extractor.lower(), video_id, kind, profile),
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def rebuild(self, directory) -> int:
+        """Reindexar los ficheros de `directory` (recursivo).
+
+        El id se obtiene de un `.info.json` junto al fichero o del atributo
+        extendido con la URL de origen. La calidad con que se pidió un vídeo no
+        queda en el fichero: se registra como la máxima ("best"); el audio
+        toma el formato de la extensión. Devuelve el número de entradas añadidas.
+        """
+        added = 0
+        for path in Path(directory).rglob("*"):
+            if path.suffix.lower() not in MEDIA_EXTS or not path.is_file():
+                continue
+            ident = _identify(path)
+            if ident is None:
+                continue
+            ext = path.suffix.lower()
+            kind = "audio" if ext in AUDIO_EXTS else "video"
+            profile = AUDIO_PROFILES.get(ext, "original") if kind == "audio" else "best"
+            stat = path.stat()
+            self.add(ident[0], ident[1], kind, str(path), stat.st_size, ident[2], stat.st_mtime, profile=profile)
+            added += 1
+        return added
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _identify(path: Path) -> tuple[str, str, str | None] | None:
+    sidecar = path.with_suffix(".info.json")
+    if sidecar.exists():
+        try:
+            data = json.loads(sidecar.read_text(encoding="utf-8"))
+            if data.get("extractor_key") and data.get("id"):
+                return data["extractor_key"], data["id"], data.get("format_id")
+        except Exception:
+            pass
+    if hasattr(os, "getxattr"):
+        try:
+            origin = os.getxattr(str(path), ORIGIN_XATTR).decode("utf-8")
+        except OSError:
+            origin = None
+        found = url_video_id(origin) if origin else None
+        if found and found[1]:
+            return found[0], found[1], None
+    return None
+
+
+_default_archive: DownloadArchive | None = None
+_default_lock = threading.Lock()
+
+
+def get_archive() -> DownloadArchive | None:
+    """Archivo compartido del proceso; None si no se puede abrir."""
+    global _default_archive
+    with _default_lock:
+        if _default_archive is None:
+            try:
+                _default_archive = DownloadArchive()
+            except Exception as exc:
+                print("Download archive disabled:", exc, file=sys.stderr)
+                return None
+        return _default_archive
@@ -0,0 +1,285 @@
+"""Ajuste automático de la concurrencia: fragmentos por descarga y trabajos a la vez.
+
+Ningún valor fijo sirve para todos los enlaces: contra un CDN rápido cada
+conexión de más suma ancho de banda, contra un servidor que limita por IP
+solo añade esperas y errores 429/503. `AIMD` busca el nivel útil como el
+control de congestión de TCP:
+
+- si en la última medida hubo errores, el nivel se multiplica por
+  `backoff` (disminución multiplicativa; 3/4 en vez de la mitad de TCP,
+  porque aquí el nivel es pequeño y la mitad lo hunde hasta 1);
+- si no, sube un paso (aumento aditivo) y se compara el caudal conseguido
+  con el de antes de subir: si no mejora al menos `min_gain`, se deshace el
+  paso y se espera `hold` medidas antes de volver a probar (meseta: el
+  cuello de botella está en otro sitio).
+
+`Autotuner` aplica el controlador a dos niveles:
+
+- fragmentos por descarga: un controlador por dominio y tipo de descarga
+  ("fragments" = `concurrent_fragment_downloads` de HLS/DASH nativos,
+  "segments" = conexiones de la descarga segmentada, ver `segmented.py`).
+  Cada trabajo recibe un `TuneTicket` que fija el nivel al empezar cada
+  descarga y al terminar informa de bytes, segundos y reintentos;
+- trabajos simultáneos de un `DownloadManager` (`attach`): cada `interval`
+  segundos mide el caudal agregado de los eventos de progreso y los
+  reintentos, y cambia `max_workers` dentro de los límites. Solo sube si hay
+  trabajos esperando hilo.
+
+Cada decisión queda en `decisions()`, se avisa a los oyentes y se refleja
+en la métrica `videoleech_autotune_level`.
+"""
+import sys
+import threading
+import time
+from collections import deque
+
+from .metrics import get_metrics
+from .progress import Phase
+from .scheduler import host_key
+
+# límites por defecto del nivel de fragmentos/conexiones y del de trabajos
+FRAGMENT_RANGE = (1, 16)
+JOB_RANGE = (1, 16)
+# nivel inicial de fragmentos por descarga HLS/DASH
+DEFAULT_FRAGMENTS = 4
+# segundos entre ajustes del número de trabajos
+TUNE_INTERVAL = 2.0
+# reintentos por trabajo en curso y periodo a partir de los que se reduce el número de trabajos
+MAX_ERROR_RATE = 1.0
+
+# protocolos que descarga el FragmentFD de yt_dlp (los que usan `concurrent_fragment_downloads`)
+FRAGMENT_PROTOCOLS = {"m3u8_native", "http_dash_segments", "http_dash_segments_generator", "ism", "f4m"}
+
+
+class AIMD:
+    """Nivel de concurrencia con aumento aditivo y disminución multiplicativa."""
+
+    def __init__(self, low: int, high: int, start: int | None = None, step: int = 1, backoff: float = 0.75,
+                 min_gain: float = 0.1, hold: int = 3):
+        self.low = max(1, int(low))
+        self.high = max(self.low, int(high))
+        self.level = min(self.high, max(self.low, int(start if start is not None else self.low)))
+        self.step = step
+        self.backoff = backoff
+        self.min_gain = min_gain
+        self.hold = hold
+        # caudal antes del último aumento, mientras se evalúa
+        self._baseline: float | None = None
+        self._holding = 0
+
+    def update(self, rate: float, congested: bool = False, demand: bool = True) -> str | None:
+        """Anotar una medida; devuelve el motivo si el nivel cambia ("errors", "plateau", "increase")."""
+        previous = self.level
+        reason = None
+        if congested:
+            self.level = max(self.low, min(self.level - 1, int(self.level * self.backoff)))
+            self._baseline = None
+            self._holding = self.hold
+            reason = "errors"
+        elif self._baseline is not None and rate < self._baseline * (1 + self.min_gain):
+            # el último paso no rindió: deshacerlo y esperar antes de volver a probar
+            self.level = max(self.low, self.level - self.step)
+            self._baseline = None
+            self._holding = self.hold
+            reason = "plateau"
+        elif self._holding:
+            self._holding -= 1
+            self._baseline = None
+        elif demand and self.level < self.high:
+            self._baseline = rate
+            self.level = min(self.high, self.level + self.step)
+            reason = "increase"
+        else:
+            self._baseline = None
+        return reason if self.level != previous else None
+
+
+class TuneTicket:
+    """Nivel de fragmentos de un trabajo; se guarda en `params['autotune']` del `YoutubeDL` prestado."""
+
+    def __init__(self, tuner: "Autotuner", host: str):
+        self.tuner = tuner
+        self.host = host
+        self._download: tuple[str, int, float] | None = None
+        self._retries = 0
+
+    def begin(self, kind: str, default: int) -> int:
+        """Empieza una descarga de tipo `kind`; devuelve el nivel a usar."""
+        level = self.tuner.level(self.host, kind, default)
+        self._download = (kind, level, time.monotonic())
+        self._retries = 0
+        return level
+
+    def retry(self):
+        self._retries += 1
+        self.tuner.note_errors(1)
+
+    def end(self, nbytes: int, failed: bool = False):
+        if self._download is None:
+            return
+        kind, level, started = self._download
+        self._download = None
+        self.tuner.observe(self.host, kind, level, nbytes, time.monotonic() - started,
+                           errors=self._retries + (1 if failed else 0))
+
+
+class Autotuner:
+    def __init__(self, fragments: tuple[int, int] = FRAGMENT_RANGE, jobs: tuple[int, int] = JOB_RANGE,
+                 interval: float = TUNE_INTERVAL, max_error_rate: float = MAX_ERROR_RATE, enabled: bool = True):
+        self.fragments = fragments
+        self.jobs = jobs
+        self.interval = interval
+        self.max_error_rate = max_error_rate
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # (dominio, tipo) -> controlador de fragmentos/conexiones
+        self._hosts: dict[tuple[str, str], AIMD] = {}
+        self._decisions: deque = deque(maxlen=200)
+        self._listeners = []
+        # control del número de trabajos
+        self._manager = None
+        self._jobs_ctl: AIMD | None = None
+        self._stop: threading.Event | None = None
+        self._bytes = 0
+        self._errors = 0
+        self._seen: dict[str, tuple[str | None, int]] = {}
+        self._levels = get_metrics().gauge("videoleech_autotune_level", "Concurrency chosen by the autotuner")
+
+    # ---- decisiones ----------------------------------------------------
+    def add_listener(self, listener):
+        """`listener(decision)` por cada cambio de nivel (desde hilos de trabajo)."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def decisions(self) -> list[dict]:
+        with self._lock:
+            return list(self._decisions)
+
+    def _decide(self, kind: str, host: str | None, before: int, after: int, reason: str, rate: float, errors: int):
+        decision = {"time": round(time.time(), 3), "kind": kind, "host": host, "from": before, "to": after,
+                    "reason": reason, "rate": int(rate), "errors": errors}
+        with self._lock:
+            self._decisions.append(decision)
+        self._levels.set(after, kind=kind, **({"host": host} if host else {}))
+        for listener in list(self._listeners):
+            try:
+                listener(decision)
+            except Exception as exc:
+                print("Autotune listener error:", exc, file=sys.stderr)
+
+    # ---- fragmentos por descarga ---------------------------------------
+    def ticket(self, url: str) -> TuneTicket | None:
+        """Ticket para un trabajo, o None si el ajuste está desactivado."""
+        return TuneTicket(self, host_key(url)) if self.enabled else None
+
+    def level(self, host: str, kind: str, default: int) -> int:
+        with self._lock:
+            ctl = self._hosts.get((host, kind))
+            if ctl is None:
+                ctl = self._hosts[(host, kind)] = AIMD(*self.fragments, start=default, hold=2)
+            return ctl.level
+
+    def observe(self, host: str, kind: str, level: int, nbytes: int, seconds: float, errors: int = 0):
+        """Resultado de una descarga hecha con `level` fragmentos/conexiones."""
+        if seconds <= 0 or (not nbytes and not errors):
+            return
+        rate = nbytes / seconds
+        with self._lock:
+            ctl = self._hosts.get((host, kind))
+            # otra descarga del mismo dominio ya cambió el nivel: esta medida es de otro nivel
+            if ctl is None or ctl.level != level:
+                return
+            before = ctl.level
+            reason = ctl.update(rate, congested=errors > 0)
+            after = ctl.level
+        if reason:
+            self._decide(kind, host, before, after, reason, rate, errors)
+
+    # ---- trabajos simultáneos ------------------------------------------
+    def attach(self, manager, low: int | None = None, high: int | None = None):
+        """Ajustar `manager.max_workers` entre `low` y `high` (por defecto `jobs`)."""
+        self.detach()
+        low = low if low is not None else self.jobs[0]
+        high = high if high is not None else self.jobs[1]
+        self._manager = manager
+        self._jobs_ctl = AIMD(low, high, start=manager.max_workers)
+        if self._jobs_ctl.level != manager.max_workers:
+            manager.set_max_workers(self._jobs_ctl.level)
+        with self._lock:
+            self._bytes = self._errors = 0
+            self._seen.clear()
+        manager.add_listener(self._on_event)
+        self._stop = threading.Event()
+        threading.Thread(target=self._loop, args=(self._stop,), name="autotune", daemon=True).start()
+
+    def detach(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self._manager is not None:
+            self._manager.remove_listener(self._on_event)
+            self._manager = None
+
+    def note_errors(self, count: int):
+        with self._lock:
+            self._errors += count
+
+    def _on_event(self, job_id: str, event: str, payload):
+        if event == "progress":
+            if payload.phase == Phase.RETRYING:
+                self.note_errors(1)
+            elif payload.phase == Phase.DOWNLOADING and payload.downloaded_bytes is not None:
+                # los bytes de yt_dlp son acumulados por fichero: sumar solo la diferencia
+                with self._lock:
+                    name, seen = self._seen.get(job_id, (None, 0))
+                    if payload.filename != name:
+                        seen = 0
+                    self._bytes += max(0, payload.downloaded_bytes - seen)
+                    self._seen[job_id] = (payload.filename, payload.downloaded_bytes)
+        elif event == "state" and payload != "running":
+            with self._lock:
+                self._seen.pop(job_id, None)
+
+    def _loop(self, stop: threading.Event):
+        last = time.monotonic()
+        while not stop.wait(self.interval):
+            now = time.monotonic()
+            self.tick(now - last)
+            last = now
+
+    def tick(self, elapsed: float):
+        """Una medida del caudal agregado y, si procede, un ajuste de `max_workers`."""
+        manager, ctl = self._manager, self._jobs_ctl
+        if manager is None or ctl is None or elapsed <= 0:
+            return
+        with self._lock:
+            nbytes, errors = self._bytes, self._errors
+            self._bytes = self._errors = 0
+        stats = manager.stats()["download"]
+        if not nbytes and not errors:
+            # sin actividad no hay nada que medir
+            return
+        rate = nbytes / elapsed
+        demand = stats["queued"] > 0 and stats["running"] >= stats["workers"]
+        congested = errors / max(1, stats["running"]) > self.max_error_rate
+        before = ctl.level
+        reason = ctl.update(rate, congested=congested, demand=demand)
+        if reason:
+            manager.set_max_workers(ctl.level)
+            self._decide("jobs", None, before, ctl.level, reason, rate, errors)
+
+
+_default_tuner: Autotuner | None = None
+_default_lock = threading.Lock()
+
+
+def get_autotuner() -> Autotuner:
+    """Autotuner compartido por el proceso (cada proceso hijo de `procpool` tiene el suyo)."""
+    global _default_tuner
+    with _default_lock:
+        if _default_tuner is None:
+            _default_tuner = Autotuner()
+        return _default_tuner
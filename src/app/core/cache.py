@@ -0,0 +1,223 @@
+"""Caché persistente (SQLite) de los resultados de `extract_info`.
+
+Las entradas se indexan por extractor + id del vídeo cuando yt_dlp puede
+deducirlo de la URL, o por la URL normalizada en otro caso. Cada entrada
+caduca al cumplirse el TTL o antes, si las URLs de los formatos llevan una
+marca de expiración (p. ej. `expire=` en googlevideo). El tamaño total está
+acotado y se expulsan primero las entradas usadas hace más tiempo (LRU).
+
+La info cacheada es el resultado *sin procesar* del extractor; se pasa a
+`process_ie_result`, que hace la selección de formato y la descarga sin
+volver a pedir la página ni la API.
+"""
+import functools
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .paths import user_cache_dir
+from .retry import classify
+
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# margen antes de la expiración real de las URLs de formato
+EXPIRY_MARGIN = 120
+
+_TRACKING_PARAMS = {"si", "feature", "fbclid", "gclid", "pp"}
+_EXPIRE_RE = re.compile(r"[?&/](?:expire|expires|exp)[=/](\d{9,11})", re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """Quitar fragmento y parámetros de tracking, ordenar la query."""
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _TRACKING_PARAMS and not k.startswith("utm_")
+    ]
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/") or "/", urlencode(sorted(query)), ""))
+
+
+@functools.lru_cache(maxsize=1)
+def extractor_classes():
+    """Registro de extractores de yt_dlp (importa yt_dlp la primera vez)."""
+    from yt_dlp.extractor import gen_extractor_classes
+    return tuple(gen_extractor_classes())
+
+
+@functools.lru_cache(maxsize=4096)
+def url_video_id(url: str) -> tuple[str, str | None] | None:
+    """(extractor, id) deducidos de la URL sin red; id es None si no se puede."""
+    try:
+        for ie in extractor_classes():
+            if ie.ie_key() == "Generic" or not ie.suitable(url):
+                continue
+            return ie.ie_key(), ie.get_temp_id(url)
+    except Exception:
+        pass
+    return None
+
+
+def cache_key(url: str) -> str:
+    """`extractor:id` si el id se deduce de la URL; si no, la URL normalizada."""
+    found = url_video_id(url)
+    if found and found[1]:
+        return f"{found[0]}:{found[1]}"
+    if found:
+        return f"{found[0]}:{normalize_url(url)}"
+    return f"Generic:{normalize_url(url)}"
+
+
+def formats_expire_at(info: dict) -> float | None:
+    """Menor marca de expiración encontrada en las URLs de los formatos."""
+    expiries = []
+    for fmt in info.get("formats") or []:
+        for key in ("url", "manifest_url", "fragment_base_url"):
+            m = _EXPIRE_RE.search(fmt.get(key) or "")
+            if m:
+                expiries.append(int(m.group(1)))
+    return min(expiries) if expiries else None
+
+
+def is_cacheable(info: dict | None) -> bool:
+    # playlists y redirecciones contienen generadores o se resuelven aparte
+    return bool(info) and info.get("_type", "video") == "video" and bool(info.get("formats") or info.get("url"))
+
+
+class InfoCache:
+    def __init__(self, path=None, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else user_cache_dir() / "info_cache.sqlite3"
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            " key TEXT PRIMARY KEY, extractor TEXT, data BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, expires REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS info_lru ON info(last_access)")
+        self._db.commit()
+
+    def get(self, url: str) -> dict | None:
+        if not self.enabled:
+            return None
+        key = cache_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT data, expires FROM info WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                # caducada: se refresca de forma perezosa en la próxima extracción
+                self._db.execute("DELETE FROM info WHERE key=?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE info SET last_access=? WHERE key=?", (now, key))
+            self._db.commit()
+        try:
+            return json.loads(zlib.decompress(row[0]))
+        except Exception:
+            self.invalidate(url)
+            return None
+
+    def put(self, url: str, info: dict):
+        if not self.enabled or not is_cacheable(info):
+            return
+        now = time.time()
+        expires = now + self.ttl
+        fmt_expiry = formats_expire_at(info)
+        if fmt_expiry is not None:
+            expires = min(expires, fmt_expiry - EXPIRY_MARGIN)
+        if expires <= now:
+            return
+        data = zlib.compress(json.dumps(info).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO info VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(url), info.get("extractor_key"), data, len(data), now, expires, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def invalidate(self, url: str):
+        with self._lock:
+            self._db.execute("DELETE FROM info WHERE key=?", (cache_key(url),))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM info")
+            self._db.commit()
+
+    def _evict(self):
+        # llamado con el lock tomado
+        self._db.execute("DELETE FROM info WHERE expires<=?", (time.time(),))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM info").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM info ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM info WHERE key=?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# respuestas de una URL de formato caducada: la info cacheada ya no sirve
+EXPIRED_STATUS = frozenset({403, 410})
+
+
+def extract_with_cache(ydl, url: str, cache: InfoCache | None, download: bool = True) -> dict | None:
+    """`extract_info` que reutiliza la info cacheada si existe.
+
+    Si la descarga con info cacheada falla con 403/410 (URLs de formato
+    caducadas), se invalida la entrada y se extrae de nuevo. Cualquier otro
+    error se propaga: de los fallos pasajeros ya se ocupa `RetryPolicy`.
+    """
+    if cache is None or not cache.enabled:
+        return ydl.extract_info(url, download=download)
+
+    cached = cache.get(url)
+    if cached is not None:
+        try:
+            return ydl.process_ie_result(cached, download=download)
+        except Exception as exc:
+            if classify(exc).status not in EXPIRED_STATUS:
+                raise
+            cache.invalidate(url)
+
+    raw = ydl.extract_info(url, download=False, process=False)
+    if is_cacheable(raw):
+        cache.put(url, ydl.sanitize_info(raw))
+    return ydl.process_ie_result(raw, download=download)
+
+
+_default_cache: InfoCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_info_cache() -> InfoCache | None:
+    """Caché compartida del proceso; None si no se puede abrir."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = InfoCache()
+            except Exception as exc:
+                print("Info cache disabled:", exc, file=sys.stderr)
+                return None
+        return _default_cache
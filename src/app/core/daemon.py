@@ -0,0 +1,508 @@
+"""Demonio de descargas con API HTTP/JSON local (`main.py serve`).
+
+Un proceso de larga vida con yt_dlp ya cargado, un único `DownloadEngine` y,
+por tanto, una sola cola, caché, archivo, diario y tope de ancho de banda
+para todos los productores. El servidor HTTP corre en el bucle asyncio del
+motor; las descargas, en sus hilos o procesos.
+
+    GET    /api/health                 estado del demonio
+    GET    /api/jobs?state=a,b         lista de trabajos
+    POST   /api/jobs                   enviar un trabajo ({"url": ...}) o varios ({"jobs": [...]})
+    GET    /api/jobs/<id>              un trabajo
+    DELETE /api/jobs/<id>              cancelarlo (también POST /api/jobs/<id>/cancel)
+    GET    /api/events[?job=<id>]      progreso por Server-Sent Events
+    GET    /api/stats                  colas y tiempos (`DownloadManager.stats`)
+    GET    /api/settings               concurrencia y tope de ancho de banda
+    PUT    /api/settings               cambiarlos
+
+Un trabajo enviado con un `id` que ya existe no se duplica: se devuelve el
+existente, así un productor puede reintentar el envío sin miedo.
+
+Por defecto solo escucha en 127.0.0.1. Para que una página web no pueda
+usarlo desde el navegador, las peticiones con cuerpo deben ser
+`application/json` (el navegador exige entonces una consulta CORS que no se
+responde) y la cabecera Host debe ser local. Con `token` se exige además
+`Authorization: Bearer <token>`, y es obligatorio si se escucha en otra
+interfaz. La dirección queda en `daemon.json` de la carpeta de datos para
+que la GUI y otros clientes lo encuentren (ver `remote.py`).
+"""
+import asyncio
+import dataclasses
+import hmac
+import json
+import os
+import re
+import signal
+import sys
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .jobs import AUDIO_FORMATS, DownloadJob, JobState, Priority
+from .journal import JobJournal
+from .paths import user_data_dir
+from .playlist import looks_like_playlist
+from .ratelimit import get_limiter, parse_rate
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+# cabeceras y cuerpo de una petición
+MAX_HEAD = 64 * 1024
+MAX_BODY = 1024 * 1024
+# segundos entre comentarios de un flujo SSE sin eventos (detectan clientes caídos)
+HEARTBEAT = 15.0
+# eventos pendientes por cliente SSE; si no da abasto se cierra su flujo y debe resincronizar
+SSE_BUFFER = 4096
+
+# opciones de yt_dlp que un cliente puede fijar; el resto (postprocesadores, exec...) no
+REMOTE_OPTIONS = {"format", "merge_output_format", "segments", "concurrent_fragment_downloads",
+                  "writesubtitles", "subtitleslangs", "noplaylist"}
+PRIORITIES = {"batch": Priority.BATCH, "normal": Priority.NORMAL, "interactive": Priority.INTERACTIVE}
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_STATUS_TEXT = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+                403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                415: "Unsupported Media Type", 500: "Internal Server Error"}
+
+
+def daemon_file() -> Path:
+    return user_data_dir() / "daemon.json"
+
+
+def progress_record(event) -> dict:
+    return dataclasses.asdict(event)
+
+
+def job_record(job: DownloadJob, progress=None) -> dict:
+    """Representación JSON de un trabajo (la misma en respuestas y eventos)."""
+    info = job.info or {}
+    return {
+        "id": job.id,
+        "url": job.url,
+        "kind": job.kind,
+        "quality": job.quality,
+        "audio_format": job.audio_format,
+        "download_dir": job.download_dir,
+        "priority": job.priority,
+        "state": job.state,
+        "error": job.error,
+        "skipped": job.skipped,
+        "audio_mode": job.audio_mode,
+        "attempts": job.attempts,
+        "title": info.get("title"),
+        "file": info.get("filepath") or info.get("_filename"),
+        "digest": info.get("digest"),
+        "timings": {stage: round(secs, 3) for stage, secs in job.timings.items()},
+        "progress": progress_record(progress) if progress is not None else None,
+    }
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def job_from_request(spec) -> DownloadJob:
+    """Validar un trabajo recibido por la API."""
+    if not isinstance(spec, dict):
+        raise HttpError(400, "job must be a JSON object")
+    url = spec.get("url")
+    if not isinstance(url, str) or not url.strip():
+        raise HttpError(400, "'url' is required")
+    kwargs = {"url": url.strip()}
+    kind = spec.get("kind")
+    if kind is not None:
+        if kind not in ("video", "audio"):
+            raise HttpError(400, "'kind' must be 'video' or 'audio'")
+        kwargs["is_video"] = kind == "video"
+    elif "is_video" in spec:
+        kwargs["is_video"] = bool(spec["is_video"])
+    if spec.get("quality") is not None:
+        kwargs["quality"] = str(spec["quality"])
+    if spec.get("audio_format") is not None:
+        if spec["audio_format"] not in AUDIO_FORMATS:
+            raise HttpError(400, f"'audio_format' must be one of {', '.join(AUDIO_FORMATS)}")
+        kwargs["audio_format"] = spec["audio_format"]
+    if spec.get("download_dir") is not None:
+        kwargs["download_dir"] = str(Path(str(spec["download_dir"])).expanduser())
+    priority = spec.get("priority")
+    if priority is not None:
+        if isinstance(priority, str) and priority in PRIORITIES:
+            priority = PRIORITIES[priority]
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise HttpError(400, "'priority' must be an integer or one of " + ", ".join(PRIORITIES))
+        kwargs["priority"] = priority
+    for flag in ("use_cache", "use_archive"):
+        if flag in spec:
+            kwargs[flag] = bool(spec[flag])
+    if spec.get("rate_limit") is not None:
+        try:
+            kwargs["rate_limit"] = parse_rate(spec["rate_limit"])
+        except ValueError as exc:
+            raise HttpError(400, str(exc))
+    options = spec.get("options") or {}
+    if not isinstance(options, dict):
+        raise HttpError(400, "'options' must be an object")
+    unknown = set(options) - REMOTE_OPTIONS
+    if unknown:
+        raise HttpError(400, f"options not allowed: {', '.join(sorted(unknown))}")
+    kwargs["options"] = dict(options)
+    if spec.get("id") is not None:
+        if not isinstance(spec["id"], str) or not _ID_RE.match(spec["id"]):
+            raise HttpError(400, "'id' must be 1-64 letters, digits, '-' or '_'")
+        kwargs["id"] = spec["id"]
+    return DownloadJob(**kwargs)
+
+
+class _Request:
+    def __init__(self, method: str, target: str, headers: dict[str, str], body: bytes):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = unquote(parts.path)
+        self.query = parse_qs(parts.query)
+        self.headers = headers
+        self.body = body
+
+    def param(self, name: str) -> str | None:
+        values = self.query.get(name)
+        return values[0] if values else None
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            return json.loads(self.body)
+        except ValueError as exc:
+            raise HttpError(400, f"invalid JSON: {exc}")
+
+
+async def _read_request(reader: asyncio.StreamReader) -> _Request | None:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(413, "headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length < 0:
+        raise HttpError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "body too large")
+    body = await reader.readexactly(length) if length else b""
+    return _Request(method.upper(), target, headers, body)
+
+
+class DaemonServer:
+    """Servidor HTTP de la API sobre un `DownloadEngine` (ver el docstring del módulo)."""
+
+    def __init__(self, engine, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, token: str | None = None,
+                 discovery: bool = True):
+        if host not in LOCAL_HOSTS and not token:
+            raise ValueError(f"a token is required to listen on {host}")
+        self.engine = engine
+        self.manager = engine.manager
+        self.host = host
+        self.port = port
+        self.token = token
+        self.discovery = discovery
+        self.started = time.time()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._stop: asyncio.Event | None = None
+        # último progreso de cada trabajo, escrito desde los hilos de trabajo
+        self._progress: dict[str, object] = {}
+        # (cola, id de trabajo o None) de cada cliente SSE
+        self._subscribers: list[tuple[asyncio.Queue, str | None]] = []
+
+    @property
+    def url(self) -> str:
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        return f"http://{host}:{self.port}"
+
+    # ---- ciclo de vida -------------------------------------------------
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self.manager.add_listener(self._on_event)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEAD)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.discovery:
+            self._write_discovery()
+        return self
+
+    async def serve_forever(self):
+        """Atender hasta `stop()`, SIGINT o SIGTERM."""
+        if self._server is None:
+            await self.start()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+        print(f"VideoLeech daemon listening on {self.url}", flush=True)
+        try:
+            await self._stop.wait()
+        finally:
+            await self.close()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    async def close(self):
+        """Dejar de atender. Los trabajos sin terminar siguen en el diario y se reanudan al volver a arrancar."""
+        self.manager.remove_listener(self._on_event)
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for queue, _ in list(self._subscribers):
+            self._end_stream(queue)
+        if self.discovery:
+            self._remove_discovery()
+
+    def _write_discovery(self):
+        path = daemon_file()
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"url": self.url, "pid": os.getpid(), "auth": bool(self.token)}))
+        os.replace(tmp, path)
+
+    def _remove_discovery(self):
+        path = daemon_file()
+        try:
+            if json.loads(path.read_text()).get("pid") == os.getpid():
+                path.unlink()
+        except (OSError, ValueError):
+            pass
+
+    def resume(self, journal) -> int:
+        """Volver a encolar los trabajos sin terminar del diario; devuelve cuántos."""
+        count = 0
+        for rec in journal.unfinished():
+            self.manager.submit(job=JobJournal.job_from_record(rec))
+            count += 1
+        return count
+
+    # ---- eventos -------------------------------------------------------
+    def _on_event(self, job_id: str, event: str, payload):
+        # hilo de trabajo: serializar aquí y pasar al bucle
+        if event == "progress":
+            self._progress[job_id] = payload
+            data = {"id": job_id, **progress_record(payload)}
+        elif event == "state":
+            job = self.manager.get(job_id)
+            data = {"id": job_id, "state": payload, "job": job_record(job) if job is not None else None}
+            if payload in JobState.FINAL:
+                self._progress.pop(job_id, None)
+        else:
+            data = {"id": job_id, **payload}
+        try:
+            self._loop.call_soon_threadsafe(self._broadcast, job_id, event, data)
+        except RuntimeError:
+            pass
+
+    def _broadcast(self, job_id: str, event: str, data: dict):
+        final = event == "state" and data["state"] in JobState.FINAL
+        for queue, only in list(self._subscribers):
+            if only is not None and only != job_id:
+                continue
+            if queue.full():
+                # cliente lento: cerrar su flujo; al reconectar pide la lista de nuevo
+                self._end_stream(queue)
+                continue
+            queue.put_nowait((event, data))
+            if final and only is not None:
+                # tras el estado final; si no cabe, el cliente es lento de todos modos
+                self._end_stream(queue, drop=queue.full())
+
+    def _end_stream(self, queue: asyncio.Queue, drop: bool = True):
+        while drop and not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    # ---- HTTP ----------------------------------------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await _read_request(reader)
+            if request is None:
+                return
+            self._check_access(request)
+            if request.method == "GET" and request.path == "/api/events":
+                await self._stream_events(request, writer)
+                return
+            status, payload = await self._route(request)
+            await self._send(writer, status, payload)
+        except HttpError as exc:
+            await self._send(writer, exc.status, {"error": str(exc)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as exc:
+            print("Daemon request error:", exc, file=sys.stderr)
+            await self._send(writer, 500, {"error": str(exc)})
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def _check_access(self, request: _Request):
+        if self.host in LOCAL_HOSTS:
+            # un nombre de otro dominio que resuelve a 127.0.0.1 (DNS rebinding) no pasa
+            if urlsplit("//" + request.headers.get("host", "")).hostname not in LOCAL_HOSTS:
+                raise HttpError(403, "non-local Host header")
+        if self.token:
+            supplied = request.headers.get("authorization", "")
+            if not hmac.compare_digest(supplied.encode(), f"Bearer {self.token}".encode()):
+                raise HttpError(401, "missing or invalid token")
+        if request.method in ("POST", "PUT", "PATCH") or request.body:
+            if request.headers.get("content-type", "").split(";")[0].strip() != "application/json":
+                raise HttpError(415, "Content-Type must be application/json")
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode() if payload is not None else b""
+        head = (f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Cache-Control: no-store\r\n"
+                "Connection: close\r\n\r\n")
+        try:
+            writer.write(head.encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _route(self, request: _Request):
+        parts = [part for part in request.path.split("/") if part]
+        if parts[:1] != ["api"]:
+            raise HttpError(404, "not found")
+        parts = parts[1:]
+        method = request.method
+        if parts == ["health"] and method == "GET":
+            return 200, self._health()
+        if parts == ["stats"] and method == "GET":
+            return 200, self.manager.stats()
+        if parts == ["settings"]:
+            if method == "GET":
+                return 200, self._settings()
+            if method in ("PUT", "PATCH"):
+                return 200, self._configure(request.json())
+        if parts == ["jobs"]:
+            if method == "GET":
+                return 200, {"jobs": self._list(request.param("state"))}
+            if method == "POST":
+                return await self._submit(request.json())
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.manager.get(parts[1])
+            if job is None:
+                raise HttpError(404, f"no job {parts[1]!r}")
+            if len(parts) == 2 and method == "GET":
+                return 200, job_record(job, self._progress.get(job.id))
+            if (len(parts) == 2 and method == "DELETE") or (parts[2:] == ["cancel"] and method == "POST"):
+                return 200, {"id": job.id, "cancelled": self.engine.cancel(job.id), "state": job.state}
+        raise HttpError(405 if parts and parts[0] in ("health", "stats", "settings", "jobs") else 404,
+                        f"{method} {request.path} not supported")
+
+    def _health(self) -> dict:
+        download = self.manager.stats()["download"]
+        return {"status": "ok", "pid": os.getpid(), "uptime": round(time.time() - self.started, 1),
+                "jobs": len(self.manager.jobs()), "queued": download["queued"], "running": download["running"]}
+
+    def _settings(self) -> dict:
+        return {"max_workers": self.manager.max_workers, "limit_rate": get_limiter().total}
+
+    def _configure(self, body) -> dict:
+        if not isinstance(body, dict):
+            raise HttpError(400, "settings must be a JSON object")
+        if "max_workers" in body:
+            value = body["max_workers"]
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise HttpError(400, "'max_workers' must be a positive integer")
+            self.manager.set_max_workers(value)
+        if "limit_rate" in body:
+            try:
+                get_limiter().set_total(parse_rate(body["limit_rate"]))
+            except ValueError as exc:
+                raise HttpError(400, str(exc))
+        return self._settings()
+
+    def _list(self, states: str | None) -> list[dict]:
+        wanted = set(states.split(",")) if states else None
+        return [job_record(job, self._progress.get(job.id)) for job in self.manager.jobs()
+                if wanted is None or job.state in wanted]
+
+    async def _submit(self, body):
+        batch = isinstance(body, dict) and "jobs" in body
+        specs = body["jobs"] if batch else [body]
+        if not isinstance(specs, list) or not specs:
+            raise HttpError(400, "'jobs' must be a non-empty list")
+        # validar todo antes de encolar nada
+        jobs = [job_from_request(spec) for spec in specs]
+        results = []
+        created = False
+        for spec, job in zip(specs, jobs):
+            if spec.get("playlist", looks_like_playlist(job.url)):
+                playlist_id = self.manager.submit_playlist(
+                    job.url, is_video=job.is_video, quality=job.quality, download_dir=job.download_dir,
+                    audio_format=job.audio_format, priority=job.priority if "priority" in spec else Priority.BATCH,
+                    options=job.options, use_cache=job.use_cache, use_archive=job.use_archive,
+                    rate_limit=job.rate_limit,
+                )
+                results.append({"playlist": playlist_id, "url": job.url})
+                created = True
+                continue
+            existing = self.manager.get(job.id)
+            if existing is None:
+                await self.engine.submit(job)
+                created = True
+            else:
+                job = existing
+            results.append(job_record(job, self._progress.get(job.id)))
+        return (201 if created else 200), ({"jobs": results} if batch else results[0])
+
+    async def _stream_events(self, request: _Request, writer: asyncio.StreamWriter):
+        only = request.param("job")
+        if only is not None and self.manager.get(only) is None:
+            raise HttpError(404, f"no job {only!r}")
+        queue: asyncio.Queue = asyncio.Queue(SSE_BUFFER)
+        self._subscribers.append((queue, only))
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-store\r\n"
+                         b"Connection: close\r\n\r\nretry: 1000\n\n")
+            if only is not None:
+                # estado actual primero: el trabajo puede haber terminado ya
+                job = self.manager.get(only)
+                writer.write(_sse("state", {"id": only, "state": job.state, "job": job_record(job)}))
+                if job.state in JobState.FINAL:
+                    await writer.drain()
+                    return
+            await writer.drain()
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                    await writer.drain()
+                    continue
+                if item is None:
+                    return
+                writer.write(_sse(*item))
+                await writer.drain()
+        finally:
+            self._subscribers = [sub for sub in self._subscribers if sub[0] is not queue]
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
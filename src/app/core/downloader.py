@@ -1,5 +1,12 @@
 from pathlib import Path
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from .engine import get_engine
+from .jobs import DEFAULT_AUDIO_FORMAT, DownloadJob, JobState, Priority
+from .manager import DEFAULT_MAX_WORKERS
+from .prefetch import get_prefetcher
+from .procpool import make_runner
+from .progress import DEFAULT_MAX_RATE, ProgressEvent
 
 
 class DownloadWorker(QObject):
@@ -7,13 +14,29 @@ class DownloadWorker(QObject):
 
     Señales:
     - progress(str): mensajes de estado/progreso legibles para la UI.
+    - progress_event(object): el `ProgressEvent` con los valores numéricos.
     - finished(bool): True si la descarga finalizó correctamente.
+
+    Es un adaptador del motor compartido (ver `engine.get_engine`): el
+    trabajo pasa por su cola, con reintentos y cortacircuitos, y `run()`
+    espera a que termine. El gestor ya limita los eventos de progreso;
+    `progress_rate` fija ese límite. Sin `backend` se usa el del motor; con
+    "process" la descarga corre en un proceso hijo y `cancel()` la
+    interrumpe matándolo.
     """
     progress = Signal(str)
+    progress_event = Signal(object)
     finished = Signal(bool)
 
-    def __init__(self, url: str, is_video: bool = True, quality: str | None = None, download_dir: str | None = None):
+    def __init__(self, url: str, is_video: bool = True, quality: str | None = None, download_dir: str | None = None,
+                 progress_rate: float = DEFAULT_MAX_RATE, audio_format: str = DEFAULT_AUDIO_FORMAT,
+                 backend: str | None = None):
         super().__init__()
+        self.backend = backend
+        self._engine = None
+        self._job_id = None
+        self.audio_format = audio_format
+        self.progress_rate = progress_rate
         self.url = url
         self.is_video = is_video
         self.quality = quality
@@ -21,55 +44,156 @@ class DownloadWorker(QObject):
 
     def run(self):
         try:
-            import yt_dlp
-
-            ydl_opts: dict = {}
-            if self.download_dir:
-                out = self.download_dir / "%(title)s.%(ext)s"
-                ydl_opts["outtmpl"] = str(out)
-
-            if self.is_video:
-                if self.quality and self.quality != "Maximum Quality":
-                    # intentar mapear "1080p" -> height<=1080
-                    try:
-                        height = int(self.quality.replace('p', ''))
-                        ydl_opts['format'] = f"bestvideo[height<=?{height}]+bestaudio/best"
-                    except Exception:
-                        ydl_opts['format'] = 'best'
-                else:
-                    ydl_opts['format'] = 'best'
-            else:
-                # audio extraction to mp3 (requires ffmpeg)
-                ydl_opts['format'] = 'bestaudio/best'
-                ydl_opts['postprocessors'] = [
-                    {
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }
-                ]
-
-            def _hook(d):
-                status = d.get('status')
-                if status == 'downloading':
-                    pct = d.get('_percent_str', '').strip()
-                    speed = d.get('_speed_str', '').strip()
-                    eta = d.get('_eta_str', '').strip()
-                    self.progress.emit(f"Downloading {pct} {speed} ETA {eta}")
-                elif status == 'finished':
-                    self.progress.emit('Processing finished, finalizing...')
-                elif status == 'error':
-                    self.progress.emit('Error during download')
-
-            ydl_opts['progress_hooks'] = [_hook]
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.url])
-
-            self.finished.emit(True)
+            job = DownloadJob(
+                url=self.url,
+                is_video=self.is_video,
+                quality=self.quality,
+                download_dir=str(self.download_dir) if self.download_dir else None,
+                audio_format=self.audio_format,
+                priority=Priority.INTERACTIVE,
+            )
+            self._engine = get_engine(self.backend)
+            self._engine.manager.progress_rate = self.progress_rate
+            self._job_id = job.id
+            job = self._engine.run(job, on_progress=self._emit_progress)
+            if job.state == JobState.CANCELLED:
+                self.progress.emit("Cancelled")
+            elif job.state != JobState.DONE:
+                self.progress.emit(f"Error: {job.error}")
+            self.finished.emit(job.state == JobState.DONE)
         except Exception as exc:
             self.progress.emit(f"Error: {exc}")
             try:
                 self.finished.emit(False)
             except Exception:
                 pass
+
+    def cancel(self) -> bool:
+        """Cancelar el trabajo: en cola siempre, en curso solo con el backend de procesos."""
+        return bool(self._engine and self._job_id and self._engine.cancel(self._job_id))
+
+    def _emit_progress(self, event: ProgressEvent):
+        self.progress_event.emit(event)
+        self.progress.emit(event.text())
+
+
+class DownloadQueue(QObject):
+    """Adaptador Qt de `DownloadManager`.
+
+    Reemite los eventos del gestor como señales Qt indexadas por id de
+    trabajo; al emitirse desde hilos de trabajo llegan a la UI encoladas.
+
+    Señales:
+    - job_state(str, str): id del trabajo y nuevo estado.
+    - job_progress(str, object): id del trabajo y `ProgressEvent`.
+    - job_finished(str, bool): id del trabajo y si terminó correctamente.
+    - playlist_progress(str, object): id de playlist y {"queued", "done", "error"}.
+
+    Por defecto usa el gestor del motor compartido (`engine.get_engine`), el
+    mismo que `DownloadWorker` y los ayudantes de `app.main`: una sola cola
+    con sus topes por sitio. `backend` elige dónde se ejecutan los trabajos:
+    "thread" (en este proceso) o "process" (un proceso hijo por trabajo, ver
+    `procpool.py`). Con `manager` se usa ese gestor (p. ej. un
+    `remote.RemoteManager` conectado a un demonio) y `backend` se ignora.
+    """
+    job_state = Signal(str, str)
+    job_progress = Signal(str, object)
+    job_finished = Signal(str, bool)
+    playlist_progress = Signal(str, object)
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, progress_rate: float = DEFAULT_MAX_RATE, parent=None,
+                 backend: str = "thread", manager=None):
+        super().__init__(parent)
+        self.backend = backend
+        self._shared = manager is None
+        if manager is None:
+            manager = get_engine(backend).manager
+            manager.set_max_workers(max_workers)
+            manager.progress_rate = progress_rate
+        self.manager = manager
+        self.manager.add_listener(self._relay)
+
+    def _relay(self, job_id: str, event: str, payload):
+        if event == "progress":
+            self.job_progress.emit(job_id, payload)
+        elif event == "state":
+            self.job_state.emit(job_id, payload)
+            if payload in JobState.FINAL:
+                self.job_finished.emit(job_id, payload == JobState.DONE)
+        elif event == "playlist":
+            self.playlist_progress.emit(job_id, payload)
+
+    def submit(self, url: str, is_video: bool = True, quality: str | None = None, download_dir: str | None = None,
+               audio_format: str = DEFAULT_AUDIO_FORMAT, priority: int = Priority.NORMAL) -> str:
+        return self.manager.submit(url, is_video=is_video, quality=quality, download_dir=download_dir,
+                                   audio_format=audio_format, priority=priority)
+
+    def submit_playlist(self, url: str, is_video: bool = True, quality: str | None = None, download_dir: str | None = None,
+                        audio_format: str = DEFAULT_AUDIO_FORMAT, priority: int = Priority.NORMAL) -> str:
+        return self.manager.submit_playlist(url, is_video=is_video, quality=quality, download_dir=download_dir,
+                                            audio_format=audio_format, priority=priority)
+
+    def submit_job(self, job: DownloadJob) -> str:
+        return self.manager.submit(job=job)
+
+    def set_max_workers(self, value: int):
+        self.manager.set_max_workers(value)
+
+    def set_backend(self, backend: str):
+        """Cambiar el backend para los próximos trabajos."""
+        if self._shared:
+            get_engine(backend)
+        else:
+            self.manager.set_runner(make_runner(backend))
+        self.backend = backend
+
+    def cancel(self, job_id: str) -> bool:
+        return self.manager.cancel(job_id)
+
+    def stats(self) -> dict:
+        return self.manager.stats()
+
+    def shutdown(self):
+        self.manager.shutdown(wait=False)
+
+
+class MetadataPrefetch(QObject):
+    """Adaptador Qt de `prefetch.MetadataPrefetcher` con retardo (debounce).
+
+    `request(url)` reinicia el temporizador; si en `delay_ms` no llega otra
+    URL se lanza la extracción en segundo plano. Solo se avisa de la última.
+
+    Señales:
+    - ready(str, object): URL y resumen {"title", "duration", "heights", ...}.
+    - failed(str, str): URL y mensaje de error.
+    """
+    ready = Signal(str, object)
+    failed = Signal(str, str)
+
+    def __init__(self, delay_ms: int = 400, parent=None):
+        super().__init__(parent)
+        self._url = ""
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._start)
+
+    def request(self, url: str):
+        self._url = (url or "").strip()
+        self._timer.start()
+
+    def cancel(self):
+        self._timer.stop()
+        self._url = ""
+        get_prefetcher().cancel()
+
+    def _start(self):
+        if get_prefetcher().prefetch(self._url, self._done) is None:
+            self._url = ""
+
+    def _done(self, url: str, summary, error):
+        # hilo del prefetcher: las señales llegan a la UI encoladas
+        if error is not None:
+            self.failed.emit(url, str(error))
+        else:
+            self.ready.emit(url, summary)
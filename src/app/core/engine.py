@@ -0,0 +1,237 @@
+"""Motor de descargas con API asyncio sobre `DownloadManager`.
+
+yt_dlp es bloqueante: las descargas siguen corriendo en los hilos (o
+procesos, ver `procpool.py`) del gestor, con su cola justa, reintentos y
+cortacircuitos. `DownloadEngine` solo traduce sus eventos al bucle asyncio
+que envió cada trabajo, de modo que un único bucle puede coordinar cientos
+de trabajos sin un hilo esperando por cada uno:
+
+    engine = DownloadEngine(max_workers=8)
+    handle = await engine.submit(DownloadJob(url=url))
+    async for event in handle.progress():
+        print(event.text())
+    job = await handle
+
+La CLI, los ayudantes de `app.main` y `DownloadWorker` son adaptadores de
+este motor; el código sin bucle propio usa `run()`, que es bloqueante.
+"""
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Callable
+
+from .jobs import DownloadJob, JobState
+from .manager import DownloadManager
+from .procpool import make_runner
+from .progress import ProgressEvent
+
+# eventos guardados por cada iterador que no da abasto; se descartan los más viejos
+EVENT_BUFFER = 256
+
+
+class JobHandle:
+    """Un trabajo enviado a `DownloadEngine`, visto desde su bucle asyncio.
+
+    `await handle` devuelve el `DownloadJob` cuando llega a un estado final
+    (también si falla o se cancela: ver `job.state` y `job.error`).
+    `events()` recorre sus eventos `(event, payload)` como los oyentes del
+    gestor y `progress()` solo sus `ProgressEvent`; ambos terminan con el
+    trabajo. `started`/`finished` son del reloj monotónico.
+    """
+
+    def __init__(self, engine: "DownloadEngine", job: DownloadJob, loop: asyncio.AbstractEventLoop):
+        self.engine = engine
+        self.job = job
+        self.started: float | None = None
+        self.finished: float | None = None
+        self._loop = loop
+        self._result = loop.create_future()
+        self._subscribers: list[asyncio.Queue] = []
+
+    @property
+    def id(self) -> str:
+        return self.job.id
+
+    @property
+    def state(self) -> str:
+        return self.job.state
+
+    @property
+    def elapsed(self) -> float:
+        """Segundos desde que empezó a ejecutarse (0 si no llegó a empezar)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def done(self) -> bool:
+        return self._result.done()
+
+    async def result(self) -> DownloadJob:
+        # shield: cancelar a quien espera no debe cancelar el resultado para los demás
+        return await asyncio.shield(self._result)
+
+    def __await__(self):
+        return self.result().__await__()
+
+    async def events(self) -> AsyncIterator[tuple[str, object]]:
+        if self.done():
+            return
+        queue: asyncio.Queue = asyncio.Queue(EVENT_BUFFER)
+        self._subscribers.append(queue)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                yield item
+        finally:
+            self._subscribers.remove(queue)
+
+    async def progress(self) -> AsyncIterator[ProgressEvent]:
+        async for event, payload in self.events():
+            if event == "progress":
+                yield payload
+
+    def cancel(self) -> bool:
+        return self.engine.cancel(self.id)
+
+    # en el hilo del bucle, vía `call_soon_threadsafe`
+    def _push(self, event: str, payload, now: float):
+        if event == "state" and payload == JobState.RUNNING and self.started is None:
+            self.started = now
+        final = event == "state" and payload in JobState.FINAL
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((event, payload))
+            if final:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+        if final and not self._result.done():
+            self.finished = now
+            self._result.set_result(self.job)
+
+
+class JobSourceError(Exception):
+    """El iterable de `submit_many` falló; `__cause__` es el error original."""
+
+
+class DownloadEngine:
+    """`DownloadManager` con envío y espera asíncronos.
+
+    Sin `manager` se crea uno con `manager_kwargs`. Los trabajos enviados por
+    otros medios (el diario, `submit_playlist`) siguen funcionando, pero solo
+    los enviados con `submit` tienen `JobHandle`.
+    """
+
+    def __init__(self, manager: DownloadManager | None = None, **manager_kwargs):
+        self.manager = manager if manager is not None else DownloadManager(**manager_kwargs)
+        self._lock = threading.Lock()
+        self._handles: dict[str, JobHandle] = {}
+        self.manager.add_listener(self._dispatch)
+
+    async def submit(self, job: DownloadJob | None = None, **job_kwargs) -> JobHandle:
+        """Encolar un trabajo (o crearlo con `job_kwargs`) y devolver su `JobHandle`."""
+        if job is None:
+            job = DownloadJob(**job_kwargs)
+        handle = JobHandle(self, job, asyncio.get_running_loop())
+        with self._lock:
+            self._handles[job.id] = handle
+        try:
+            self.manager.submit(job=job)
+        except Exception:
+            with self._lock:
+                self._handles.pop(job.id, None)
+            raise
+        return handle
+
+    async def submit_many(self, jobs, max_pending: int | None = None) -> AsyncIterator[JobHandle]:
+        """Enviar trabajos de un iterable perezoso con contrapresión (ver `DownloadManager.submit_many`).
+
+        El iterable (p. ej. `iter_playlist_jobs`, que pide páginas a la red) y
+        la espera por hueco en la cola corren en el ejecutor del bucle. Si el
+        iterable falla, la excepción llega a quien itera (`JobSourceError`),
+        pero los trabajos ya enviados siguen su curso y sus `JobHandle` valen.
+        """
+        loop = asyncio.get_running_loop()
+        source = iter(jobs)
+        while True:
+            try:
+                job = await loop.run_in_executor(None, next, source, None)
+            except Exception as exc:
+                raise JobSourceError(exc) from exc
+            if job is None:
+                return
+            if not self.manager.wait_for_room(max_pending, timeout=0):
+                if not await loop.run_in_executor(None, self.manager.wait_for_room, max_pending):
+                    return
+            yield await self.submit(job)
+
+    async def download(self, job: DownloadJob | None = None, **job_kwargs) -> DownloadJob:
+        """Enviar un trabajo y esperar a que termine."""
+        return await (await self.submit(job, **job_kwargs))
+
+    def run(self, job: DownloadJob | None = None, on_progress: Callable[[ProgressEvent], None] | None = None,
+            **job_kwargs) -> DownloadJob:
+        """Versión bloqueante para quien no tiene bucle asyncio (hilos de Qt, scripts).
+
+        `on_progress` recibe cada `ProgressEvent` desde este mismo hilo.
+        """
+        return asyncio.run(self._run(job or DownloadJob(**job_kwargs), on_progress))
+
+    async def _run(self, job: DownloadJob, on_progress) -> DownloadJob:
+        handle = await self.submit(job)
+        if on_progress is not None:
+            async for event in handle.progress():
+                on_progress(event)
+        return await handle
+
+    def cancel(self, job_id: str) -> bool:
+        return self.manager.cancel(job_id)
+
+    async def wait(self):
+        """Esperar a que el gestor quede vacío (incluidos trabajos sin `JobHandle`)."""
+        await asyncio.get_running_loop().run_in_executor(None, self.manager.wait)
+
+    def close(self, wait: bool = True):
+        self.manager.shutdown(wait=wait)
+        self.manager.remove_listener(self._dispatch)
+
+    # oyente del gestor: hilos de trabajo
+    def _dispatch(self, job_id: str, event: str, payload):
+        if event == "playlist":
+            return
+        final = event == "state" and payload in JobState.FINAL
+        with self._lock:
+            handle = self._handles.pop(job_id, None) if final else self._handles.get(job_id)
+        if handle is None:
+            return
+        try:
+            handle._loop.call_soon_threadsafe(handle._push, event, payload, time.monotonic())
+        except RuntimeError:
+            # el bucle que lo envió ya se cerró: nadie espera este trabajo
+            pass
+
+
+_engine: DownloadEngine | None = None
+_engine_backend = "thread"
+_engine_lock = threading.Lock()
+
+
+def get_engine(backend: str | None = None) -> DownloadEngine:
+    """Motor compartido por el proceso: GUI (`DownloadQueue`, `DownloadWorker`) y ayudantes de `app.main`.
+
+    Se crea la primera vez con `backend` ("thread" o "process"; "thread" si no
+    se indica). Pedirlo con otro backend cambia el runner para los próximos
+    trabajos, igual que `DownloadManager.set_runner`; si se cerró, se crea otro.
+    """
+    global _engine, _engine_backend
+    with _engine_lock:
+        if _engine is None or _engine.manager.closed:
+            _engine_backend = backend or "thread"
+            _engine = DownloadEngine(runner=make_runner(_engine_backend))
+        elif backend is not None and backend != _engine_backend:
+            _engine.manager.set_runner(make_runner(backend))
+            _engine_backend = backend
+        return _engine
@@ -0,0 +1,244 @@
+"""Huella (hash) de las descargas calculada mientras se escriben.
+
+Verificar un fichero leyéndolo entero al terminar duplica la E/S de disco.
+Aquí el hash se calcula sobre la marcha:
+
+- La descarga segmentada (`segmented.py`) pasa cada trozo a `StreamHasher`
+  desde memoria; los trozos que llegan por delante del punto ya resumido
+  se leen después del `.part`, cuando todavía están en la caché de páginas.
+- Las descargas de yt_dlp (HTTP simple, HLS/DASH) escriben ellas mismas el
+  fichero; `DownloadHasher.progress_hook` va leyendo la cola recién escrita
+  del `.part` según avanza `downloaded_bytes`, también desde la caché.
+- Tras la unión de formatos o un postprocesado que cambia el fichero, el
+  resultado se vuelve a resumir una vez, justo al crearse (`final_digest`).
+
+Se usa BLAKE3 si el paquete `blake3` está instalado y SHA-256 si no; la
+huella se escribe como "algoritmo:hex" en `info["digest"]`, en el archivo de
+descargas y, opcionalmente, en un fichero `<nombre>.sha256` (o `.blake3`)
+con el formato de `sha256sum`/`b3sum`. Con un almacén direccionado por
+contenido (`ContentStore`) las salidas idénticas se convierten en enlaces
+duros a una sola copia.
+"""
+import hashlib
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+try:
+    from blake3 import blake3 as _blake3
+except ImportError:
+    _blake3 = None
+
+ALGORITHM = "blake3" if _blake3 is not None else "sha256"
+READ_SIZE = 1024 * 1024
+# no leer la cola del .part por menos de esto (salvo al terminar)
+MIN_ADVANCE = 1024 * 1024
+
+
+def new_hash(algorithm: str = ALGORITHM):
+    if algorithm == "blake3":
+        if _blake3 is None:
+            raise ValueError("blake3 is not installed")
+        return _blake3()
+    return hashlib.new(algorithm)
+
+
+def format_digest(algorithm: str, hexdigest: str) -> str:
+    return f"{algorithm}:{hexdigest}"
+
+
+def parse_digest(digest: str) -> tuple[str, str]:
+    algorithm, _, hexdigest = digest.partition(":")
+    return algorithm, hexdigest
+
+
+def hash_file(path, algorithm: str = ALGORITHM, start: int = 0, hasher=None) -> str:
+    """Huella de un fichero entero (o continuar `hasher` desde `start`)."""
+    hasher = hasher if hasher is not None else new_hash(algorithm)
+    with open(path, "rb") as f:
+        f.seek(start)
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+    return format_digest(algorithm, hasher.hexdigest())
+
+
+class StreamHasher:
+    """Hash de un fichero que se escribe por partes, en orden o no.
+
+    `frontier` es cuántos bytes iniciales se han resumido ya. `feed` recibe
+    los datos escritos en `offset`: si empiezan justo en la frontera se
+    resumen desde memoria; si no, se leerán del fichero con `advance` cuando
+    la frontera llegue hasta ellos.
+    """
+
+    def __init__(self, path, algorithm: str = ALGORITHM):
+        self.path = str(path)
+        self.algorithm = algorithm
+        self.frontier = 0
+        self.read_bytes = 0
+        self._hash = new_hash(algorithm)
+        self._lock = threading.Lock()
+
+    def feed(self, offset: int, data: bytes):
+        with self._lock:
+            if offset == self.frontier:
+                self._hash.update(data)
+                self.frontier += len(data)
+
+    def advance(self, upto: int, path=None):
+        """Resumir del fichero lo escrito hasta `upto` que aún no se haya visto.
+
+        Si `upto` queda por detrás de la frontera el fichero se ha vuelto a
+        escribir desde el principio (p. ej. el servidor no aceptó continuar)
+        y se empieza de nuevo.
+        """
+        with self._lock:
+            if upto < self.frontier:
+                self._hash = new_hash(self.algorithm)
+                self.frontier = 0
+            if upto <= self.frontier:
+                return
+            try:
+                with open(path or self.path, "rb") as f:
+                    f.seek(self.frontier)
+                    while self.frontier < upto:
+                        block = f.read(min(READ_SIZE, upto - self.frontier))
+                        if not block:
+                            # lo que se anuncia puede no estar aún en el fichero (fragmentos en curso)
+                            break
+                        self._hash.update(block)
+                        self.frontier += len(block)
+                        self.read_bytes += len(block)
+            except OSError:
+                pass
+
+    def finish(self, path=None) -> str:
+        """Completar con lo que falte hasta el final del fichero y devolver la huella."""
+        path = path or self.path
+        self.advance(os.path.getsize(path), path)
+        with self._lock:
+            return format_digest(self.algorithm, self._hash.hexdigest())
+
+
+class DownloadHasher:
+    """Huellas de los ficheros de un trabajo, alimentadas por los ganchos de progreso de yt_dlp."""
+
+    def __init__(self, algorithm: str = ALGORITHM):
+        self.algorithm = algorithm
+        self._lock = threading.Lock()
+        self._streams: dict[str, StreamHasher] = {}
+        # ruta final -> (huella, tamaño, mtime_ns) al terminar de descargarla
+        self._done: dict[str, tuple[str, int, int]] = {}
+
+    def progress_hook(self, d: dict):
+        filename = d.get("filename")
+        if not filename:
+            return
+        status = d.get("status")
+        if status == "downloading":
+            tmp = d.get("tmpfilename")
+            upto = d.get("downloaded_bytes")
+            # sin `tmpfilename` es la descarga segmentada: ella misma resume sus trozos
+            if not tmp or tmp == "-" or upto is None:
+                return
+            with self._lock:
+                stream = self._streams.get(filename)
+                if stream is None or stream.path != tmp:
+                    stream = self._streams[filename] = StreamHasher(tmp, self.algorithm)
+            if upto - stream.frontier >= MIN_ADVANCE or upto < stream.frontier:
+                stream.advance(upto)
+        elif status == "finished":
+            with self._lock:
+                stream = self._streams.pop(filename, None)
+            try:
+                digest = d.get("digest")
+                if digest is None or parse_digest(digest)[0] != self.algorithm:
+                    # ya renombrado: lo que falte se lee del fichero final
+                    digest = (stream or StreamHasher(filename, self.algorithm)).finish(filename)
+                st = os.stat(filename)
+            except OSError:
+                return
+            with self._lock:
+                self._done[os.path.abspath(filename)] = (digest, st.st_size, st.st_mtime_ns)
+
+    def digest_for(self, path) -> str | None:
+        """Huella tomada al descargar `path`, si el fichero no ha cambiado desde entonces."""
+        with self._lock:
+            entry = self._done.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        digest, size, mtime = entry
+        return digest if (st.st_size, st.st_mtime_ns) == (size, mtime) else None
+
+    def final_digest(self, path) -> str:
+        """Huella de la salida final: la de la descarga o, si la unión o un postprocesado la cambió, una nueva."""
+        return self.digest_for(path) or hash_file(path, self.algorithm)
+
+
+def sidecar_path(path, algorithm: str) -> Path:
+    return Path(f"{path}.{algorithm}")
+
+
+def write_sidecar(path, digest: str) -> Path:
+    """`<fichero>.<algoritmo>` en el formato de `sha256sum -c` / `b3sum -c`."""
+    algorithm, hexdigest = parse_digest(digest)
+    sidecar = sidecar_path(path, algorithm)
+    sidecar.write_text(f"{hexdigest}  {Path(path).name}\n", encoding="utf-8")
+    return sidecar
+
+
+class ContentStore:
+    """Almacén direccionado por contenido: `<raíz>/<algoritmo>/<ab>/<hex>`.
+
+    Los objetos son enlaces duros a las descargas, no copias. Una salida
+    cuya huella ya está en el almacén se sustituye por un enlace al objeto,
+    así los duplicados no ocupan espacio. Almacén y descargas tienen que
+    estar en el mismo sistema de ficheros; si no, no se deduplica.
+
+    Como el objeto comparte inodo con ficheros visibles, editar uno de ellos
+    cambia el objeto: antes de enlazar se vuelve a resumir y, si ya no
+    coincide con su nombre, se sustituye por la descarga nueva.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def object_path(self, digest: str) -> Path:
+        algorithm, hexdigest = parse_digest(digest)
+        return self.root / algorithm / hexdigest[:2] / hexdigest
+
+    def dedup(self, path, digest: str) -> bool:
+        """Añadir `path` al almacén o enlazarlo al objeto existente; True si era un duplicado."""
+        obj = self.object_path(digest)
+        try:
+            if obj.exists():
+                src, dst = obj.stat(), os.stat(path)
+                if (src.st_dev, src.st_ino) == (dst.st_dev, dst.st_ino):
+                    return False
+                if src.st_size != dst.st_size or hash_file(obj, parse_digest(digest)[0]) != digest:
+                    print(f"Content store object {obj.name} no longer matches its digest; replacing it", file=sys.stderr)
+                    obj.unlink()
+                    os.link(path, obj)
+                    return False
+                # enlace nuevo junto al destino y reemplazo atómico
+                tmp = Path(path).with_name(f".{Path(path).name}.{uuid.uuid4().hex[:8]}.link")
+                os.link(obj, tmp)
+                os.replace(tmp, path)
+                return True
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            os.link(path, obj)
+        except FileExistsError:
+            # otro trabajo lo añadió a la vez: la próxima vez se enlazará
+            pass
+        except OSError as exc:
+            print("Content store disabled for this file:", exc, file=sys.stderr)
+        return False
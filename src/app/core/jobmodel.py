@@ -0,0 +1,369 @@
+"""Modelo Qt de la lista de descargas, pensado para miles de trabajos.
+
+`DownloadsModel` es un `QAbstractTableModel`: la vista solo pide los datos
+de las filas visibles, así que no hay un widget por trabajo. Los eventos de
+`DownloadManager` llegan desde los hilos de trabajo y solo se anotan (bajo
+un lock, sin tocar Qt); un `QTimer` en el hilo de la GUI los aplica cada
+`interval_ms` y avisa a la vista con un `dataChanged` por cada tramo de
+filas contiguas que cambió, en lugar de una señal por evento.
+
+El orden y el filtro (por estado y por texto) los hace el propio modelo con
+`list.sort` y una comprensión sobre sus filas: un `QSortFilterProxyModel`
+llamaría a `data()` en Python por cada comparación, y con decenas de miles
+de filas eso se nota en cada actualización. Si los cambios de un lote
+afectan al orden o al filtro se recoloca todo de una vez (`layoutChanged`).
+`ProgressDelegate` pinta la barra de progreso sin crear widgets.
+"""
+import threading
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+from PySide6.QtWidgets import QApplication, QStyle, QStyledItemDelegate, QStyleOptionProgressBar
+
+from .jobs import JobState
+from .progress import Phase, fmt_bytes, fmt_eta
+
+# fracción 0..1 de la columna de progreso, o None si no se conoce
+PROGRESS_ROLE = Qt.UserRole
+
+# por encima de tantos tramos se avisa de uno solo que los cubre todos
+MAX_RANGES = 32
+
+ACTIVE_STATES = (JobState.QUEUED, JobState.RUNNING, JobState.POSTPROCESSING)
+
+STATE_LABELS = {
+    JobState.QUEUED: "Queued",
+    JobState.RUNNING: "Running",
+    JobState.POSTPROCESSING: "Processing",
+    JobState.DONE: "Done",
+    JobState.FAILED: "Failed",
+    JobState.CANCELLED: "Cancelled",
+}
+_STATE_ORDER = {state: number for number, state in enumerate(STATE_LABELS)}
+
+
+class _Row:
+    __slots__ = ("job_id", "url", "name", "kind", "state", "fraction", "speed", "eta", "size", "status", "retrying")
+
+    def __init__(self, job_id: str, url: str, kind: str):
+        self.job_id = job_id
+        self.url = url
+        self.name = url
+        self.kind = kind
+        self.state = JobState.QUEUED
+        self.fraction = None
+        self.speed = None
+        self.eta = None
+        self.size = None
+        self.status = ""
+        self.retrying = False
+
+
+def contiguous_ranges(rows) -> list[tuple[int, int]]:
+    """Agrupar números de fila en tramos (primera, última) contiguos."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+class DownloadsModel(QAbstractTableModel):
+    """Una fila por trabajo; ordenable por columna y filtrable por estado y texto."""
+
+    COLUMNS = ("Name", "Type", "State", "Progress", "Speed", "ETA", "Size", "Status")
+    NAME, KIND, STATE, PROGRESS, SPEED, ETA, SIZE, STATUS = range(len(COLUMNS))
+    # columnas cuyo valor cambia con los eventos de progreso
+    LIVE_COLUMNS = (STATE, PROGRESS, SPEED, ETA, SIZE, STATUS)
+
+    # clave de orden por columna; los valores vacíos quedan al principio en orden ascendente
+    SORT_KEYS = {
+        NAME: lambda row: row.name.casefold(),
+        KIND: lambda row: row.kind,
+        STATE: lambda row: _STATE_ORDER.get(row.state, len(_STATE_ORDER)),
+        PROGRESS: lambda row: row.fraction if row.fraction is not None else -1.0,
+        SPEED: lambda row: row.speed or 0.0,
+        ETA: lambda row: row.eta if row.eta is not None else -1.0,
+        SIZE: lambda row: row.size or 0,
+        STATUS: lambda row: row.status.casefold(),
+    }
+
+    def __init__(self, interval_ms: int = 200, parent=None):
+        super().__init__(parent)
+        self._manager = None
+        # todas las filas en orden de llegada, y las visibles en el orden de la vista
+        self._rows: list[_Row] = []
+        self._by_id: dict[str, _Row] = {}
+        self._visible: list[_Row] = []
+        self._position: dict[str, int] = {}
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._states: frozenset | None = None
+        self._text = ""
+        # eventos pendientes de aplicar, escritos desde los hilos de trabajo
+        self._lock = threading.Lock()
+        self._pending_states: dict[str, str] = {}
+        self._pending_progress: dict[str, object] = {}
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+    # ---- conexión con el gestor ----------------------------------------
+    def attach(self, manager):
+        """Mostrar los trabajos de `manager` (los que ya tiene y los que lleguen)."""
+        self._manager = manager
+        manager.add_listener(self._on_event)
+        with self._lock:
+            for job in manager.jobs():
+                self._pending_states.setdefault(job.id, job.state)
+        self._timer.start()
+        self.flush()
+
+    def detach(self):
+        if self._manager is not None:
+            self._manager.remove_listener(self._on_event)
+            self._manager = None
+        self._timer.stop()
+
+    def _on_event(self, job_id: str, event: str, payload):
+        # hilo de trabajo: solo anotar; gana el último evento de cada trabajo
+        if event == "state":
+            with self._lock:
+                self._pending_states[job_id] = payload
+        elif event == "progress":
+            with self._lock:
+                self._pending_progress[job_id] = payload
+
+    # ---- aplicar eventos (hilo de la GUI) -------------------------------
+    def flush(self):
+        with self._lock:
+            states, self._pending_states = self._pending_states, {}
+            progress, self._pending_progress = self._pending_progress, {}
+        if not states and not progress:
+            return
+        changed = {**states, **progress}
+        new = []
+        for job_id in changed:
+            if job_id not in self._by_id:
+                row = self._by_id[job_id] = self._new_row(job_id)
+                self._rows.append(row)
+                new.append(row)
+        for job_id, event in progress.items():
+            self._apply_progress(self._by_id[job_id], event)
+        for job_id, state in states.items():
+            self._apply_state(self._by_id[job_id], state)
+
+        if self._reorders(bool(states)):
+            self._relayout()
+            return
+        if new:
+            # sin orden ni filtro las nuevas van al final
+            first = len(self._visible)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            for offset, row in enumerate(new):
+                self._position[row.job_id] = first + offset
+            self._visible.extend(new)
+            self.endInsertRows()
+        self._notify(self._position[job_id] for job_id in changed if job_id in self._position)
+
+    def _reorders(self, states_changed: bool) -> bool:
+        """Si los cambios aplicados pueden mover filas o cambiar cuáles se ven."""
+        if self._sort_column in self.LIVE_COLUMNS:
+            return True
+        # un cambio de estado puede sacar la fila del filtro, y el nombre
+        # pasa de URL a título al terminar la extracción
+        return states_changed and (self._states is not None or bool(self._text) or self._sort_column == self.NAME)
+
+    def _notify(self, rows):
+        ranges = contiguous_ranges(rows)
+        if not ranges:
+            return
+        if len(ranges) > MAX_RANGES:
+            ranges = [(ranges[0][0], ranges[-1][1])]
+        last_column = len(self.COLUMNS) - 1
+        for first, last in ranges:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+    def _job(self, job_id: str):
+        return self._manager.get(job_id) if self._manager is not None else None
+
+    def _new_row(self, job_id: str) -> _Row:
+        job = self._job(job_id)
+        if job is None:
+            return _Row(job_id, job_id, "")
+        return _Row(job_id, job.url, job.kind)
+
+    def _apply_progress(self, row: _Row, event):
+        row.retrying = event.phase == Phase.RETRYING
+        if event.phase == Phase.DOWNLOADING:
+            row.fraction = event.fraction
+            row.speed = event.speed
+            row.eta = event.eta
+            row.size = event.total_bytes or row.size
+        elif event.phase in (Phase.POSTPROCESSING, Phase.FINISHED):
+            row.fraction = 1.0
+            row.speed = row.eta = None
+        else:
+            row.speed = None
+            row.eta = event.eta if row.retrying else None
+        row.status = event.text()
+
+    def _apply_state(self, row: _Row, state: str):
+        row.state = state
+        job = self._job(row.job_id)
+        if job is not None and job.info and job.info.get("title"):
+            row.name = job.info["title"]
+        if state == JobState.DONE:
+            row.fraction = 1.0
+            row.speed = row.eta = None
+            row.retrying = False
+            row.status = "Already downloaded" if job is not None and job.skipped else "Download completed"
+        elif state == JobState.FAILED:
+            row.speed = row.eta = None
+            row.retrying = False
+            row.status = (job.error if job is not None else None) or "Download failed"
+        elif state == JobState.CANCELLED:
+            row.speed = row.eta = None
+            row.retrying = False
+            row.status = "Download cancelled"
+        elif state == JobState.POSTPROCESSING:
+            row.fraction = 1.0
+            row.speed = row.eta = None
+            row.status = "Converting..."
+        elif state == JobState.RUNNING:
+            row.retrying = False
+            if not row.status or row.status.startswith("Retrying"):
+                row.status = "Starting..."
+
+    # ---- orden y filtro ------------------------------------------------
+    def set_state_filter(self, states):
+        """Mostrar solo los trabajos en `states` (None = todos)."""
+        self._states = frozenset(states) if states is not None else None
+        self._relayout()
+
+    def set_text_filter(self, text: str):
+        """Mostrar solo los trabajos cuyo nombre o URL contiene `text` (sin distinguir mayúsculas)."""
+        self._text = (text or "").strip().casefold()
+        self._relayout()
+
+    def _accepts(self, row: _Row) -> bool:
+        if self._states is not None and row.state not in self._states:
+            return False
+        return not self._text or self._text in row.name.casefold() or self._text in row.url.casefold()
+
+    def _relayout(self):
+        """Recalcular las filas visibles y su orden conservando la selección."""
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        old_ids = [self._visible[index.row()].job_id if index.row() < len(self._visible) else None for index in old]
+        if self._states is None and not self._text:
+            visible = list(self._rows)
+        else:
+            visible = [row for row in self._rows if self._accepts(row)]
+        if self._sort_column in self.SORT_KEYS:
+            visible.sort(key=self.SORT_KEYS[self._sort_column], reverse=self._sort_order == Qt.DescendingOrder)
+        self._visible = visible
+        self._position = {row.job_id: number for number, row in enumerate(visible)}
+        new = []
+        for index, job_id in zip(old, old_ids):
+            number = self._position.get(job_id)
+            new.append(self.index(number, index.column()) if number is not None else QModelIndex())
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        # -1 = orden de llegada
+        self._sort_column = column
+        self._sort_order = order
+        self._relayout()
+
+    # ---- consultas -----------------------------------------------------
+    def job_id(self, row: int) -> str | None:
+        return self._visible[row].job_id if 0 <= row < len(self._visible) else None
+
+    def counts(self) -> dict[str, int]:
+        """Trabajos por estado (también los que el filtro oculta)."""
+        counts: dict[str, int] = {}
+        for row in self._rows:
+            counts[row.state] = counts.get(row.state, 0) + 1
+        return counts
+
+    def remove_finished(self) -> int:
+        """Quitar las filas de trabajos terminados; devuelve cuántas."""
+        keep = [row for row in self._rows if row.state not in JobState.FINAL]
+        removed = len(self._rows) - len(keep)
+        if removed:
+            self.beginResetModel()
+            self._rows = keep
+            self._by_id = {row.job_id: row for row in keep}
+            self._visible = [row for row in self._visible if row.state not in JobState.FINAL]
+            self._position = {row.job_id: number for number, row in enumerate(self._visible)}
+            self.endResetModel()
+        return removed
+
+    # ---- QAbstractTableModel -------------------------------------------
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._visible[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            return self._display(row, column)
+        if role == PROGRESS_ROLE:
+            return row.fraction
+        if role == Qt.ToolTipRole and column in (self.NAME, self.STATUS):
+            return row.url if column == self.NAME else row.status
+        if role == Qt.TextAlignmentRole and column in (self.PROGRESS, self.SPEED, self.ETA, self.SIZE):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def _display(self, row: _Row, column: int):
+        if column == self.NAME:
+            return row.name
+        if column == self.KIND:
+            return row.kind
+        if column == self.STATE:
+            return "Retrying" if row.retrying and row.state == JobState.QUEUED else STATE_LABELS.get(row.state, row.state)
+        if column == self.PROGRESS:
+            return f"{row.fraction * 100:.1f}%" if row.fraction is not None else ""
+        if column == self.SPEED:
+            return f"{fmt_bytes(row.speed)}/s" if row.speed else ""
+        if column == self.ETA:
+            return fmt_eta(row.eta) if row.eta is not None else ""
+        if column == self.SIZE:
+            return fmt_bytes(row.size) if row.size else ""
+        if column == self.STATUS:
+            return row.status
+        return None
+
+
+class ProgressDelegate(QStyledItemDelegate):
+    """Barra de progreso pintada con el estilo actual, sin widget por fila."""
+
+    def paint(self, painter, option, index):
+        fraction = index.data(PROGRESS_ROLE)
+        if fraction is None:
+            super().paint(painter, option, index)
+            return
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(2, 3, -2, -3)
+        bar.minimum = 0
+        bar.maximum = 1000
+        bar.progress = int(fraction * 1000)
+        bar.text = index.data(Qt.DisplayRole) or ""
+        bar.textVisible = True
+        bar.state = option.state
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_ProgressBar, bar, painter, option.widget)
@@ -0,0 +1,420 @@
+"""Definición de trabajos de descarga y ejecución de un trabajo con yt_dlp.
+
+Este módulo no depende de Qt para que la CLI pueda usarlo igual que la GUI.
+"""
+import os
+import sys
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from .archive import get_archive, output_path
+from .autotune import get_autotuner
+from .cache import get_info_cache
+from .integrity import ALGORITHM as CHECKSUM_ALGORITHM, ContentStore, DownloadHasher, write_sidecar
+from .metrics import JobTrace, get_metrics
+from .postprocess import AUDIO_MODE_LABELS, convert_audio, get_postprocess_pool, plan_audio
+from .progress import Phase, ProgressEvent
+from .ratelimit import get_limiter
+from .retry import RetryPolicy
+from .segmented import DEFAULT_SEGMENTS
+from .session import get_session
+
+
+# política de salida de audio -> selector de formato de yt_dlp. Se prefiere
+# el flujo que ya viene en el códec pedido para poder copiarlo sin recodificar.
+AUDIO_FORMATS = {
+    "mp3": "bestaudio[acodec=mp3]/bestaudio/best",
+    "m4a": "bestaudio[ext=m4a]/bestaudio/best",
+    "opus": "bestaudio[acodec=opus]/bestaudio/best",
+    "original": "bestaudio/best",
+}
+DEFAULT_AUDIO_FORMAT = "mp3"
+# vídeo a la máxima calidad (ver `video_format`)
+VIDEO_FORMAT = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
+# intérpretes de JavaScript que yt_dlp puede usar con YouTube (deno es el suyo por defecto)
+JS_RUNTIMES = {'deno': {}, 'node': {}}
+# reintentos de cada petición y de cada fragmento HLS/DASH (los de la CLI de yt_dlp)
+DOWNLOAD_RETRIES = 10
+# espera entre esos reintentos; yt_dlp por defecto reintenta sin esperar
+_RETRY_SLEEP = RetryPolicy(base=0.25, max_delay=5.0)
+
+
+def _retry_sleep(n: int) -> float:
+    return _RETRY_SLEEP.delay(n + 1)
+
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    # descarga terminada, conversión pendiente en el pool de postprocesado
+    POSTPROCESSING = "postprocessing"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINAL = (DONE, FAILED, CANCELLED)
+
+
+class Priority:
+    """Prioridad en la cola: mayor pasa antes (ver `scheduler.FairQueue`)."""
+    BATCH = -10
+    NORMAL = 0
+    INTERACTIVE = 10
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras estaba en curso."""
+
+
+def new_job_id() -> str:
+    # único entre ejecuciones: el diario conserva ids de sesiones anteriores
+    return uuid.uuid4().hex[:12]
+
+
+@dataclass
+class DownloadJob:
+    """Un trabajo de descarga y su estado.
+
+    `options` se mezcla al final sobre las opciones calculadas, para que cada
+    llamador pueda ajustar formato, plantilla de salida, etc.
+
+    Con `defer_postprocess` la conversión de audio no se hace en el hilo de
+    descarga: `run_job` la deja en `postprocess` (un `Future` del pool de
+    postprocesado) y el llamador decide cuándo dar el trabajo por terminado.
+    `timings` guarda el tiempo total de cada fase en segundos (ver `JobTrace`).
+
+    `audio_format` es la política de salida de audio (ver `AUDIO_FORMATS`) y
+    `audio_mode` cómo se obtuvo: "keep", "copy" o "transcode".
+
+    `priority` ordena la cola de `DownloadManager` (ver `Priority`).
+    `attempts` cuenta las ejecuciones y `not_before` (reloj monotónico)
+    retrasa la siguiente tras un fallo pasajero (ver `retry.py`).
+    """
+    url: str
+    is_video: bool = True
+    quality: str | None = None
+    download_dir: str | None = None
+    options: dict = field(default_factory=dict)
+    use_cache: bool = True
+    use_archive: bool = True
+    rate_limit: int | None = None
+    audio_format: str = DEFAULT_AUDIO_FORMAT
+    priority: int = Priority.NORMAL
+    id: str = field(default_factory=new_job_id)
+    state: str = JobState.QUEUED
+    error: str | None = None
+    info: dict | None = None
+    skipped: bool = False
+    audio_mode: str | None = None
+    defer_postprocess: bool = False
+    postprocess: object = field(default=None, repr=False, compare=False)
+    timings: dict = field(default_factory=dict)
+    attempts: int = 0
+    not_before: float = field(default=0.0, repr=False)
+
+    @property
+    def kind(self) -> str:
+        return "video" if self.is_video else "audio"
+
+    @property
+    def profile(self) -> str:
+        """Lo que se pidió del vídeo: calidad o formato de audio (clave del archivo de descargas)."""
+        fmt = self.options.get('format')
+        if fmt:
+            return f"format:{fmt}"
+        if not self.is_video:
+            return self.audio_format
+        height = parse_height(self.quality)
+        return f"{height}p" if height else "best"
+
+    def output_dir(self) -> Path:
+        """Carpeta en la que yt_dlp escribirá el fichero (sin las partes con campos de la plantilla)."""
+        outtmpl = self.options.get('outtmpl')
+        if isinstance(outtmpl, dict):
+            outtmpl = outtmpl.get('default')
+        if not outtmpl:
+            return Path(self.download_dir or ".")
+        parts = []
+        for part in Path(outtmpl).parent.parts:
+            if "%(" in part:
+                break
+            parts.append(part)
+        return Path(*parts) if parts else Path(".")
+
+
+def audio_ydl_opts(audio_format: str = DEFAULT_AUDIO_FORMAT) -> dict:
+    """Formato y postprocesador de yt_dlp para una política de salida de audio.
+
+    FFmpegExtractAudio ya copia el flujo sin recodificar cuando el códec
+    coincide; "original" (`preferredcodec: best`) conserva siempre el de origen.
+    """
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"unknown audio format: {audio_format!r}")
+    return {
+        'format': AUDIO_FORMATS[audio_format],
+        'postprocessors': [
+            {
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'best' if audio_format == 'original' else audio_format,
+                'preferredquality': '192',
+            }
+        ],
+    }
+
+
+def parse_height(quality) -> int | None:
+    """Altura máxima de una calidad ("720p", "720", 720); None = la mejor disponible."""
+    if isinstance(quality, int):
+        return quality or None
+    try:
+        return int(str(quality).strip().lower().removesuffix("p"))
+    except ValueError:
+        # "Maximum Quality", "max", vacío...
+        return None
+
+
+def video_format(quality=None) -> str:
+    """Selector de formato de yt_dlp para vídeo con una calidad máxima opcional.
+
+    Se prefiere mp4+m4a, que se unen sin recodificar. Con `height<=?` cuentan
+    también los formatos que no declaran altura (en vez de descartarlos y
+    caer en `best`).
+    """
+    height = parse_height(quality)
+    if height is None:
+        return VIDEO_FORMAT
+    limit = f"[height<=?{height}]"
+    return f"bestvideo{limit}[ext=mp4]+bestaudio[ext=m4a]/bestvideo{limit}+bestaudio/best{limit}/best"
+
+
+def build_ydl_opts(is_video: bool = True, quality: str | None = None, download_dir: str | None = None,
+                   audio_format: str = DEFAULT_AUDIO_FORMAT) -> dict:
+    """Construir el diccionario de opciones de yt_dlp para un trabajo.
+
+    Es el único sitio donde se decide el formato: la GUI, `app.main` y la CLI
+    pasan por aquí (ver `engine.py`) y solo añaden ajustes en `job.options`.
+    """
+    # ficheros progresivos: varias conexiones por rangos (ver segmented.py).
+    # Usado como librería, yt_dlp no reintenta peticiones ni fragmentos y se
+    # salta los fragmentos que fallan: reintentar como su CLI y, si aun así
+    # falta uno, que falle el trabajo (lo reintenta la cola) en vez de dejar un
+    # fichero con huecos.
+    # `checksum`: huella calculada al escribir (ver integrity.py); None la desactiva.
+    # `checksum_sidecar` y `dedup_store` la guardan junto al fichero o deduplican.
+    ydl_opts: dict = {'segments': DEFAULT_SEGMENTS, 'checksum': CHECKSUM_ALGORITHM, 'retries': DOWNLOAD_RETRIES,
+                      'fragment_retries': DOWNLOAD_RETRIES, 'skip_unavailable_fragments': False,
+                      'retry_sleep_functions': {'http': _retry_sleep, 'fragment': _retry_sleep},
+                      'js_runtimes': dict(JS_RUNTIMES)}
+    if download_dir:
+        out = Path(download_dir) / "%(title)s.%(ext)s"
+        ydl_opts["outtmpl"] = str(out)
+
+    if is_video:
+        ydl_opts['format'] = video_format(quality)
+        ydl_opts['merge_output_format'] = 'mp4'
+    else:
+        # extracción de audio (requiere ffmpeg salvo que no haga falta convertir)
+        ydl_opts.update(audio_ydl_opts(audio_format))
+    return ydl_opts
+
+
+def make_progress_hook(on_progress: Callable[[ProgressEvent], None]):
+    """Traducir los diccionarios de progreso de yt_dlp a `ProgressEvent`."""
+    def _hook(d):
+        on_progress(ProgressEvent.from_hook(d))
+    return _hook
+
+
+def make_postprocessor_hook(on_progress: Callable[[ProgressEvent], None]):
+    def _hook(d):
+        if d.get('status') == 'started':
+            name = d.get('postprocessor') or ''
+            on_progress(ProgressEvent(Phase.POSTPROCESSING, message=f"Post-processing {name}...".replace("  ", " ")))
+    return _hook
+
+
+# campos de la info de yt_dlp que se conservan en el trabajo terminado; la
+# info completa (formatos, miniaturas...) no se retiene en memoria
+_SUMMARY_KEYS = ("id", "title", "ext", "extractor_key", "webpage_url", "format_id", "duration", "filepath", "_filename",
+                 "digest", "deduplicated")
+
+
+def summarize_info(info: dict | None) -> dict | None:
+    if not info:
+        return info
+    summary = {k: info[k] for k in _SUMMARY_KEYS if k in info}
+    downloads = info.get("requested_downloads") or []
+    if downloads and downloads[-1].get("filepath"):
+        summary["filepath"] = downloads[-1]["filepath"]
+    return summary
+
+
+def run_job(job: DownloadJob, on_progress: Callable[[ProgressEvent], None], session=None, cache=None, archive=None) -> dict | None:
+    """Ejecutar un trabajo de forma bloqueante.
+
+    Usa la sesión, la caché de info y el archivo de descargas compartidos
+    salvo que se pasen otros (`job.use_cache`/`job.use_archive` los omiten).
+    Si el archivo ya tiene el vídeo en disco no se toca la red. Devuelve el
+    diccionario de info de yt_dlp. Las excepciones se propagan al llamador,
+    que decide cómo reportarlas. Los tramos por fase, bytes, reintentos y
+    errores se anotan en el registro de métricas al terminar el trabajo.
+    """
+    if session is None:
+        session = get_session()
+    if cache is None and job.use_cache:
+        cache = get_info_cache()
+    if archive is None and job.use_archive:
+        archive = get_archive()
+
+    trace = JobTrace(job.id)
+    if archive is not None:
+        entry = archive.find_url(job.url, job.kind, job.profile, job.output_dir())
+        if entry is not None:
+            job.skipped = True
+            job.info = {"filepath": entry["path"], "title": Path(entry["path"]).stem, "ext": Path(entry["path"]).suffix.lstrip(".")}
+            on_progress(ProgressEvent(Phase.SKIPPED, message=f"Already downloaded: {entry['path']}"))
+            _record(job, trace, "skipped")
+            return job.info
+
+    share = get_limiter().register(job.id, job.rate_limit)
+    try:
+        info = _download(job, on_progress, session, cache, archive, share, trace)
+    except Exception as exc:
+        trace.fail(exc)
+        _record(job, trace, JobState.FAILED)
+        raise
+    finally:
+        share.close()
+    if job.postprocess is None:
+        _record(job, trace, JobState.DONE)
+    return info
+
+
+def _record(job, trace, state):
+    job.timings = trace.durations()
+    get_metrics().record_job(job, trace, state)
+
+
+def _split_audio_postprocessor(ydl_opts: dict) -> dict | None:
+    """Quitar `FFmpegExtractAudio` de las opciones para hacerlo fuera de yt_dlp.
+
+    Solo si es el último postprocesador: los posteriores (metadatos,
+    miniatura...) esperan el fichero ya convertido.
+    """
+    pps = ydl_opts.get('postprocessors') or []
+    if not pps or pps[-1].get('key') != 'FFmpegExtractAudio':
+        return None
+    ydl_opts['postprocessors'] = pps[:-1]
+    return pps[-1]
+
+
+def _seal_output(info, ydl_opts, hasher, trace):
+    """Huella de la salida final y, según las opciones, fichero de huella y deduplicación.
+
+    Si la unión de formatos o un postprocesado cambió el fichero, se vuelve a
+    resumir ahora, recién escrito; si no, sirve la calculada al descargarlo.
+    """
+    path = output_path(info)
+    if hasher is None or not path or not os.path.exists(path):
+        return
+    trace.begin("checksum")
+    try:
+        digest = hasher.final_digest(path)
+        info['digest'] = digest
+        if ydl_opts.get('checksum_sidecar'):
+            write_sidecar(path, digest)
+        store = ydl_opts.get('dedup_store')
+        if store and ContentStore(store).dedup(path, digest):
+            info['deduplicated'] = True
+    except OSError as exc:
+        print(f"Checksum failed for {path}:", exc, file=sys.stderr)
+    finally:
+        trace.end("checksum")
+
+
+def _finish_audio(job, info, spec, ydl_opts, on_progress, archive, trace, hasher=None):
+    """Convertir el audio descargado; se ejecuta en el pool de postprocesado."""
+    try:
+        info = _convert_audio(job, info, spec, ydl_opts, on_progress, archive, trace, hasher)
+    except Exception as exc:
+        trace.fail(exc)
+        _record(job, trace, JobState.FAILED)
+        raise
+    _record(job, trace, JobState.DONE)
+    return info
+
+
+def _convert_audio(job, info, spec, ydl_opts, on_progress, archive, trace, hasher=None):
+    trace.begin("extract_audio")
+    on_progress(ProgressEvent(Phase.POSTPROCESSING, message="Post-processing ExtractAudio..."))
+    dst, job.audio_mode = convert_audio(
+        output_path(info),
+        target=spec.get('preferredcodec') or 'mp3',
+        acodec=info.get('acodec'),
+        audio_only=info.get('vcodec') == 'none',
+        quality=spec.get('preferredquality'),
+        ffmpeg=ydl_opts.get('ffmpeg_location'),
+        keep_original=bool(ydl_opts.get('keepvideo')),
+    )
+    info['filepath'] = dst
+    info['ext'] = Path(dst).suffix.lstrip('.')
+    for download in info.get('requested_downloads') or []:
+        download['filepath'] = dst
+    trace.end("extract_audio")
+    _seal_output(info, ydl_opts, hasher, trace)
+    if archive is not None:
+        archive.record(info, job.kind, job.profile, url=job.url)
+    job.info = summarize_info(info)
+    on_progress(ProgressEvent(Phase.FINISHED, message=f"Download completed ({AUDIO_MODE_LABELS[job.audio_mode]})", filename=dst))
+    return info
+
+
+def _download(job, on_progress, session, cache, archive, share, trace):
+    def _progress(event: ProgressEvent):
+        if event.phase == Phase.DOWNLOADING:
+            share.observe(event.speed)
+        on_progress(event)
+
+    trace.begin("extract")
+    on_progress(ProgressEvent(Phase.EXTRACTING))
+
+    ydl_opts = build_ydl_opts(job.is_video, job.quality, job.download_dir, job.audio_format)
+    ydl_opts.update(job.options)
+    ydl_opts['progress_hooks'] = [make_progress_hook(_progress), trace.progress_hook]
+    hasher = DownloadHasher(ydl_opts['checksum']) if ydl_opts.get('checksum') else None
+    if hasher is not None:
+        ydl_opts['progress_hooks'].append(hasher.progress_hook)
+    ydl_opts['postprocessor_hooks'] = [make_postprocessor_hook(on_progress), trace.postprocessor_hook]
+    ydl_opts['retry_hooks'] = [trace.retry_hook]
+    ydl_opts['bandwidth'] = share
+    if 'concurrent_fragment_downloads' not in ydl_opts:
+        # sin valor fijo en las opciones, el autotuner decide por descarga
+        ydl_opts['autotune'] = get_autotuner().ticket(job.url)
+    deferred = _split_audio_postprocessor(ydl_opts) if job.defer_postprocess else None
+
+    info = session.extract_info(job.url, ydl_opts, download=True, cache=cache if job.use_cache else None)
+    trace.end()
+    if deferred is not None and info:
+        # liberar el hilo de red: la conversión sigue en el pool
+        on_progress(ProgressEvent(Phase.POSTPROCESSING, message="Queued for conversion..."))
+        trace.begin("postprocess_queue")
+        job.postprocess = get_postprocess_pool().submit(
+            _finish_audio, job, info, deferred, ydl_opts, on_progress, archive, trace, hasher
+        )
+        return info
+    if info:
+        _seal_output(info, ydl_opts, hasher, trace)
+    if archive is not None and info:
+        archive.record(info, job.kind, job.profile, url=job.url)
+    job.info = summarize_info(info)
+    message = None
+    if not job.is_video and info:
+        # FFmpegExtractAudio decidió por su cuenta; deducir el camino del códec
+        spec = next((pp for pp in ydl_opts.get('postprocessors') or [] if pp.get('key') == 'FFmpegExtractAudio'), None)
+        if spec is not None:
+            job.audio_mode = plan_audio(None, info.get('acodec'), spec.get('preferredcodec') or 'mp3', audio_only=False)
+            message = f"Download completed ({AUDIO_MODE_LABELS[job.audio_mode]})"
+    on_progress(ProgressEvent(Phase.FINISHED, message=message))
+    return info
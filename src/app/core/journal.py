@@ -0,0 +1,225 @@
+"""Diario de trabajos en disco, de solo anexado, para reanudar tras un cierre.
+
+Cada línea es un registro JSON:
+- {"op": "submit", "id", "url", "is_video", "quality", "download_dir", "options", "audio_format",
+   "use_cache", "use_archive", "rate_limit", "priority", "pid", "ts"}
+- {"op": "progress", "id", "phase", "bytes", "total", "path", "ts"}
+- {"op": "done" | "failed" | "cancelled", "id", "ts"}
+
+Al arrancar, `unfinished()` reproduce el diario y devuelve los trabajos sin
+registro final cuyo proceso ya no existe; se reenvían con el mismo destino y
+yt_dlp (o la descarga segmentada) continúa desde los ficheros `.part`.
+Una línea final cortada por un cierre brusco se ignora.
+
+Varios procesos (GUI, `serve`, `worker`, cada ejecución de la CLI) comparten
+el diario: anexar y compactar se hacen con un cerrojo de fichero
+(`journal.jsonl.lock`), así la reescritura de `compact` no pierde las líneas
+que otro proceso añade mientras tanto.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from .jobs import DEFAULT_AUDIO_FORMAT, DownloadJob, JobState, Priority
+from .paths import user_data_dir
+from .progress import Phase
+
+PROGRESS_INTERVAL = 5.0
+_FINAL_OPS = (JobState.DONE, JobState.FAILED, JobState.CANCELLED)
+
+
+def _pid_alive(pid) -> bool:
+    if not pid or pid == os.getpid():
+        return False
+    if os.name == "nt":
+        # sin una forma barata y fiable: tratar como terminado
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Cerrojo exclusivo entre procesos sobre `path` (se crea si no existe)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class JobJournal:
+    def __init__(self, path=None, progress_interval: float = PROGRESS_INTERVAL):
+        self.path = Path(path) if path else user_data_dir() / "journal.jsonl"
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._last_progress: dict[str, tuple[float, str]] = {}
+        # trabajos con "submit" ya escrito por este proceso y aún sin final
+        self._submitted: set[str] = set()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, _file_lock(self.path.with_name(self.path.name + ".lock")):
+            yield
+
+    # ---- escritura -----------------------------------------------------
+    def append(self, record: dict, sync: bool = False):
+        record.setdefault("ts", time.time())
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._locked():
+            # abrir con el cerrojo: `compact` puede haber cambiado el fichero
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+
+    def record_submit(self, job: DownloadJob):
+        self.append({
+            "op": "submit", "id": job.id, "url": job.url, "is_video": job.is_video,
+            "quality": job.quality, "download_dir": job.download_dir, "options": job.options,
+            "audio_format": job.audio_format, "use_cache": job.use_cache, "use_archive": job.use_archive,
+            "rate_limit": job.rate_limit, "priority": job.priority, "pid": os.getpid(),
+        }, sync=True)
+
+    def record_progress(self, job_id: str, event):
+        now = time.monotonic()
+        last = self._last_progress.get(job_id)
+        if last and last[1] == event.phase and now - last[0] < self.progress_interval:
+            return
+        self._last_progress[job_id] = (now, event.phase)
+        self.append({
+            "op": "progress", "id": job_id, "phase": event.phase,
+            "bytes": event.downloaded_bytes, "total": event.total_bytes, "path": event.filename,
+        })
+
+    def record_final(self, job_id: str, state: str):
+        self._last_progress.pop(job_id, None)
+        self.append({"op": state, "id": job_id}, sync=True)
+
+    def attach(self, manager):
+        """Registrar en el diario los trabajos de un `DownloadManager`."""
+        def _on_event(job_id, event, payload):
+            if event == "state":
+                if payload == JobState.QUEUED:
+                    # los reintentos vuelven a QUEUED: solo cuenta el primer envío
+                    if job_id in self._submitted:
+                        return
+                    job = manager.get(job_id)
+                    if job is not None:
+                        self._submitted.add(job_id)
+                        self.record_submit(job)
+                elif payload in JobState.FINAL:
+                    self._submitted.discard(job_id)
+                    self.record_final(job_id, payload)
+            elif event == "progress" and payload.phase != Phase.SKIPPED:
+                self.record_progress(job_id, payload)
+
+        manager.add_listener(_on_event)
+
+    # ---- lectura -------------------------------------------------------
+    def _replay(self) -> dict[str, dict]:
+        jobs: dict[str, dict] = {}
+        if not self.path.exists():
+            return jobs
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                job_id = rec.get("id")
+                op = rec.get("op")
+                if op == "submit":
+                    jobs[job_id] = dict(rec, progress=None, final=None)
+                elif job_id in jobs:
+                    if op == "progress":
+                        jobs[job_id]["progress"] = rec
+                    elif op in _FINAL_OPS:
+                        jobs[job_id]["final"] = op
+        return jobs
+
+    def unfinished(self) -> list[dict]:
+        """Trabajos enviados sin estado final y cuyo proceso ya no vive."""
+        return [
+            rec for rec in self._replay().values()
+            if rec["final"] is None and not _pid_alive(rec.get("pid"))
+        ]
+
+    def discard(self, job_ids):
+        for job_id in job_ids:
+            self.record_final(job_id, JobState.CANCELLED)
+
+    def compact(self):
+        """Reescribir el diario con solo los trabajos aún sin terminar."""
+        with self._locked():
+            jobs = self._replay()
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for rec in jobs.values():
+                    if rec["final"] is not None:
+                        continue
+                    progress = rec.pop("progress")
+                    rec.pop("final")
+                    f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+                    if progress:
+                        f.write(json.dumps(progress, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    @staticmethod
+    def job_from_record(rec: dict) -> DownloadJob:
+        """Reconstruir el trabajo conservando su id para continuar el diario."""
+        return DownloadJob(
+            url=rec["url"], is_video=rec.get("is_video", True), quality=rec.get("quality"),
+            download_dir=rec.get("download_dir"), options=rec.get("options") or {}, id=rec["id"],
+            audio_format=rec.get("audio_format") or DEFAULT_AUDIO_FORMAT,
+            use_cache=rec.get("use_cache", True), use_archive=rec.get("use_archive", True),
+            rate_limit=rec.get("rate_limit"), priority=rec.get("priority", Priority.NORMAL),
+        )
+
+
+_default_journal: JobJournal | None = None
+_default_lock = threading.Lock()
+
+
+def get_journal() -> JobJournal | None:
+    """Diario compartido del proceso; None si no se puede usar."""
+    global _default_journal
+    with _default_lock:
+        if _default_journal is None:
+            try:
+                _default_journal = JobJournal()
+                _default_journal.compact()
+            except Exception as exc:
+                print("Job journal disabled:", exc)
+                _default_journal = None
+                return None
+        return _default_journal
@@ -0,0 +1,431 @@
+"""Cola de descargas con un pool acotado de hilos de trabajo.
+
+`DownloadManager` no depende de Qt: la GUI lo envuelve en `DownloadQueue`
+(ver `downloader.py`) y `engine.DownloadEngine` le pone una API asyncio
+encima, que es la que usan la CLI, `app.main` y `DownloadWorker`.
+
+Los oyentes reciben `(job_id, event, payload)` donde `event` es:
+- "state": payload es el nuevo `JobState`.
+- "playlist": payload es {"url", "queued", "done", "error"} mientras se
+  expande una playlist enviada con `submit_playlist`.
+- "progress": payload es un `ProgressEvent`, limitado a `progress_rate`
+  eventos por segundo y trabajo (los cambios de fase pasan siempre).
+
+Con `defer_postprocess` (por defecto) la conversión de audio se hace en el
+pool de `postprocess.py`: el hilo de descarga pasa a la siguiente URL y el
+trabajo queda en `JobState.POSTPROCESSING` hasta que la conversión termina.
+
+La cola es una `scheduler.FairQueue`: los trabajos de mayor `priority` pasan
+antes, cada dominio (o extractor) tiene un tope de trabajos simultáneos y
+los dominios con trabajo pendiente se atienden por turnos.
+
+Los fallos pasajeros (5xx, 429, cortes) no terminan el trabajo: vuelve a la
+cola con una espera exponencial (ver `retry.py`) sin ocupar un hilo mientras
+tanto, y el cortacircuitos de su dominio frena al resto si el sitio cae.
+
+El `runner` ejecuta cada trabajo; si tiene un método `cancel(job_id)` (como
+`procpool.ProcessBackend`) también se pueden cancelar trabajos en curso.
+
+Los trabajos terminados se conservan para `get`/`jobs`; con `keep_finished`
+solo los últimos N, para procesos de larga duración (`serve`, `worker`).
+"""
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from .jobs import DownloadJob, JobCancelled, JobState, new_job_id, run_job
+from .metrics import get_metrics
+from .playlist import iter_playlist_jobs
+from .postprocess import get_postprocess_pool
+from .prefetch import wait_pending
+from .progress import DEFAULT_MAX_RATE, Phase, ProgressEvent, ProgressThrottle
+from .retry import RetryPolicy, classify, get_breaker
+from .scheduler import DEFAULT_HOST_LIMIT, FairQueue, host_key
+
+DEFAULT_MAX_WORKERS = 4
+# trabajos terminados que conservan el demonio y los workers de la cola
+KEEP_FINISHED = 1000
+# trabajos en cola por hilo antes de frenar la expansión de una playlist
+PENDING_PER_WORKER = 4
+
+Listener = Callable[[str, str, object], None]
+
+
+class DownloadManager:
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, runner=run_job, progress_rate: float = DEFAULT_MAX_RATE,
+                 defer_postprocess: bool = True, host_limit: int = DEFAULT_HOST_LIMIT, limits: dict[str, int] | None = None,
+                 retry: RetryPolicy | None = None, breaker=None, keep_finished: int | None = None):
+        self._runner = runner
+        # None: conservar todos los trabajos terminados
+        self.keep_finished = keep_finished
+        self._finished: deque[str] = deque()
+        # RetryPolicy(max_attempts=1) desactiva los reintentos
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else get_breaker()
+        self.progress_rate = progress_rate
+        self.defer_postprocess = defer_postprocess
+        self._max_workers = max(1, int(max_workers))
+        self._cond = threading.Condition()
+        self._pending = FairQueue(host_limit, limits, breaker=self.breaker)
+        self._jobs: dict[str, DownloadJob] = {}
+        # runner con el que se ejecuta cada trabajo en curso
+        self._active: dict[str, object] = {}
+        self._listeners: list[Listener] = []
+        self._workers = 0
+        self._running = 0
+        self._postprocessing = 0
+        self._producers = 0
+        self._download_time = 0.0
+        self._downloads_timed = 0
+        self._closed = False
+
+    # ---- oyentes -------------------------------------------------------
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener):
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _emit(self, job_id: str, event: str, payload):
+        for listener in list(self._listeners):
+            try:
+                listener(job_id, event, payload)
+            except Exception as exc:
+                print(f"Listener error ({event}):", exc, file=sys.stderr)
+        # después de los oyentes: todavía pueden consultar el trabajo con `get`
+        if event == "state" and payload in JobState.FINAL and self.keep_finished is not None:
+            self._retire(job_id)
+
+    def _retire(self, job_id: str):
+        with self._cond:
+            self._finished.append(job_id)
+            while len(self._finished) > self.keep_finished:
+                old = self._jobs.get(self._finished.popleft())
+                # un id reenviado después de terminar vuelve a estar activo
+                if old is not None and old.state in JobState.FINAL:
+                    del self._jobs[old.id]
+
+    # ---- API pública ---------------------------------------------------
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def can_cancel_running(self) -> bool:
+        """True si el runner actual puede parar trabajos en curso (ver `cancel`)."""
+        return callable(getattr(self._runner, "cancel", None))
+
+    def set_max_workers(self, value: int):
+        """Cambiar la concurrencia máxima en caliente."""
+        with self._cond:
+            self._max_workers = max(1, int(value))
+            self._spawn_workers()
+            self._cond.notify_all()
+
+    def set_limit(self, key: str, value: int | None):
+        """Tope de trabajos simultáneos para un dominio o extractor (None lo quita)."""
+        with self._cond:
+            self._pending.set_limit(key, value)
+            self._cond.notify_all()
+
+    def set_host_limit(self, value: int):
+        """Tope por defecto para los dominios sin tope propio (0 = sin tope)."""
+        with self._cond:
+            self._pending.host_limit = max(0, int(value))
+            self._cond.notify_all()
+
+    def set_runner(self, runner):
+        """Cambiar el runner; los trabajos en curso terminan con el anterior."""
+        with self._cond:
+            self._runner = runner
+
+    def submit(self, url: str | None = None, *, job: DownloadJob | None = None, **kwargs) -> str:
+        """Encolar un trabajo y devolver su id."""
+        if job is None:
+            job = DownloadJob(url=url, **kwargs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("DownloadManager is shut down")
+            job.state = JobState.QUEUED
+            if self.defer_postprocess:
+                job.defer_postprocess = True
+            self._jobs[job.id] = job
+            self._pending.push(job)
+            self._spawn_workers()
+            self._cond.notify_all()
+        self._emit(job.id, "state", JobState.QUEUED)
+        return job.id
+
+    def submit_many(self, jobs, max_pending: int | None = None) -> int:
+        """Encolar trabajos de un iterable perezoso con contrapresión.
+
+        Se bloquea mientras haya más de `max_pending` trabajos en cola, de modo
+        que el productor (p. ej. una playlist paginada) avanza al ritmo de las
+        descargas. Si hay hilos libres y todo lo pendiente espera al tope de su
+        dominio, se sigue leyendo (hasta `PENDING_PER_WORKER` veces más) en
+        busca de trabajos de otros dominios. Devuelve cuántos se encolaron.
+        """
+        count = 0
+        for job in jobs:
+            if not self.wait_for_room(max_pending):
+                break
+            self.submit(job=job)
+            count += 1
+        return count
+
+    def wait_for_room(self, max_pending: int | None = None, timeout: float | None = None) -> bool:
+        """Bloquear hasta que quepa otro trabajo en cola (ver `submit_many`).
+
+        Devuelve False si vence `timeout` o el gestor se ha cerrado.
+        """
+        with self._cond:
+            limit = max_pending or self._max_workers * PENDING_PER_WORKER
+            self._cond.wait_for(lambda: self._closed or len(self._pending) < limit or self._starved(limit), timeout)
+            return not self._closed and (len(self._pending) < limit or self._starved(limit))
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit_playlist(self, url: str, **job_kwargs) -> str:
+        """Expandir una playlist en segundo plano encolando cada entrada.
+
+        Devuelve un id de playlist; el avance se notifica con eventos "playlist".
+        """
+        playlist_id = new_job_id()
+        with self._cond:
+            self._producers += 1
+
+        def _produce():
+            queued = 0
+            error = None
+            try:
+                for job in iter_playlist_jobs(url, **job_kwargs):
+                    queued += self.submit_many([job])
+                    self._emit(playlist_id, "playlist", {"url": url, "queued": queued, "done": False, "error": None})
+            except Exception as exc:
+                error = str(exc)
+            finally:
+                with self._cond:
+                    self._producers -= 1
+                    self._cond.notify_all()
+            self._emit(playlist_id, "playlist", {"url": url, "queued": queued, "done": True, "error": error})
+
+        threading.Thread(target=_produce, name=f"playlist-{playlist_id}", daemon=True).start()
+        return playlist_id
+
+    def get(self, job_id: str) -> DownloadJob | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[DownloadJob]:
+        with self._cond:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancelar un trabajo en cola, o en curso si el runner sabe cancelarlo."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job.state == JobState.RUNNING:
+                runner = self._active.get(job_id)
+                cancel = getattr(runner, "cancel", None)
+                # el trabajo pasa a CANCELLED cuando el runner lanza JobCancelled
+                return bool(cancel and cancel(job_id))
+            if job.state != JobState.QUEUED:
+                return False
+            if not self._pending.remove(job):
+                return False
+            job.state = JobState.CANCELLED
+            self._cond.notify_all()
+        self._emit(job_id, "state", JobState.CANCELLED)
+        return True
+
+    def wait_job(self, job_id: str, timeout: float | None = None) -> DownloadJob:
+        """Bloquear hasta que el trabajo llegue a un estado final."""
+        with self._cond:
+            job = self._jobs[job_id]
+            self._cond.wait_for(lambda: job.state in JobState.FINAL, timeout)
+            return job
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Bloquear hasta que no queden trabajos en cola, en curso, convirtiéndose ni playlists expandiéndose."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: (not self._pending and self._running == 0 and self._postprocessing == 0
+                         and self._producers == 0),
+                timeout,
+            )
+
+    def stats(self) -> dict:
+        """Profundidad de cola (total y por dominio) y tiempos de cada etapa (red y postprocesado)."""
+        with self._cond:
+            download = {
+                "workers": self._max_workers,
+                "queued": len(self._pending),
+                "running": self._running,
+                "avg_run_s": round(self._download_time / self._downloads_timed, 3) if self._downloads_timed else None,
+            }
+            postprocessing = self._postprocessing
+            hosts = self._pending.snapshot()
+        for host, state in self.breaker.snapshot().items():
+            hosts.setdefault(host, {"running": 0, "queued": 0})["circuit"] = state
+        return {"download": download, "hosts": hosts, "postprocess": dict(get_postprocess_pool().stats(), pending_jobs=postprocessing)}
+
+    def shutdown(self, wait: bool = True):
+        with self._cond:
+            self._closed = True
+            cancelled = []
+            for job in self._pending.clear():
+                job.state = JobState.CANCELLED
+                cancelled.append(job.id)
+            self._cond.notify_all()
+        for job_id in cancelled:
+            self._emit(job_id, "state", JobState.CANCELLED)
+        if wait:
+            self.wait()
+
+    def _starved(self, limit: int) -> bool:
+        # llamado con el lock tomado
+        return (self._running < self._max_workers and len(self._pending) < limit * PENDING_PER_WORKER
+                and not self._pending.has_runnable())
+
+    # ---- hilos de trabajo ---------------------------------------------
+    def _spawn_workers(self):
+        # llamado con el lock tomado
+        wanted = min(self._max_workers, len(self._pending) + self._running)
+        while self._workers < wanted:
+            self._workers += 1
+            threading.Thread(target=self._worker_loop, name=f"download-worker-{self._workers}", daemon=True).start()
+
+    def _next_job(self) -> DownloadJob | None:
+        # llamado con el lock tomado
+        if self._pending and self._running < self._max_workers:
+            return self._pending.pop()
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if self._closed or self._workers > self._max_workers:
+                        self._workers -= 1
+                        return
+                    job = self._next_job()
+                    if job is None:
+                        if not self._pending:
+                            # sin trabajo: liberar el hilo
+                            self._workers -= 1
+                            return
+                        # despertar cuando venza la espera de un reintento o de un circuito abierto
+                        self._cond.wait(self._pending.next_ready_in())
+                job.state = JobState.RUNNING
+                job.attempts += 1
+                self._running += 1
+                self._pending.started(job)
+                runner = self._active[job.id] = self._runner
+            started = time.monotonic()
+            emit = self._execute(job, runner)
+            if job.state != JobState.QUEUED:
+                self._emit(job.id, "state", job.state)
+            if job.state == JobState.POSTPROCESSING:
+                job.postprocess.add_done_callback(lambda future, job=job, emit=emit: self._finish_postprocess(job, emit, future))
+            with self._cond:
+                self._running -= 1
+                self._pending.finished(job)
+                self._active.pop(job.id, None)
+                self._download_time += time.monotonic() - started
+                self._downloads_timed += 1
+                retried = job.state == JobState.QUEUED
+                if retried and not self._closed:
+                    self._pending.push(job)
+                elif retried:
+                    # el gestor se cerró antes del reintento: queda el último error
+                    job.state = JobState.FAILED
+                self._cond.notify_all()
+            if retried:
+                self._emit(job.id, "state", job.state)
+
+    def _execute(self, job: DownloadJob, runner):
+        """Ejecutar la etapa de red; devuelve el emisor de progreso del trabajo."""
+        self._emit(job.id, "state", JobState.RUNNING)
+        throttle = ProgressThrottle(self.progress_rate)
+        emit = throttle.wrap(lambda event: self._emit(job.id, "progress", event))
+        try:
+            if job.use_cache:
+                # si la GUI ya está extrayendo esta URL, aprovechar esa extracción
+                wait_pending(job.url)
+            runner(job, emit)
+        except JobCancelled:
+            self.breaker.release(host_key(job.url))
+            job.state = JobState.CANCELLED
+            emit(ProgressEvent(Phase.ERROR, message="Cancelled"))
+            return emit
+        except Exception as exc:
+            self._retry_or_fail(job, emit, exc)
+            return emit
+        self.breaker.success(host_key(job.url))
+        job.error = None
+        if job.postprocess is None:
+            job.state = JobState.DONE
+        else:
+            with self._cond:
+                self._postprocessing += 1
+            job.state = JobState.POSTPROCESSING
+        return emit
+
+    def _retry_or_fail(self, job: DownloadJob, emit, exc: Exception):
+        """Reencolar el trabajo con espera si el fallo es pasajero; si no, darlo por fallido."""
+        failure = classify(exc)
+        host = host_key(job.url)
+        self.breaker.record(host, failure)
+        if self.breaker.gave_up(host):
+            self._fail(job, emit, exc)
+            self._fail_host(host, exc)
+            return
+        if self._closed or not self.retry.should_retry(failure, job.attempts):
+            self._fail(job, emit, exc)
+            return
+        delay = self.retry.delay(job.attempts, failure.retry_after)
+        job.error = str(exc)
+        job.not_before = time.monotonic() + delay
+        job.state = JobState.QUEUED
+        get_metrics().counter("videoleech_job_retries_total", "Jobs re-queued after a transient failure").inc(reason=failure.reason)
+        emit(ProgressEvent(Phase.RETRYING, eta=delay,
+                           message=f"{failure.reason}, retrying in {delay:.0f}s (attempt {job.attempts + 1}/{self.retry.max_attempts})"))
+
+    def _fail_host(self, host: str, exc: Exception):
+        """El sitio no se recupera: dar por fallidos los trabajos que esperaban por él."""
+        with self._cond:
+            dropped = self._pending.drop_host(host)
+            for job in dropped:
+                job.error = f"{host} unavailable (gave up after repeated failures): {exc}"
+                job.state = JobState.FAILED
+            self._cond.notify_all()
+        for job in dropped:
+            self._emit(job.id, "state", JobState.FAILED)
+
+    def _finish_postprocess(self, job: DownloadJob, emit, future):
+        # hilo del pool de postprocesado (o el actual si ya había terminado)
+        exc = future.exception()
+        if exc is None:
+            job.state = JobState.DONE
+        else:
+            self._fail(job, emit, exc)
+        job.postprocess = None
+        self._emit(job.id, "state", job.state)
+        with self._cond:
+            self._postprocessing -= 1
+            self._cond.notify_all()
+
+    @staticmethod
+    def _fail(job: DownloadJob, emit, exc: BaseException):
+        job.error = str(exc)
+        job.state = JobState.FAILED
+        emit(ProgressEvent(Phase.ERROR, message=f"Error: {exc}"))
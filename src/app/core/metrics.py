@@ -0,0 +1,331 @@
+"""Métricas de proceso: tramos de tiempo por fase, bytes, reintentos y errores.
+
+`JobTrace` registra los tramos de un trabajo (extracción, descarga, merge,
+cada postprocesador y la conversión diferida) a partir de los hooks de
+yt_dlp. Al terminar, `MetricsRegistry.record_job` acumula contadores e
+histogramas y, si hay un fichero de trabajos configurado, escribe el detalle
+del trabajo como una línea JSON.
+
+El registro se exporta como líneas JSON (`write_jsonl`) o en formato de texto
+de Prometheus (`write_prometheus`, apto para el textfile collector de
+node_exporter). En el fichero JSON lines, `"record": "job"` marca el detalle
+de un trabajo y `"record": "metric"` una serie del registro.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# segundos
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# nombre del postprocesador de yt_dlp -> fase
+_PP_PHASES = {"Merger": "merge", "ExtractAudio": "extract_audio"}
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, lock: threading.Lock):
+        self.name = name
+        self.help = help
+        self._lock = lock
+        self._series: dict[tuple, object] = {}
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(_labels_key(labels), 0)
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self._series.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[_labels_key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, lock, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        out = []
+        for key, series in self._series.items():
+            for bound, count in zip(self.buckets, series["counts"]):
+                out.append((f"{self.name}_bucket", key + (("le", _fmt_value(bound)),), count))
+            out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series["count"]))
+            out.append((f"{self.name}_sum", key, series["sum"]))
+            out.append((f"{self.name}_count", key, series["count"]))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        self.job_log: Path | None = None
+        # llamables que reciben cada registro de trabajo terminado
+        self.job_sinks: list = []
+        self.jobs = self.counter("videoleech_jobs_total", "Finished jobs by kind and final state")
+        self.phase_seconds = self.histogram("videoleech_phase_seconds", "Time spent in each job phase")
+        self.job_seconds = self.histogram("videoleech_job_seconds", "Wall time of finished jobs")
+        self.bytes = self.counter("videoleech_downloaded_bytes_total", "Bytes downloaded")
+        self.retries = self.counter("videoleech_retries_total", "Network retries")
+        self.errors = self.counter("videoleech_errors_total", "Failed jobs by phase and error type")
+
+    def _register(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, threading.Lock(), **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._register(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._register(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, buckets=buckets)
+
+    # ---- trabajos ------------------------------------------------------
+    def record_job(self, job, trace: "JobTrace", state: str):
+        """Acumular un trabajo terminado y anotarlo en `job_log` si está configurado."""
+        return self.add_record(trace.to_record(job, state))
+
+    def add_record(self, record: dict):
+        """Acumular un registro de `JobTrace.to_record` (p. ej. llegado de otro proceso)."""
+        self.jobs.inc(kind=record["kind"], state=record["state"])
+        for span in record["spans"]:
+            self.phase_seconds.observe(span["duration"], phase=span["phase"])
+        self.job_seconds.observe(record["duration"], kind=record["kind"])
+        if record["bytes"]:
+            self.bytes.inc(record["bytes"], kind=record["kind"])
+        if record["retries"]:
+            self.retries.inc(record["retries"])
+        if record["error"] is not None:
+            self.errors.inc(phase=record["error"]["phase"], error=record["error"]["type"])
+        if self.job_log is not None:
+            self._append(self.job_log, record)
+        for sink in list(self.job_sinks):
+            sink(record)
+        return record
+
+    def _append(self, path: Path, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    # ---- exportación ---------------------------------------------------
+    def snapshot(self) -> list[dict]:
+        """Una entrada por serie: {"metric", "type", "labels", "value"}."""
+        out = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            with metric._lock:
+                samples = metric.samples()
+            for name, key, value in samples:
+                out.append({"metric": name, "type": metric.kind, "labels": dict(key), "value": value})
+        return out
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            with metric._lock:
+                samples = metric.samples()
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in samples:
+                lines.append(f"{name}{_fmt_labels(key)} {_fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Escribir de forma atómica (el collector nunca ve un fichero a medias)."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def write_jsonl(self, path):
+        now = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for entry in self.snapshot():
+                f.write(json.dumps(dict(entry, record="metric", ts=now), ensure_ascii=False) + "\n")
+
+
+class JobTrace:
+    """Tramos de tiempo de un trabajo, alimentados por los hooks de yt_dlp.
+
+    Cada fase abierta se cierra al empezar la siguiente. La descarga se da
+    por terminada en el último "finished" de yt_dlp, no al empezar el
+    postprocesado, para no contar la espera entre medias como red.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self.spans: list[dict] = []
+        self.bytes = 0
+        self.retries = 0
+        self.error: dict | None = None
+        self._open: tuple[str, float] | None = None
+        self._file_bytes: dict[str, int] = {}
+        self._download_end: float | None = None
+        self._lock = threading.Lock()
+
+    def begin(self, phase: str):
+        with self._lock:
+            self._close(time.monotonic())
+            self._open = (phase, time.monotonic())
+
+    def end(self, phase: str | None = None):
+        with self._lock:
+            if self._open is not None and (phase is None or self._open[0] == phase):
+                self._close(time.monotonic())
+
+    @contextmanager
+    def span(self, phase: str):
+        self.begin(phase)
+        try:
+            yield
+        finally:
+            self.end(phase)
+
+    def _close(self, now: float):
+        # llamado con el lock tomado
+        if self._open is None:
+            return
+        phase, start = self._open
+        if phase == "download" and self._download_end is not None:
+            now = self._download_end
+        self.spans.append({"phase": phase, "start": round(start - self._t0, 4), "duration": max(0.0, now - start)})
+        self._open = None
+
+    @property
+    def phase(self) -> str | None:
+        return self._open[0] if self._open else None
+
+    # ---- hooks de yt_dlp -----------------------------------------------
+    def progress_hook(self, d: dict):
+        status = d.get("status")
+        name = d.get("filename") or d.get("tmpfilename") or ""
+        if status == "downloading":
+            if self.phase != "download":
+                self.begin("download")
+            with self._lock:
+                self._download_end = None
+                self._file_bytes[name] = d.get("downloaded_bytes") or 0
+        elif status == "finished":
+            with self._lock:
+                self._file_bytes[name] = d.get("total_bytes") or d.get("downloaded_bytes") or self._file_bytes.get(name, 0)
+                self._download_end = time.monotonic()
+        with self._lock:
+            self.bytes = sum(self._file_bytes.values())
+
+    def postprocessor_hook(self, d: dict):
+        name = d.get("postprocessor") or "postprocess"
+        phase = _PP_PHASES.get(name, f"postprocess:{name}")
+        if d.get("status") == "started":
+            self.begin(phase)
+        elif d.get("status") == "finished":
+            self.end(phase)
+
+    def retry_hook(self, *_):
+        with self._lock:
+            self.retries += 1
+
+    def fail(self, exc: BaseException):
+        with self._lock:
+            phase = self.phase or (self.spans[-1]["phase"] if self.spans else "extract")
+            self.error = {"phase": phase, "type": type(exc).__name__, "message": str(exc)[:500]}
+
+    def durations(self) -> dict:
+        """Tiempo total por fase (una fase puede repetirse, p. ej. dos descargas)."""
+        with self._lock:
+            totals: dict[str, float] = {}
+            for span in self.spans:
+                totals[span["phase"]] = totals.get(span["phase"], 0.0) + span["duration"]
+            return totals
+
+    def to_record(self, job, state: str) -> dict:
+        self.end()
+        return {
+            "record": "job",
+            "job_id": self.job_id,
+            "url": job.url,
+            "kind": job.kind,
+            "state": state,
+            "ts": self.started,
+            "duration": time.monotonic() - self._t0,
+            "spans": [dict(span, duration=round(span["duration"], 4)) for span in self.spans],
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Registro compartido por todo el proceso (GUI y CLI)."""
+    return _default_registry
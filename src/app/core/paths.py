@@ -0,0 +1,36 @@
+"""Carpetas de usuario para caché y datos persistentes de VideoLeech."""
+import os
+import sys
+from pathlib import Path
+
+APP_NAME = "VideoLeech"
+
+
+def _ensure(path: Path) -> Path:
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+    except Exception:
+        pass
+    return path
+
+
+def user_cache_dir() -> Path:
+    """Carpeta de caché: %LOCALAPPDATA%, ~/Library/Caches o $XDG_CACHE_HOME."""
+    if os.name == "nt":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+        return _ensure(base / APP_NAME / "Cache")
+    if sys.platform == "darwin":
+        return _ensure(Path.home() / "Library" / "Caches" / APP_NAME)
+    base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return _ensure(base / APP_NAME.lower())
+
+
+def user_data_dir() -> Path:
+    """Carpeta de datos: %APPDATA%, ~/Library/Application Support o $XDG_DATA_HOME."""
+    if os.name == "nt":
+        base = Path(os.environ.get("APPDATA") or Path.home() / "AppData" / "Roaming")
+        return _ensure(base / APP_NAME)
+    if sys.platform == "darwin":
+        return _ensure(Path.home() / "Library" / "Application Support" / APP_NAME)
+    base = Path(os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share")
+    return _ensure(base / APP_NAME.lower())
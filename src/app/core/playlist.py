@@ -0,0 +1,109 @@
+"""Expansión perezosa de playlists y canales.
+
+`extract_info` sobre una playlist resuelve todas las entradas antes de
+descargar nada y las guarda en memoria. Aquí se usa extracción plana
+(`extract_flat`) con `lazy_playlist`, de modo que las páginas se piden a
+medida que se consumen y cada entrada se entrega como `DownloadJob` en cuanto
+se conoce. Con la contrapresión de `DownloadManager.submit_many` la
+resolución de páginas siguientes se solapa con las descargas y la memoria no
+depende de la longitud de la playlist.
+"""
+import re
+import sys
+from typing import Iterator
+from urllib.parse import parse_qs, urlsplit
+
+from .jobs import DownloadJob
+from .session import get_session
+
+PAGE_SIZE = 50
+
+FLAT_OPTS = {
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+    'quiet': True,
+    'no_warnings': True,
+}
+
+_PLAYLIST_PATH_RE = re.compile(
+    r"^/(playlist|channel/|c/|user/|@[^/]+/?(videos|streams|shorts|playlists)?/?$)|/sets/",
+    re.IGNORECASE,
+)
+
+
+def looks_like_playlist(url: str) -> bool:
+    """Heurística barata (sin red) para URLs de playlist o canal.
+
+    `watch?v=X&list=Y` se trata como un vídeo suelto.
+    """
+    parts = urlsplit(url or "")
+    query = parse_qs(parts.query)
+    if "list" in query and "v" not in query:
+        return True
+    return bool(_PLAYLIST_PATH_RE.search(parts.path))
+
+
+def _iter_entries(entries) -> Iterator[dict]:
+    if entries is None:
+        return
+    getslice = getattr(entries, "getslice", None)
+    if getslice is None:
+        # lista o generador perezoso
+        yield from entries
+        return
+    # PagedList de yt_dlp: pedir página a página
+    start = 0
+    while True:
+        page = getslice(start, start + PAGE_SIZE)
+        if not page:
+            return
+        yield from page
+        start += len(page)
+
+
+def iter_playlist_entries(url: str, session=None, opts: dict | None = None, _depth: int = 0) -> Iterator[dict]:
+    """Generar las entradas planas de una playlist/canal según se resuelven.
+
+    Las sub-playlists (p. ej. pestañas de un canal) se expanden en su lugar.
+    Una URL que no es playlist produce una única entrada con la propia URL.
+    """
+    if session is None:
+        session = get_session()
+    flat_opts = dict(FLAT_OPTS, **(opts or {}))
+    with session.acquire(flat_opts) as ydl:
+        result = ydl.extract_info(url, download=False, process=False)
+        if result and result.get("_type") == "url" and _depth < 3:
+            # redirección a la URL real de la playlist
+            result = ydl.extract_info(result["url"], download=False, process=False, ie_key=result.get("ie_key"))
+        if not result or result.get("_type") not in ("playlist", "multi_video"):
+            yield {"url": url, "title": (result or {}).get("title")}
+            return
+        nested = []
+        for entry in _iter_entries(result.get("entries")):
+            if not entry:
+                continue
+            if entry.get("_type") == "playlist" or (entry.get("_type") == "url" and entry.get("ie_key", "").endswith("Tab")):
+                nested.append(entry.get("url") or entry.get("webpage_url"))
+                continue
+            yield entry
+    if _depth < 3:
+        for sub in nested:
+            if sub:
+                yield from iter_playlist_entries(sub, session, opts, _depth + 1)
+
+
+def entry_url(entry: dict) -> str | None:
+    url = entry.get("url") or ""
+    if url.startswith(("http://", "https://")):
+        return url
+    return entry.get("webpage_url") or entry.get("original_url")
+
+
+def iter_playlist_jobs(url: str, session=None, **job_kwargs) -> Iterator[DownloadJob]:
+    """`DownloadJob` por cada entrada de la playlist, con los mismos ajustes."""
+    for entry in iter_playlist_entries(url, session=session):
+        target = entry_url(entry)
+        if not target:
+            print("Skipping playlist entry without URL:", entry.get("id"), file=sys.stderr)
+            continue
+        yield DownloadJob(url=target, **dict(job_kwargs, options=dict(job_kwargs.get("options") or {})))
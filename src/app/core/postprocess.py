@@ -0,0 +1,201 @@
+"""Etapa de postprocesado separada de la etapa de red.
+
+Con `FFmpegExtractAudio` dentro de yt_dlp, el hilo de descarga queda
+bloqueado durante toda la conversión antes de poder pedir la siguiente URL.
+Aquí la conversión se encola en un pool propio del tamaño del número de CPUs
+y el hilo de red queda libre en cuanto termina la descarga.
+
+El trabajo pesado lo hace ffmpeg en su propio proceso, así que el pool usa
+hilos que solo lanzan y esperan a ffmpeg: el paralelismo real es de procesos
+sin el coste de serializar nada hacia un `ProcessPoolExecutor`.
+
+Si el códec descargado ya es el pedido no se recodifica: se deja el fichero
+tal cual o se cambia de contenedor con `-c:a copy` (ver `plan_audio`).
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+# códec pedido a FFmpegExtractAudio -> (extensión, códec, encoder de ffmpeg)
+AUDIO_CODECS = {
+    "mp3": ("mp3", "mp3", "libmp3lame"),
+    "m4a": ("m4a", "aac", "aac"),
+    "aac": ("m4a", "aac", "aac"),
+    "opus": ("opus", "opus", "libopus"),
+    "vorbis": ("ogg", "vorbis", "libvorbis"),
+    "flac": ("flac", "flac", "flac"),
+    "wav": ("wav", "pcm", "pcm_s16le"),
+}
+# extensión con la que se copia cada códec sin recodificar
+CODEC_EXTS = {"aac": "m4a", "opus": "opus", "vorbis": "ogg", "mp3": "mp3", "flac": "flac"}
+
+# cómo se obtuvo el audio final
+KEEP = "keep"            # el fichero descargado ya es el resultado
+COPY = "copy"            # mismo códec: solo cambio de contenedor (-c:a copy)
+TRANSCODE = "transcode"  # recodificado
+AUDIO_MODE_LABELS = {KEEP: "no conversion", COPY: "stream copy", TRANSCODE: "re-encoded"}
+
+
+class PostProcessError(Exception):
+    pass
+
+
+def canonical_codec(acodec: str | None) -> str | None:
+    """'mp4a.40.2' -> 'aac', 'opus' -> 'opus'... None si no se conoce."""
+    if not acodec or acodec == "none":
+        return None
+    acodec = acodec.lower()
+    if acodec.startswith(("mp4a", "aac")):
+        return "aac"
+    if acodec.startswith("pcm"):
+        return "pcm"
+    for codec in ("opus", "vorbis", "mp3", "flac"):
+        if acodec.startswith(codec):
+            return codec
+    return acodec
+
+
+def plan_audio(src: str | None, acodec: str | None, target: str, audio_only: bool = True) -> str:
+    """Decidir si `src` (con códec `acodec`) se deja, se copia o se recodifica.
+
+    `target` es el `preferredcodec` de FFmpegExtractAudio; "best" (u
+    "original") conserva el códec de origen.
+    """
+    codec = canonical_codec(acodec)
+    if target in ("best", "original"):
+        if codec not in CODEC_EXTS:
+            return KEEP
+        ext = CODEC_EXTS[codec]
+    else:
+        ext, wanted, _ = AUDIO_CODECS.get(target, (target, target, target))
+        if codec != wanted:
+            return TRANSCODE
+    if audio_only and src and Path(src).suffix.lower() == "." + ext:
+        return KEEP
+    return COPY
+
+
+def find_ffmpeg(location: str | None = None) -> str:
+    if location:
+        path = Path(location)
+        if path.is_dir():
+            path = path / ("ffmpeg.exe" if os.name == "nt" else "ffmpeg")
+        return str(path)
+    found = shutil.which("ffmpeg")
+    if not found:
+        raise PostProcessError("ffmpeg not found")
+    return found
+
+
+def convert_audio(src: str, target: str = "mp3", acodec: str | None = None, audio_only: bool = True,
+                  quality: str | None = "192", ffmpeg: str | None = None, keep_original: bool = False) -> tuple[str, str]:
+    """Llevar `src` al códec `target` por el camino más barato.
+
+    Devuelve `(ruta_final, modo)` con modo `KEEP`, `COPY` o `TRANSCODE`.
+    `quality` sigue a FFmpegExtractAudio: un número < 10 es calidad VBR y uno
+    mayor, kbps; solo se usa al recodificar.
+    """
+    mode = plan_audio(src, acodec, target, audio_only)
+    if mode == KEEP:
+        return src, mode
+    codec = canonical_codec(acodec)
+    if mode == COPY:
+        ext = CODEC_EXTS[codec]
+        codec_args = ["-c:a", "copy"]
+        if codec == "aac":
+            # AAC en ADTS (HLS) necesita este filtro para ir en MP4/M4A
+            codec_args += ["-bsf:a", "aac_adtstoasc"]
+    else:
+        ext, _, encoder = AUDIO_CODECS.get(target, (target, target, target))
+        codec_args = ["-c:a", encoder]
+        if quality and encoder not in ("flac", "pcm_s16le"):
+            q = float(quality)
+            codec_args += ["-q:a", str(quality)] if q < 10 else ["-b:a", f"{int(q)}k"]
+    dst = str(Path(src).with_suffix("." + ext))
+    if dst == src:
+        dst = str(Path(src).with_suffix(".converted." + ext))
+    cmd = [find_ffmpeg(ffmpeg), "-y", "-loglevel", "error", "-i", src, "-vn", *codec_args, dst]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise PostProcessError(proc.stderr.strip() or f"ffmpeg exited with {proc.returncode}")
+    if not keep_original:
+        try:
+            os.remove(src)
+        except OSError:
+            pass
+    return dst, mode
+
+
+class PostProcessPool:
+    """Pool acotado para tareas de postprocesado con estadísticas por etapa."""
+
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="postprocess")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._done = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        submitted = time.monotonic()
+        with self._lock:
+            self._queued += 1
+
+        def _task():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += started - submitted
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._run_total += time.monotonic() - started
+                    if ok:
+                        self._done += 1
+                    else:
+                        self._failed += 1
+
+        return self._pool.submit(_task)
+
+    def stats(self) -> dict:
+        """Profundidad de cola y tiempos medios de espera y de ejecución."""
+        with self._lock:
+            finished = self._done + self._failed
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "done": self._done,
+                "failed": self._failed,
+                "avg_wait_s": round(self._wait_total / finished, 3) if finished else None,
+                "avg_run_s": round(self._run_total / finished, 3) if finished else None,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+_default_pool: PostProcessPool | None = None
+_default_lock = threading.Lock()
+
+
+def get_postprocess_pool() -> PostProcessPool:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = PostProcessPool()
+        return _default_pool
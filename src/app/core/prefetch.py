@@ -0,0 +1,158 @@
+"""Extracción especulativa de metadatos al pegar una URL.
+
+Mientras el usuario decide calidad y formato, `MetadataPrefetcher` extrae la
+info de la URL en segundo plano y la guarda en la caché de `cache.py`; la
+descarga posterior la encuentra ahí y empieza por los bytes, sin esperar a
+la página ni a la API. Si el trabajo arranca con la extracción todavía en
+curso, `wait_pending` lo hace esperar a ella en lugar de repetirla.
+
+Una nueva URL sustituye a la anterior: lo que no ha empezado se cancela, y
+de lo que ya está en marcha solo se descarta el aviso (yt_dlp no se puede
+interrumpir a media extracción, pero su resultado sigue siendo útil en la
+caché). El retardo entre pegar y extraer lo pone la GUI.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .cache import get_info_cache, is_cacheable
+from .playlist import looks_like_playlist
+from .session import get_session
+
+PREFETCH_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+}
+# segundos que un trabajo espera a una extracción especulativa en curso
+WAIT_TIMEOUT = 30.0
+
+
+def looks_like_url(text: str) -> bool:
+    """URL http(s) completa, sin espacios (lo que se pega, no lo que se teclea a medias)."""
+    text = (text or "").strip()
+    if not text or any(c.isspace() for c in text):
+        return False
+    parts = urlsplit(text)
+    return parts.scheme in ("http", "https") and "." in (parts.hostname or "")
+
+
+def summarize_formats(info: dict) -> dict:
+    """Título, duración y alturas de vídeo disponibles (de mayor a menor)."""
+    heights = sorted({
+        fmt["height"] for fmt in info.get("formats") or []
+        if fmt.get("height") and fmt.get("vcodec") != "none"
+    }, reverse=True)
+    if not heights and info.get("height"):
+        heights = [info["height"]]
+    return {
+        "title": info.get("title"),
+        "duration": info.get("duration"),
+        "uploader": info.get("uploader"),
+        "extractor": info.get("extractor_key"),
+        "heights": heights,
+    }
+
+
+def quality_labels(heights) -> list[str]:
+    """Opciones de calidad en el formato que entiende `build_ydl_opts`."""
+    return ["Maximum Quality"] + [f"{height}p" for height in heights]
+
+
+class MetadataPrefetcher:
+    def __init__(self, session=None, cache=None, max_workers: int = 2):
+        self._session = session
+        self._cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future] = {}
+        self._current: Future | None = None
+
+    def prefetch(self, url: str, callback=None) -> Future | None:
+        """Extraer `url` en segundo plano; `callback(url, summary, error)` si sigue siendo la actual.
+
+        Devuelve None si la URL no se puede aprovechar (no es URL o es una playlist).
+        """
+        url = (url or "").strip()
+        if not looks_like_url(url) or looks_like_playlist(url):
+            self.cancel()
+            return None
+        with self._lock:
+            previous = self._current
+            future = self._pending.get(url)
+            if future is None:
+                future = self._pool.submit(self._extract, url)
+                self._pending[url] = future
+                future.add_done_callback(lambda f, url=url: self._forget(url, f))
+            self._current = future
+        if previous is not None and previous is not future:
+            previous.cancel()
+        if callback is not None:
+            future.add_done_callback(lambda f: self._notify(f, url, callback))
+        return future
+
+    def cancel(self):
+        """Abandonar la URL actual."""
+        with self._lock:
+            current, self._current = self._current, None
+        if current is not None:
+            current.cancel()
+
+    def wait_pending(self, url: str, timeout: float = WAIT_TIMEOUT) -> bool:
+        """Esperar a la extracción en curso de `url`, si la hay. True si había una."""
+        with self._lock:
+            future = self._pending.get((url or "").strip())
+        if future is None or future.cancelled():
+            return False
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+        return True
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, url: str, future: Future):
+        with self._lock:
+            if self._pending.get(url) is future:
+                del self._pending[url]
+
+    def _notify(self, future: Future, url: str, callback):
+        if future.cancelled() or future is not self._current:
+            return
+        exc = future.exception()
+        callback(url, None if exc else future.result(), exc)
+
+    def _extract(self, url: str) -> dict:
+        cache = self._cache if self._cache is not None else get_info_cache()
+        if cache is not None:
+            cached = cache.get(url)
+            if cached is not None:
+                return summarize_formats(cached)
+        session = self._session or get_session()
+        with session.acquire(dict(PREFETCH_OPTS)) as ydl:
+            # info sin procesar: es lo que guarda la caché y consume `extract_with_cache`
+            raw = ydl.extract_info(url, download=False, process=False)
+            if cache is not None and is_cacheable(raw):
+                raw = ydl.sanitize_info(raw)
+                cache.put(url, raw)
+        return summarize_formats(raw or {})
+
+
+_default_prefetcher: MetadataPrefetcher | None = None
+_default_lock = threading.Lock()
+
+
+def get_prefetcher() -> MetadataPrefetcher:
+    global _default_prefetcher
+    with _default_lock:
+        if _default_prefetcher is None:
+            _default_prefetcher = MetadataPrefetcher()
+        return _default_prefetcher
+
+
+def wait_pending(url: str, timeout: float = WAIT_TIMEOUT) -> bool:
+    """Esperar a una extracción especulativa de `url` en curso (no-op si no hay prefetcher)."""
+    prefetcher = _default_prefetcher
+    return prefetcher.wait_pending(url, timeout) if prefetcher is not None else False
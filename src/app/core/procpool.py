@@ -0,0 +1,284 @@
+"""Ejecución de trabajos en procesos aislados.
+
+La extracción de yt_dlp es Python puro (regex, JSON) y retiene el GIL: en el
+proceso de la GUI hace que la interfaz vaya a saltos, y un extractor que se
+cuelga o revienta arrastra a toda la aplicación. `ProcessBackend` ejecuta
+cada trabajo en un proceso hijo:
+
+- el progreso vuelve por un `Pipe` como `ProgressEvent` (limitado en el hijo);
+- `cancel(job_id)` mata el proceso: cancelación dura, aunque esté colgado;
+- se mantienen `warm` procesos ya arrancados y con yt_dlp cargado, así el
+  coste de crear el proceso no se paga al empezar cada descarga;
+- el límite de ancho de banda global sigue en el proceso principal: el hijo
+  recibe la asignación de su trabajo y se le envía cada cambio.
+
+Un proceso atiende un trabajo cada vez, así que en él la conversión de audio
+se hace en línea. Los tramos y contadores del trabajo se reenvían al registro
+de métricas del proceso principal.
+
+Es intercambiable con `run_job` como `runner` de `DownloadManager`; ver
+`make_runner`.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+
+from .jobs import DownloadJob, JobCancelled, run_job
+from .metrics import get_metrics
+from .progress import DEFAULT_MAX_RATE, Phase, ProgressEvent, ProgressThrottle
+from .ratelimit import get_limiter
+from .retry import Failure, classify
+
+BACKENDS = ("thread", "process")
+DEFAULT_WARM = 2
+POLL_INTERVAL = 0.25
+STOP_TIMEOUT = 2.0
+
+# campos de `DownloadJob` que viajan al hijo y resultados que vuelven
+JOB_FIELDS = ("url", "is_video", "quality", "download_dir", "options", "use_cache", "use_archive",
+              "rate_limit", "audio_format", "id")
+RESULT_FIELDS = ("info", "error", "skipped", "audio_mode", "timings")
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class RemoteJobError(Exception):
+    """Error de un trabajo en el proceso hijo; el mensaje es el original.
+
+    La respuesta HTTP no cruza el `Pipe`: `failure` lleva la clasificación
+    hecha en el hijo (`Retry-After` incluido) y `classify` la usa tal cual.
+    """
+
+    def __init__(self, message: str, failure: Failure | None = None):
+        super().__init__(message)
+        self.failure = failure
+
+
+# ---- lado hijo -----------------------------------------------------------
+def _worker_main(conn):
+    from .cache import extractor_classes
+
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    try:
+        # cargar yt_dlp y sus extractores antes del primer trabajo
+        extractor_classes()
+    except Exception:
+        pass
+    send({"op": "ready", "pid": os.getpid()})
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        op = msg.get("op")
+        if op == "exit":
+            return
+        if op == "rate":
+            get_limiter().set_total(msg["rate"])
+        elif op == "run":
+            threading.Thread(target=_run_in_child, args=(msg, send), name="job", daemon=True).start()
+
+
+def _run_in_child(msg, send):
+    job = DownloadJob(**msg["job"])
+    records = []
+    metrics = get_metrics()
+    metrics.job_sinks.append(records.append)
+    get_limiter().set_total(msg.get("rate"))
+    throttle = ProgressThrottle(DEFAULT_MAX_RATE)
+    emit = throttle.wrap(lambda event: send({"op": "progress", "event": vars(event)}))
+    error = failure = None
+    try:
+        run_job(job, emit)
+    except Exception as exc:
+        error = str(exc)
+        found = classify(exc)
+        failure = {"retryable": found.retryable, "status": found.status, "retry_after": found.retry_after,
+                   "reason": found.reason}
+    finally:
+        metrics.job_sinks.remove(records.append)
+    result = {field: getattr(job, field) for field in RESULT_FIELDS}
+    send({"op": "done", "ok": error is None, "error": error, "failure": failure, "result": result,
+          "metrics": records})
+
+
+# ---- lado principal -------------------------------------------------------
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), name="videoleech-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.cancelled = False
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def send(self, msg):
+        self.conn.send(msg)
+
+    def wait_ready(self):
+        if not self.ready:
+            msg = self.conn.recv()
+            if msg.get("op") != "ready":
+                raise WorkerCrashed(f"unexpected message from worker: {msg!r}")
+            self.ready = True
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        try:
+            self.conn.send({"op": "exit"})
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(STOP_TIMEOUT)
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class ProcessBackend:
+    """`runner` para `DownloadManager` que ejecuta cada trabajo en un proceso hijo."""
+
+    def __init__(self, warm: int = DEFAULT_WARM):
+        # spawn: seguro con hilos (y Qt) en el proceso principal y en todas las plataformas
+        self._ctx = multiprocessing.get_context("spawn")
+        self.warm = warm
+        self._lock = threading.Lock()
+        self._idle: list[_Worker] = []
+        self._busy: dict[str, _Worker] = {}
+        self._closed = False
+
+    def start(self) -> "ProcessBackend":
+        """Arrancar los procesos calientes en segundo plano."""
+        def _fill():
+            while True:
+                with self._lock:
+                    if self._closed or len(self._idle) >= self.warm:
+                        return
+                worker = _Worker(self._ctx)
+                with self._lock:
+                    self._idle.append(worker)
+
+        threading.Thread(target=_fill, name="process-pool-warmup", daemon=True).start()
+        return self
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ProcessBackend is shut down")
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+                worker.kill()
+        return _Worker(self._ctx)
+
+    def _release(self, worker: _Worker):
+        with self._lock:
+            if not self._closed and worker.alive() and len(self._idle) < self.warm:
+                self._idle.append(worker)
+                return
+        worker.stop()
+
+    def __call__(self, job: DownloadJob, on_progress) -> dict | None:
+        worker = self._acquire()
+        with self._lock:
+            self._busy[job.id] = worker
+        share = get_limiter().register(job.id, job.rate_limit)
+        healthy = False
+        try:
+            worker.wait_ready()
+            sent_rate = share.rate
+            worker.send({"op": "run", "job": {f: getattr(job, f) for f in JOB_FIELDS}, "rate": sent_rate})
+            while True:
+                if share.rate != sent_rate:
+                    sent_rate = share.rate
+                    worker.send({"op": "rate", "rate": sent_rate})
+                if not worker.conn.poll(POLL_INTERVAL):
+                    if not worker.alive():
+                        raise EOFError
+                    continue
+                msg = worker.conn.recv()
+                if msg["op"] == "progress":
+                    event = ProgressEvent(**msg["event"])
+                    if event.phase == Phase.DOWNLOADING:
+                        share.observe(event.speed)
+                    on_progress(event)
+                elif msg["op"] == "done":
+                    healthy = True
+                    for field, value in msg["result"].items():
+                        setattr(job, field, value)
+                    for record in msg["metrics"]:
+                        get_metrics().add_record(record)
+                    if not msg["ok"]:
+                        failure = msg.get("failure")
+                        raise RemoteJobError(msg["error"], Failure(**failure) if failure else None)
+                    return job.info
+        except (EOFError, OSError) as exc:
+            if worker.cancelled:
+                raise JobCancelled("cancelled") from None
+            code = worker.process.exitcode
+            raise WorkerCrashed(f"worker process exited unexpectedly (code {code})") from exc
+        finally:
+            share.close()
+            with self._lock:
+                self._busy.pop(job.id, None)
+            if healthy:
+                self._release(worker)
+            else:
+                worker.kill()
+
+    def cancel(self, job_id: str) -> bool:
+        """Matar el proceso que ejecuta `job_id`; el trabajo termina como cancelado."""
+        with self._lock:
+            worker = self._busy.get(job_id)
+        if worker is None:
+            return False
+        worker.cancelled = True
+        worker.kill()
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers = self._idle + list(self._busy.values())
+            self._idle = []
+        for worker in workers:
+            worker.stop(timeout=0.5)
+
+
+_default_backend: ProcessBackend | None = None
+_default_lock = threading.Lock()
+
+
+def get_process_backend() -> ProcessBackend:
+    global _default_backend
+    with _default_lock:
+        if _default_backend is None:
+            _default_backend = ProcessBackend().start()
+            atexit.register(_default_backend.shutdown)
+        return _default_backend
+
+
+def make_runner(backend: str = "thread"):
+    """`runner` para `DownloadManager`: "thread" (en proceso) o "process"."""
+    if backend == "process":
+        return get_process_backend()
+    if backend == "thread":
+        return run_job
+    raise ValueError(f"unknown backend: {backend!r}")
@@ -0,0 +1,139 @@
+"""Eventos de progreso tipados y limitación de su frecuencia.
+
+yt_dlp llama a los hooks de progreso por cada bloque recibido: cientos de
+veces por segundo. `ProgressEvent` lleva los valores numéricos (el texto se
+formatea solo cuando alguien lo muestra) y `ProgressThrottle` agrupa los
+eventos de un trabajo a una frecuencia máxima. Los cambios de fase y los
+eventos finales se entregan siempre.
+"""
+import time
+from dataclasses import dataclass
+
+
+class Phase:
+    EXTRACTING = "extracting"
+    DOWNLOADING = "downloading"
+    POSTPROCESSING = "postprocessing"
+    FINISHED = "finished"
+    SKIPPED = "skipped"
+    ERROR = "error"
+    # fallo pasajero: el trabajo vuelve a la cola con espera (ver retry.py)
+    RETRYING = "retrying"
+
+    FINAL = (FINISHED, SKIPPED, ERROR)
+
+
+DEFAULT_MAX_RATE = 10.0
+
+
+def fmt_bytes(n: float | None) -> str:
+    if n is None:
+        return "?"
+    if abs(n) < 1024:
+        return f"{int(n)}B"
+    for unit in ("KiB", "MiB"):
+        n /= 1024
+        if abs(n) < 1024:
+            return f"{n:.1f}{unit}"
+    return f"{n / 1024:.1f}GiB"
+
+
+def fmt_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+@dataclass
+class ProgressEvent:
+    phase: str
+    downloaded_bytes: int | None = None
+    total_bytes: int | None = None
+    speed: float | None = None
+    eta: float | None = None
+    fragment_index: int | None = None
+    fragment_count: int | None = None
+    message: str | None = None
+    filename: str | None = None
+
+    @property
+    def fraction(self) -> float | None:
+        if self.downloaded_bytes is None or not self.total_bytes:
+            if self.fragment_index is not None and self.fragment_count:
+                return self.fragment_index / self.fragment_count
+            return None
+        return min(1.0, self.downloaded_bytes / self.total_bytes)
+
+    def text(self) -> str:
+        """Texto legible para la UI."""
+        if self.message:
+            return self.message
+        if self.phase == Phase.DOWNLOADING:
+            frac = self.fraction
+            pct = f"{frac * 100:.1f}%" if frac is not None else fmt_bytes(self.downloaded_bytes)
+            speed = f"{fmt_bytes(self.speed)}/s" if self.speed else ""
+            return f"Downloading {pct} {speed} ETA {fmt_eta(self.eta)}"
+        if self.phase == Phase.EXTRACTING:
+            return "Extracting info..."
+        if self.phase == Phase.POSTPROCESSING:
+            return "Processing finished, finalizing..."
+        if self.phase == Phase.FINISHED:
+            return "Download completed"
+        if self.phase == Phase.ERROR:
+            return "Error during download"
+        if self.phase == Phase.RETRYING:
+            return f"Retrying in {fmt_eta(self.eta)}..."
+        return self.phase
+
+    @classmethod
+    def from_hook(cls, d: dict) -> "ProgressEvent":
+        """Construir un evento desde el dict de un progress hook de yt_dlp."""
+        status = d.get("status")
+        if status == "downloading":
+            phase = Phase.DOWNLOADING
+        elif status == "finished":
+            phase = Phase.POSTPROCESSING
+        else:
+            phase = Phase.ERROR
+        return cls(
+            phase=phase,
+            downloaded_bytes=d.get("downloaded_bytes"),
+            total_bytes=d.get("total_bytes") or d.get("total_bytes_estimate"),
+            speed=d.get("speed"),
+            eta=d.get("eta"),
+            fragment_index=d.get("fragment_index"),
+            fragment_count=d.get("fragment_count"),
+            filename=d.get("filename"),
+        )
+
+
+class ProgressThrottle:
+    """Dejar pasar como máximo `max_rate` eventos por segundo de un trabajo.
+
+    Un evento con fase distinta a la anterior, o de fase final, pasa siempre.
+    """
+
+    def __init__(self, max_rate: float = DEFAULT_MAX_RATE, clock=time.monotonic):
+        self.interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        self._clock = clock
+        self._last_phase = None
+        self._last_time = float("-inf")
+
+    def accept(self, event: ProgressEvent) -> bool:
+        now = self._clock()
+        forced = event.phase != self._last_phase or event.phase in Phase.FINAL or event.message is not None
+        if not forced and now - self._last_time < self.interval:
+            return False
+        self._last_phase = event.phase
+        self._last_time = now
+        return True
+
+    def wrap(self, callback):
+        """Devolver un callback que solo reenvía los eventos aceptados."""
+        def _throttled(event: ProgressEvent):
+            if self.accept(event):
+                callback(event)
+        return _throttled
@@ -0,0 +1,200 @@
+"""Límite de ancho de banda global, compartido por todas las descargas.
+
+El `ratelimit` de yt_dlp es por instancia y no se suma entre trabajos en
+paralelo. `BandwidthLimiter` reparte un tope total entre los trabajos activos
+(con tope opcional por trabajo) mediante reparto max-min: un trabajo que no
+consume su parte (servidor lento, fase de postproceso) cede lo que le sobra
+a los demás, así el tope no desperdicia capacidad.
+
+Cada trabajo recibe una `BandwidthShare`:
+- para las descargas de yt_dlp escribe su asignación en `params['ratelimit']`
+  del `YoutubeDL` prestado (yt_dlp lo relee durante la descarga);
+- para el código propio (descarga segmentada) ofrece `consume(n)`, un token
+  bucket que bloquea lo necesario.
+
+Las descargas por fragmentos de yt_dlp copian los parámetros al empezar, así
+que en ellas un cambio de asignación se aplica en la siguiente descarga.
+"""
+import re
+import threading
+import time
+
+REBALANCE_INTERVAL = 0.5
+# por debajo de esta fracción de su asignación se considera que el trabajo no la usa
+IDLE_FRACTION = 0.8
+MIN_RATE = 16 * 1024
+
+_RATE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*(?:/s)?\s*$", re.IGNORECASE)
+
+
+def parse_rate(text) -> int | None:
+    """'500K', '2.5M', '1G' o bytes -> bytes/s. 0 o vacío -> sin límite."""
+    if text is None or text == "":
+        return None
+    if isinstance(text, (int, float)):
+        return int(text) or None
+    m = _RATE_RE.match(str(text))
+    if not m:
+        raise ValueError(f"invalid rate: {text!r}")
+    value = float(m.group(1)) * {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}[m.group(2).lower()]
+    return int(value) or None
+
+
+def allocate(total: float, demands: list[float | None]) -> list[float | None]:
+    """Reparto max-min de `total` entre demandas (None = sin tope propio).
+
+    Lo que sobra tras cubrir todas las demandas se reparte a partes iguales
+    entre los trabajos sin tope, para que puedan crecer y medirse de nuevo.
+    """
+    if not demands:
+        return []
+    inf = float("inf")
+    order = sorted(range(len(demands)), key=lambda i: demands[i] if demands[i] is not None else inf)
+    alloc: list[float | None] = [0.0] * len(demands)
+    remaining = float(total)
+    left = len(demands)
+    for i in order:
+        fair = remaining / left
+        want = demands[i] if demands[i] is not None else inf
+        give = min(want, fair)
+        alloc[i] = give
+        remaining -= give
+        left -= 1
+    uncapped = [i for i, d in enumerate(demands) if d is None]
+    if remaining > 0 and uncapped:
+        for i in uncapped:
+            alloc[i] += remaining / len(uncapped)
+    return alloc
+
+
+class BandwidthShare:
+    """Parte del ancho de banda asignada a un trabajo."""
+
+    def __init__(self, limiter: "BandwidthLimiter", job_id: str, cap: int | None):
+        self.limiter = limiter
+        self.job_id = job_id
+        self.cap = cap
+        self.rate: float | None = cap
+        self.speed: float | None = None
+        self._params: dict | None = None
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+
+    # ---- yt_dlp --------------------------------------------------------
+    def bind(self, params: dict):
+        """Aplicar la asignación al dict de parámetros de un `YoutubeDL` prestado."""
+        self._params = params
+        self._apply()
+
+    def unbind(self):
+        if self._params is not None:
+            self._params.pop("ratelimit", None)
+        self._params = None
+
+    def _apply(self):
+        if self._params is not None:
+            if self.rate:
+                self._params["ratelimit"] = max(MIN_RATE, int(self.rate))
+            else:
+                self._params.pop("ratelimit", None)
+
+    def set_rate(self, rate: float | None):
+        with self._lock:
+            self.rate = rate
+        self._apply()
+
+    # ---- medida y consumo directo --------------------------------------
+    def observe(self, speed: float | None):
+        """Velocidad medida por los eventos de progreso (bytes/s)."""
+        if speed is None:
+            return
+        self.speed = speed if self.speed is None else 0.7 * self.speed + 0.3 * speed
+        self.limiter.maybe_rebalance()
+
+    def consume(self, n: int):
+        """Bloquear hasta poder transferir `n` bytes dentro de la asignación."""
+        while True:
+            with self._lock:
+                rate = self.rate
+                if not rate:
+                    return
+                now = time.monotonic()
+                # ráfaga máxima de medio segundo (o un bloque, si es mayor)
+                burst = max(rate * 0.5, n)
+                self._tokens = min(burst, self._tokens + (now - self._stamp) * rate)
+                self._stamp = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / rate
+            time.sleep(min(wait, 0.25))
+
+    def demand(self) -> float | None:
+        if self.rate and self.speed is not None and self.speed < self.rate * IDLE_FRACTION:
+            # no usa lo que tiene: pedir algo más de lo medido y ceder el resto
+            want = max(MIN_RATE, self.speed * 1.25)
+            return min(want, self.cap) if self.cap else want
+        return self.cap
+
+    def close(self):
+        self.unbind()
+        self.limiter.unregister(self)
+
+
+class BandwidthLimiter:
+    def __init__(self, total: int | None = None):
+        self.total = total
+        self._lock = threading.Lock()
+        self._shares: list[BandwidthShare] = []
+        self._last_rebalance = 0.0
+
+    def set_total(self, total: int | None):
+        """Cambiar el tope total en caliente (None o 0 = sin límite)."""
+        self.total = total or None
+        self.rebalance()
+
+    def register(self, job_id: str, cap: int | None = None) -> BandwidthShare:
+        share = BandwidthShare(self, job_id, cap or None)
+        with self._lock:
+            self._shares.append(share)
+        self.rebalance()
+        return share
+
+    def unregister(self, share: BandwidthShare):
+        with self._lock:
+            try:
+                self._shares.remove(share)
+            except ValueError:
+                return
+        self.rebalance()
+
+    def maybe_rebalance(self):
+        if time.monotonic() - self._last_rebalance >= REBALANCE_INTERVAL:
+            self.rebalance()
+
+    def rebalance(self):
+        with self._lock:
+            self._last_rebalance = time.monotonic()
+            shares = list(self._shares)
+            if self.total is None:
+                rates = [share.cap for share in shares]
+            else:
+                rates = allocate(self.total, [share.demand() for share in shares])
+        for share, rate in zip(shares, rates):
+            share.set_rate(rate)
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"job_id": s.job_id, "cap": s.cap, "rate": s.rate, "speed": s.speed}
+                for s in self._shares
+            ]
+
+
+_default_limiter = BandwidthLimiter()
+
+
+def get_limiter() -> BandwidthLimiter:
+    """Limitador compartido por todo el proceso (GUI y CLI)."""
+    return _default_limiter
@@ -0,0 +1,316 @@
+"""Cliente del demonio de descargas (ver `daemon.py`).
+
+`DaemonClient` habla con la API HTTP/JSON usando solo la biblioteca
+estándar. `RemoteManager` ofrece la interfaz de `DownloadManager` que usan
+`DownloadQueue`, `DownloadsModel` y la ventana principal (enviar, cancelar,
+`get`, `jobs`, oyentes), así la GUI puede conectarse a un demonio en marcha
+en vez de arrancar sus propios hilos de descarga: guarda una copia local de
+cada trabajo y reemite como eventos de gestor lo que llega por SSE.
+"""
+import http.client
+import json
+import os
+import threading
+from urllib.parse import quote, urlencode, urlsplit
+
+from .daemon import daemon_file, HEARTBEAT
+from .jobs import DEFAULT_AUDIO_FORMAT, DownloadJob
+from .progress import ProgressEvent
+
+# segundos de espera de las peticiones normales
+TIMEOUT = 10.0
+# espera entre intentos de reconexión del flujo de eventos
+RECONNECT_DELAY = 1.0
+TOKEN_ENV = "VIDEOLEECH_TOKEN"
+
+
+class DaemonError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class DaemonClient:
+    def __init__(self, url: str, token: str | None = None, timeout: float = TIMEOUT):
+        parts = urlsplit(url)
+        self.url = url.rstrip("/")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV)
+        self.timeout = timeout
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _headers(self, body: bytes | None) -> dict:
+        headers = {"Accept": "application/json"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    def request(self, method: str, path: str, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        conn = self._connect(self.timeout)
+        try:
+            conn.request(method, path, body=body, headers=self._headers(body))
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        result = json.loads(data) if data else None
+        if response.status >= 400:
+            raise DaemonError(response.status, (result or {}).get("error") or response.reason)
+        return result
+
+    # ---- API -----------------------------------------------------------
+    def health(self) -> dict:
+        return self.request("GET", "/api/health")
+
+    def submit(self, **job) -> dict:
+        """Enviar un trabajo (campos de `daemon.job_from_request`); devuelve su registro o {"playlist": id}."""
+        return self.request("POST", "/api/jobs", job)
+
+    def submit_many(self, jobs: list[dict]) -> list[dict]:
+        return self.request("POST", "/api/jobs", {"jobs": jobs})["jobs"]
+
+    def jobs(self, states=None) -> list[dict]:
+        query = f"?{urlencode({'state': ','.join(states)})}" if states else ""
+        return self.request("GET", f"/api/jobs{query}")["jobs"]
+
+    def job(self, job_id: str) -> dict:
+        return self.request("GET", f"/api/jobs/{quote(job_id)}")
+
+    def cancel(self, job_id: str) -> bool:
+        return bool(self.request("DELETE", f"/api/jobs/{quote(job_id)}")["cancelled"])
+
+    def stats(self) -> dict:
+        return self.request("GET", "/api/stats")
+
+    def settings(self) -> dict:
+        return self.request("GET", "/api/settings")
+
+    def configure(self, **settings) -> dict:
+        return self.request("PUT", "/api/settings", settings)
+
+    def events(self, job_id: str | None = None):
+        """Iterar `(evento, datos)` del flujo SSE; bloquea hasta que llega cada uno.
+
+        La conexión se abre al llamar (no al empezar a iterar), así que los
+        eventos posteriores a esta llamada no se pierden.
+        """
+        path = "/api/events" + (f"?{urlencode({'job': job_id})}" if job_id else "")
+        # sin eventos llega un comentario cada HEARTBEAT segundos
+        conn = self._connect(HEARTBEAT * 2)
+        conn.request("GET", path, headers=dict(self._headers(None), Accept="text/event-stream"))
+        response = conn.getresponse()
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            raise DaemonError(response.status, (json.loads(data) if data else {}).get("error") or response.reason)
+        return _iter_sse(conn, response)
+
+
+def _iter_sse(conn, response):
+    event, data = "message", []
+    try:
+        while True:
+            line = response.readline()
+            if not line:
+                return
+            line = line.decode("utf-8").rstrip("\r\n")
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith(":"):
+                continue
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip())
+    finally:
+        conn.close()
+
+
+def find_daemon(token: str | None = None) -> DaemonClient | None:
+    """Cliente del demonio anunciado en `daemon.json`, si responde."""
+    try:
+        url = json.loads(daemon_file().read_text())["url"]
+    except (OSError, ValueError, KeyError):
+        return None
+    client = DaemonClient(url, token=token, timeout=2.0)
+    try:
+        client.health()
+    except (OSError, DaemonError):
+        return None
+    client.timeout = TIMEOUT
+    return client
+
+
+def _mirror_fields(job: DownloadJob, rec: dict):
+    job.state = rec["state"]
+    job.error = rec.get("error")
+    job.skipped = bool(rec.get("skipped"))
+    job.audio_mode = rec.get("audio_mode")
+    job.attempts = rec.get("attempts") or 0
+    job.timings = rec.get("timings") or {}
+    if rec.get("title") or rec.get("file"):
+        job.info = {"title": rec.get("title"), "filepath": rec.get("file"), "digest": rec.get("digest")}
+
+
+def _progress_event(data: dict) -> ProgressEvent:
+    fields = ProgressEvent.__dataclass_fields__
+    return ProgressEvent(**{key: value for key, value in data.items() if key in fields})
+
+
+class RemoteManager:
+    """Interfaz de `DownloadManager` sobre un demonio.
+
+    Los trabajos son copias locales (`DownloadJob`) que se actualizan con los
+    eventos; los oyentes se llaman desde el hilo que lee el flujo SSE, igual
+    que los de un gestor local se llaman desde los hilos de trabajo. Si la
+    conexión se corta se reintenta y, al volver, se resincroniza la lista.
+    """
+
+    def __init__(self, client: DaemonClient):
+        self.client = client
+        self._lock = threading.Lock()
+        self._jobs: dict[str, DownloadJob] = {}
+        self._listeners = []
+        self._settings = client.settings()
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        threading.Thread(target=self._listen, name="daemon-events", daemon=True).start()
+        # lo enviado justo después debe llegar ya por el flujo
+        self._connected.wait(TIMEOUT)
+
+    # ---- oyentes -------------------------------------------------------
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _emit(self, job_id: str, event: str, payload):
+        for listener in list(self._listeners):
+            try:
+                listener(job_id, event, payload)
+            except Exception as exc:
+                print(f"Listener error ({event}):", exc)
+
+    # ---- API de DownloadManager ----------------------------------------
+    @property
+    def settings(self) -> dict:
+        """Última configuración conocida del demonio (`max_workers`, `limit_rate`)."""
+        return dict(self._settings)
+
+    @property
+    def max_workers(self) -> int:
+        return self._settings["max_workers"]
+
+    def set_max_workers(self, value: int):
+        self._settings = self.client.configure(max_workers=int(value))
+
+    def set_rate_limit(self, rate: int | None):
+        self._settings = self.client.configure(limit_rate=rate)
+
+    def set_runner(self, runner):
+        """El demonio decide dónde se ejecutan sus trabajos."""
+
+    def submit(self, url: str | None = None, *, job: DownloadJob | None = None, **kwargs) -> str:
+        if job is None:
+            job = DownloadJob(url=url, **kwargs)
+        rec = self.client.submit(**self._spec(job))
+        self._update(rec, emit=False)
+        return rec["id"]
+
+    def submit_playlist(self, url: str, **job_kwargs) -> str:
+        spec = self._spec(DownloadJob(url=url, **job_kwargs))
+        spec.pop("id")
+        return self.client.submit(**spec, playlist=True)["playlist"]
+
+    def get(self, job_id: str) -> DownloadJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[DownloadJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        try:
+            return self.client.cancel(job_id)
+        except DaemonError:
+            return False
+
+    def stats(self) -> dict:
+        return self.client.stats()
+
+    def shutdown(self, wait: bool = True):
+        """Dejar de escuchar; el demonio y sus trabajos siguen."""
+        self._stop.set()
+
+    @staticmethod
+    def _spec(job: DownloadJob) -> dict:
+        return {
+            "id": job.id, "url": job.url, "kind": job.kind, "quality": job.quality,
+            "audio_format": job.audio_format, "download_dir": job.download_dir, "priority": job.priority,
+            "options": job.options, "use_cache": job.use_cache, "use_archive": job.use_archive,
+            "rate_limit": job.rate_limit,
+        }
+
+    # ---- copia local ---------------------------------------------------
+    def _update(self, rec: dict, emit: bool = True):
+        with self._lock:
+            job = self._jobs.get(rec["id"])
+            if job is None:
+                job = self._jobs[rec["id"]] = DownloadJob(
+                    url=rec["url"], is_video=rec.get("kind") != "audio", quality=rec.get("quality"),
+                    download_dir=rec.get("download_dir"), audio_format=rec.get("audio_format") or DEFAULT_AUDIO_FORMAT,
+                    priority=rec.get("priority") or 0, id=rec["id"],
+                )
+                changed = True
+            else:
+                changed = job.state != rec["state"]
+            _mirror_fields(job, rec)
+        if emit and changed:
+            self._emit(job.id, "state", job.state)
+        return job
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                stream = self.client.events()
+                # lo que pasó mientras no había conexión
+                for rec in self.client.jobs():
+                    self._update(rec)
+                self._connected.set()
+                for event, data in stream:
+                    if self._stop.is_set():
+                        return
+                    self._apply(event, data)
+            except (OSError, ValueError, DaemonError) as exc:
+                if not self._stop.is_set():
+                    print("Daemon connection lost:", exc)
+            self._connected.set()
+            self._stop.wait(RECONNECT_DELAY)
+
+    def _apply(self, event: str, data: dict):
+        job_id = data.get("id")
+        if event == "state":
+            if data.get("job") is None:
+                return
+            # el estado del registro, no el del evento: se leyó al emitirlo y no
+            # puede quedar por detrás (QUEUED se emite después de soltar el cerrojo)
+            job = self._update(data["job"], emit=False)
+            self._emit(job_id, "state", job.state)
+        elif event == "progress":
+            if job_id in self._jobs:
+                self._emit(job_id, "progress", _progress_event(data))
+        elif event == "playlist":
+            self._emit(job_id, "playlist", {key: value for key, value in data.items() if key != "id"})
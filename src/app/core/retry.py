@@ -0,0 +1,282 @@
+"""Reintentos con espera exponencial y cortacircuitos por sitio.
+
+yt_dlp ya reintenta dentro de una descarga (fragmentos, cortes de conexión),
+pero cuando se rinde —o cuando falla la extracción con un 5xx o un 429— el
+trabajo termina como fallido y hay que relanzarlo a mano. Aquí:
+
+- `classify` decide si un error merece otro intento (5xx, 408/425/429,
+  cortes y timeouts) o es definitivo (4xx, URL no soportada, cancelación...)
+  y extrae `Retry-After` si la respuesta lo trae;
+- `RetryPolicy` calcula la espera: exponencial con jitter completo, nunca
+  menos de lo que pide `Retry-After` (acotado por `max_retry_after`);
+- `CircuitBreaker` abre el circuito de un dominio tras `threshold` fallos
+  reintentables seguidos: mientras está abierto sus trabajos no ocupan
+  hilos; pasado `cooldown` se deja pasar un único trabajo de prueba, y si
+  vuelve a fallar la pausa se duplica. Tras `max_trips` aperturas seguidas
+  se da el sitio por caído (`gave_up`) y su cola se da por fallida.
+
+`DownloadManager` reencola el trabajo con la espera calculada en lugar de
+dormir en su hilo. Todas las descargas (GUI, CLI, `app.main`) pasan por el
+gestor a través de `engine.DownloadEngine`, así que ese es el único sitio
+donde se reintenta un trabajo entero.
+"""
+import email.utils
+import random
+import re
+import threading
+import time
+
+# estados HTTP que suelen ser pasajeros
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524}
+
+# segundos entre comprobaciones mientras el trabajo de prueba está en curso
+PROBE_POLL = 1.0
+
+# clases (por nombre, para no importar yt_dlp) de errores de red pasajeros
+_TRANSIENT_TYPES = {
+    "TransportError", "IncompleteRead", "ConnectionError", "ConnectionResetError", "ConnectionAbortedError",
+    "ConnectionRefusedError", "BrokenPipeError", "TimeoutError", "timeout", "RemoteDisconnected",
+    "ContentTooShortError", "SegmentError",
+}
+_FATAL_TYPES = {"JobCancelled", "DownloadAborted", "PostProcessError", "KeyboardInterrupt"}
+
+_STATUS_RE = re.compile(r"HTTP Error (\d{3})")
+_TRANSIENT_RE = re.compile(
+    r"timed out|connection (?:reset|aborted|refused)|remote end closed|temporary failure in name resolution"
+    r"|incomplete ?read|bytes read, \d+ more expected|giving up after",
+    re.IGNORECASE,
+)
+
+
+class Failure:
+    """Resultado de `classify`."""
+    __slots__ = ("retryable", "status", "retry_after", "reason")
+
+    def __init__(self, retryable: bool, status: int | None = None, retry_after: float | None = None, reason: str = ""):
+        self.retryable = retryable
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Failure(retryable={self.retryable}, status={self.status}, retry_after={self.retry_after}, reason={self.reason!r})"
+
+
+def parse_retry_after(value, now: float | None = None) -> float | None:
+    """Segundos de `Retry-After` (número de segundos o fecha HTTP)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def _chain(exc: BaseException):
+    """El error y sus causas: `__cause__`, `__context__`, `exc_info` de DownloadError y `cause` de yt_dlp."""
+    seen = set()
+    stack = [exc]
+    while stack:
+        current = stack.pop()
+        if current is None or id(current) in seen or not isinstance(current, BaseException):
+            continue
+        seen.add(id(current))
+        yield current
+        exc_info = getattr(current, "exc_info", None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            stack.append(exc_info[1])
+        stack.extend((getattr(current, "cause", None), current.__cause__, current.__context__))
+
+
+def _headers(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "headers", None) or getattr(exc, "headers", None)
+
+
+def classify(exc: BaseException) -> Failure:
+    status = None
+    retry_after = None
+    transient = False
+    for err in _chain(exc):
+        remote = getattr(err, "failure", None)
+        if isinstance(remote, Failure):
+            # ya clasificado en el proceso hijo (`procpool.RemoteJobError`)
+            return remote
+        names = {cls.__name__ for cls in type(err).__mro__}
+        if names & _FATAL_TYPES:
+            return Failure(False, reason=type(err).__name__)
+        code = getattr(err, "status", None) or getattr(err, "code", None)
+        if isinstance(code, int) and 100 <= code < 600 and status is None:
+            status = code
+            headers = _headers(err)
+            if headers is not None:
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+        if names & _TRANSIENT_TYPES:
+            transient = True
+    message = str(exc)
+    if status is None:
+        m = _STATUS_RE.search(message)
+        if m:
+            status = int(m.group(1))
+    if status is not None:
+        return Failure(status in RETRYABLE_STATUS, status, retry_after, f"HTTP {status}")
+    if transient or _TRANSIENT_RE.search(message):
+        return Failure(True, reason="network")
+    return Failure(False, reason=type(exc).__name__)
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base: float = 1.0, factor: float = 2.0, max_delay: float = 60.0,
+                 max_retry_after: float = 300.0, rng: random.Random | None = None):
+        # `max_attempts` cuenta también el primer intento
+        self.max_attempts = max_attempts
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Espera antes del intento `attempt + 1` (`attempt` = intentos hechos, desde 1)."""
+        ceiling = min(self.max_delay, self.base * self.factor ** max(0, attempt - 1))
+        # jitter completo: los trabajos que fallaron juntos no vuelven juntos
+        wait = self._rng.uniform(0, ceiling)
+        if retry_after is not None:
+            wait = max(wait, min(retry_after, self.max_retry_after))
+        return wait
+
+    def should_retry(self, failure: Failure, attempt: int) -> bool:
+        return failure.retryable and attempt < self.max_attempts
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = 5, cooldown: float = 15.0, max_cooldown: float = 300.0, max_trips: int = 4,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.max_trips = max_trips
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        # dominio -> {"state", "failures", "until", "trips", "probing"}
+        self._hosts: dict[str, dict] = {}
+
+    def _entry(self, host: str) -> dict:
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = {"state": self.CLOSED, "failures": 0, "until": 0.0, "trips": 0, "probing": False}
+        return entry
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            entry = self._hosts.get(host)
+            return self.CLOSED if entry is None else entry["state"]
+
+    def retry_in(self, host: str) -> float:
+        """0 si se puede lanzar un trabajo contra `host` ahora; si no, segundos hasta poder probar.
+
+        En semiabierto solo pasa un trabajo (el de prueba) hasta que termine.
+        """
+        if not host:
+            return 0.0
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None or entry["state"] == self.CLOSED:
+                return 0.0
+            remaining = entry["until"] - self._clock()
+            if remaining > 0:
+                return remaining
+            # esperar al resultado de la prueba
+            return PROBE_POLL if entry["probing"] else 0.0
+
+    def started(self, host: str):
+        """Un trabajo contra `host` empieza; si el circuito estaba abierto, es la prueba."""
+        if not host:
+            return
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is not None and entry["state"] != self.CLOSED:
+                entry["state"] = self.HALF_OPEN
+                entry["probing"] = True
+
+    def trips(self, host: str) -> int:
+        with self._lock:
+            entry = self._hosts.get(host)
+            return entry["trips"] if entry is not None and entry["state"] != self.CLOSED else 0
+
+    def gave_up(self, host: str) -> bool:
+        """Si el circuito se ha abierto `max_trips` veces seguidas."""
+        return bool(self.max_trips) and self.trips(host) >= self.max_trips
+
+    def record(self, host: str, failure: Failure):
+        """Anotar un fallo; solo los reintentables cuentan para abrir el circuito."""
+        if not host:
+            return
+        with self._lock:
+            if not failure.retryable:
+                entry = self._hosts.get(host)
+                if entry is None:
+                    return
+                if entry["state"] == self.CLOSED:
+                    # el sitio respondió: está vivo aunque el trabajo no tenga arreglo
+                    self._hosts.pop(host)
+                else:
+                    # p. ej. un fallo de ffmpeg: no dice nada del sitio, el circuito sigue como estaba
+                    entry["probing"] = False
+                return
+            entry = self._entry(host)
+            entry["failures"] += 1
+            if entry["state"] == self.OPEN:
+                # fallos de trabajos que ya estaban en curso al abrirse
+                return
+            if entry["state"] == self.HALF_OPEN or entry["failures"] >= self.threshold:
+                entry["trips"] = entry["trips"] + 1 if entry["state"] == self.HALF_OPEN else 1
+                pause = min(self.max_cooldown, self.cooldown * 2 ** (entry["trips"] - 1))
+                entry["state"] = self.OPEN
+                entry["until"] = self._clock() + pause
+                entry["probing"] = False
+
+    def success(self, host: str):
+        if not host:
+            return
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def release(self, host: str):
+        """El trabajo de prueba terminó sin resultado (p. ej. cancelado): dejar probar a otro."""
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is not None:
+                entry["probing"] = False
+
+    def snapshot(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            return {
+                host: {"state": entry["state"], "failures": entry["failures"],
+                       "retry_in": round(max(0.0, entry["until"] - now), 1) if entry["state"] == self.OPEN else 0.0}
+                for host, entry in self._hosts.items()
+            }
+
+
+_default_breaker: CircuitBreaker | None = None
+_default_lock = threading.Lock()
+
+
+def get_breaker() -> CircuitBreaker:
+    """Cortacircuitos compartido por todo el proceso (GUI y CLI)."""
+    global _default_breaker
+    with _default_lock:
+        if _default_breaker is None:
+            _default_breaker = CircuitBreaker()
+        return _default_breaker
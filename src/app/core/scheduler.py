@@ -0,0 +1,235 @@
+"""Cola de trabajos con prioridades, topes por sitio y reparto equitativo.
+
+Con varios hilos de descarga, una lista con muchas URLs del mismo sitio
+lanza todas sus extracciones a la vez contra él (y acaba en HTTP 429)
+mientras las de otros sitios esperan. `FairQueue` sustituye a la cola FIFO
+de `DownloadManager`:
+
+- cada trabajo pertenece a un dominio (`host_key`) y, si hay topes por
+  extractor configurados, a un extractor de yt_dlp;
+- `limits` fija cuántos trabajos de un mismo dominio o extractor pueden
+  ejecutarse a la vez (`host_limit` para los dominios sin tope propio);
+- dentro de una prioridad se sirve por turnos a cada dominio, en orden de
+  llegada dentro de cada uno; una prioridad mayor pasa siempre delante.
+
+Las claves de `limits` con un punto son dominios ("youtube.com"); las demás,
+nombres de extractor ("Youtube").
+
+Un trabajo tampoco arranca antes de su `not_before` (espera tras un fallo
+pasajero) ni mientras el cortacircuitos de su dominio esté abierto (ver
+`retry.py`).
+"""
+import ipaddress
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+
+from .cache import url_video_id
+
+# trabajos simultáneos por dominio salvo que `limits` diga otra cosa (0 = sin tope)
+DEFAULT_HOST_LIMIT = 3
+
+# segundos niveles habituales bajo un ccTLD: bbc.co.uk, abc.net.au...
+_SECOND_LEVEL = {"co", "com", "net", "org", "gov", "edu", "ac", "or", "ne", "go"}
+
+
+def host_key(url: str) -> str:
+    """Dominio registrable aproximado: "m.youtube.com" -> "youtube.com"."""
+    host = (urlsplit(url or "").hostname or "").lower().rstrip(".")
+    if not host:
+        return ""
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split(".")
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def extractor_key(url: str) -> str | None:
+    found = url_video_id(url)
+    return found[0] if found else None
+
+
+class FairQueue:
+    """Trabajos pendientes agrupados por prioridad y dominio.
+
+    No es thread-safe: `DownloadManager` la usa con su lock tomado.
+    """
+
+    def __init__(self, host_limit: int = DEFAULT_HOST_LIMIT, limits: dict[str, int] | None = None, breaker=None):
+        self.host_limit = host_limit
+        self.breaker = breaker
+        self.limits: dict[str, int] = dict(limits or {})
+        # prioridad -> dominio -> trabajos en orden de llegada; el orden del
+        # OrderedDict es el turno (el dominio servido pasa al final)
+        self._levels: dict[int, OrderedDict[str, deque]] = {}
+        self._keys: dict[str, tuple[str, str | None]] = {}
+        # trabajos en curso por dominio y por extractor
+        self._hosts: dict[str, int] = {}
+        self._extractors: dict[str, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self):
+        for priority in sorted(self._levels, reverse=True):
+            for lane in self._levels[priority].values():
+                yield from lane
+
+    # ---- topes ---------------------------------------------------------
+    def set_limit(self, key: str, value: int | None):
+        """Tope para un dominio o extractor; None lo quita."""
+        if value is None:
+            self.limits.pop(key, None)
+        else:
+            self.limits[key] = max(0, int(value))
+
+    def _wants_extractor(self) -> bool:
+        return any("." not in key for key in self.limits)
+
+    def keys(self, job) -> tuple[str, str | None]:
+        keys = self._keys.get(job.id)
+        if keys is None:
+            # el extractor solo se calcula si hay topes por extractor (importa yt_dlp)
+            keys = self._keys[job.id] = (host_key(job.url), extractor_key(job.url) if self._wants_extractor() else None)
+        return keys
+
+    def _limit(self, key: str | None, default: int = 0) -> int:
+        if not key:
+            return 0
+        return self.limits.get(key, default)
+
+    def host_open(self, host: str) -> bool:
+        """Si el dominio admite otro trabajo: tope y cortacircuitos."""
+        limit = self._limit(host, self.host_limit)
+        if limit and self._hosts.get(host, 0) >= limit:
+            return False
+        return not (self.breaker is not None and self.breaker.retry_in(host))
+
+    def can_run(self, job, now: float | None = None) -> bool:
+        host, extractor = self.keys(job)
+        if job.not_before > (time.monotonic() if now is None else now) or not self.host_open(host):
+            return False
+        limit = self._limit(extractor)
+        return not (limit and self._extractors.get(extractor, 0) >= limit)
+
+    def _first_runnable(self, host: str, lane: deque, now: float):
+        # un reintento en espera no bloquea a los que llegaron detrás
+        if not self.host_open(host):
+            return None
+        return next((job for job in lane if self.can_run(job, now)), None)
+
+    def has_runnable(self) -> bool:
+        """Si algún trabajo pendiente cabe ya en los topes."""
+        now = time.monotonic()
+        return any(self._first_runnable(host, lane, now) is not None
+                   for level in self._levels.values() for host, lane in level.items())
+
+    def next_ready_in(self) -> float | None:
+        """Segundos hasta que venza la espera más próxima (reintento o cortacircuitos), o None."""
+        now = time.monotonic()
+        waits = []
+        for level in self._levels.values():
+            for host, lane in level.items():
+                host_wait = self.breaker.retry_in(host) if self.breaker is not None else 0.0
+                job_wait = min(job.not_before for job in lane) - now
+                wait = max(host_wait, job_wait)
+                if wait > 0:
+                    waits.append(wait)
+        return min(waits) if waits else None
+
+    # ---- cola ----------------------------------------------------------
+    def push(self, job):
+        host, _ = self.keys(job)
+        level = self._levels.setdefault(job.priority, OrderedDict())
+        level.setdefault(host, deque()).append(job)
+        self._size += 1
+
+    def pop(self):
+        """Siguiente trabajo que cabe en los topes, o None (también si todos esperan a un tope)."""
+        now = time.monotonic()
+        for priority in sorted(self._levels, reverse=True):
+            level = self._levels[priority]
+            for host, lane in list(level.items()):
+                job = self._first_runnable(host, lane, now)
+                if job is None:
+                    continue
+                lane.remove(job)
+                del level[host]
+                if lane:
+                    level[host] = lane
+                if not level:
+                    del self._levels[priority]
+                self._size -= 1
+                return job
+        return None
+
+    def remove(self, job) -> bool:
+        host, _ = self.keys(job)
+        level = self._levels.get(job.priority)
+        lane = level.get(host) if level else None
+        if not lane:
+            return False
+        try:
+            lane.remove(job)
+        except ValueError:
+            return False
+        if not lane:
+            del level[host]
+            if not level:
+                del self._levels[job.priority]
+        self._keys.pop(job.id, None)
+        self._size -= 1
+        return True
+
+    def clear(self) -> list:
+        jobs = list(self)
+        for job in jobs:
+            self._keys.pop(job.id, None)
+        self._levels.clear()
+        self._size = 0
+        return jobs
+
+    # ---- contabilidad de trabajos en curso -----------------------------
+    def started(self, job):
+        for counts, key in zip((self._hosts, self._extractors), self.keys(job)):
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+        if self.breaker is not None:
+            self.breaker.started(self.keys(job)[0])
+
+    def drop_host(self, host: str) -> list:
+        """Quitar de la cola todos los trabajos de un dominio."""
+        dropped = []
+        for priority in list(self._levels):
+            lane = self._levels[priority].pop(host, None)
+            if lane:
+                dropped.extend(lane)
+            if not self._levels[priority]:
+                del self._levels[priority]
+        for job in dropped:
+            self._keys.pop(job.id, None)
+        self._size -= len(dropped)
+        return dropped
+
+    def finished(self, job):
+        for counts, key in zip((self._hosts, self._extractors), self._keys.pop(job.id, (None, None))):
+            if key:
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+
+    def snapshot(self) -> dict:
+        """Trabajos en curso y en cola por dominio."""
+        hosts = {host: {"running": count, "queued": 0} for host, count in self._hosts.items()}
+        for job in self:
+            hosts.setdefault(self.keys(job)[0], {"running": 0, "queued": 0})["queued"] += 1
+        return hosts
@@ -0,0 +1,379 @@
+"""Descarga segmentada por rangos HTTP para ficheros progresivos grandes.
+
+Algunos CDNs limitan la velocidad por conexión. Si el formato elegido es un
+único fichero HTTP(S) y el servidor admite `Range`, se divide en N partes que
+se descargan en paralelo, cada una escribiendo en su desplazamiento de un
+fichero `.part` reservado de antemano. Cada segmento reintenta por su cuenta
+desde el último byte escrito. El avance de cada segmento se guarda en
+`<fichero>.part.seg`, de modo que una descarga interrumpida (cierre de la
+app) continúa donde se quedó. Si el servidor no admite rangos se lanza
+`RangeNotSupported` y el llamador recurre a la descarga normal de yt_dlp.
+Las peticiones se hacen con `opener`: por defecto urllib; dentro de yt_dlp,
+`SegmentedYoutubeDL` pasa el de su `urlopen`, así proxy, certificados,
+dirección de origen, cookies e impersonación son los mismos que sin segmentar.
+Con `checksum` se calcula además la huella del fichero mientras se escribe
+(ver `integrity.py`) y se entrega en el evento "finished" como `digest`.
+
+`ydl_class()` devuelve una subclase de `YoutubeDL` que usa este modo cuando
+las opciones incluyen `segments` > 1. Si las opciones traen un ticket del
+autotuner (`autotune`, ver `autotune.py`), este decide el número de
+segmentos, o de fragmentos en paralelo para HLS/DASH, de cada descarga.
+"""
+import functools
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from .autotune import DEFAULT_FRAGMENTS, FRAGMENT_PROTOCOLS
+from .integrity import StreamHasher
+
+DEFAULT_SEGMENTS = 4
+MIN_SEGMENT_SIZE = 2 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+DEFAULT_RETRIES = 5
+DEFAULT_TIMEOUT = 30
+STATE_SAVE_INTERVAL = 1.0
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+class SegmentError(Exception):
+    pass
+
+
+class DownloadAborted(SegmentError):
+    pass
+
+
+def urllib_open(url: str, headers: dict, timeout: float):
+    """`opener` por defecto: respuesta de urllib (errores HTTP como `urllib.error.HTTPError`)."""
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+
+
+def _http_status(exc) -> int | None:
+    # urllib.error.HTTPError tiene `code`; el HTTPError de yt_dlp, `status`
+    return getattr(exc, "status", None) or getattr(exc, "code", None)
+
+
+def probe(url: str, headers: dict | None = None, timeout: float = DEFAULT_TIMEOUT, opener=urllib_open,
+          network_errors: tuple = (OSError,)) -> int:
+    """Devolver el tamaño total si el servidor responde 206 a `Range: bytes=0-0`."""
+    try:
+        with opener(url, {**(headers or {}), "Range": "bytes=0-0"}, timeout) as resp:
+            status = resp.status
+            content_range = resp.headers.get("Content-Range") or ""
+            if status == 206:
+                resp.read()
+    except network_errors as exc:
+        if _http_status(exc) is None:
+            raise
+        raise RangeNotSupported(f"HTTP {_http_status(exc)} on range probe") from exc
+    m = _CONTENT_RANGE_RE.match(content_range)
+    if status != 206 or not m or m.group(3) == "*":
+        raise RangeNotSupported("server does not support byte ranges")
+    return int(m.group(3))
+
+
+def split_ranges(total: int, segments: int, min_size: int = MIN_SEGMENT_SIZE) -> list[tuple[int, int]]:
+    """Rangos inclusivos [inicio, fin] que cubren `total` bytes."""
+    if total <= 0:
+        # fichero vacío: un único rango vacío
+        return [(0, -1)]
+    segments = max(1, min(segments, total // max(1, min_size) or 1))
+    size = -(-total // segments)
+    return [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+
+class SegmentedDownload:
+    def __init__(self, url: str, dest: str, headers: dict | None = None, segments: int = DEFAULT_SEGMENTS,
+                 retries: int = DEFAULT_RETRIES, timeout: float = DEFAULT_TIMEOUT, progress=None,
+                 min_segment_size: int = MIN_SEGMENT_SIZE, bandwidth=None, on_retry=None, checksum: str | None = None,
+                 opener=urllib_open, network_errors: tuple = (OSError,)):
+        self.url = url
+        # `opener(url, headers, timeout)` devuelve una respuesta; `network_errors` son sus errores reintentables
+        self.opener = opener
+        self.network_errors = tuple(network_errors)
+        self.checksum = checksum
+        self.hasher: StreamHasher | None = None
+        self.on_retry = on_retry
+        self.bandwidth = bandwidth
+        self.dest = dest
+        self.tmp = dest + ".part"
+        self.state_path = self.tmp + ".seg"
+        self.headers = dict(headers or {})
+        self.segments = segments
+        self.retries = retries
+        self.timeout = timeout
+        self.progress = progress
+        self.min_segment_size = min_segment_size
+        self.total = 0
+        self.downloaded = 0
+        self._resumed_from = 0
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._ranges: list[tuple[int, int]] = []
+        self._pos: list[int] = []
+        self._saved_at = 0.0
+
+    def _load_state(self) -> bool:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get("total") != self.total or not os.path.exists(self.tmp):
+            return False
+        self._ranges = [tuple(r) for r in state["ranges"]]
+        self._pos = list(state["pos"])
+        self.downloaded = sum(p - r[0] for p, r in zip(self._pos, self._ranges))
+        return True
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"total": self.total, "ranges": self._ranges, "pos": self._pos}, f)
+        os.replace(tmp, self.state_path)
+
+    def run(self) -> str:
+        """Descargar y devolver la ruta final. Lanza `RangeNotSupported` o `SegmentError`."""
+        self.total = probe(self.url, self.headers, self.timeout, self.opener, self.network_errors)
+        if not self._load_state():
+            self._ranges = split_ranges(self.total, self.segments, self.min_segment_size)
+            self._pos = [start for start, _ in self._ranges]
+            with open(self.tmp, "wb") as f:
+                f.truncate(self.total)
+            self._save_state()
+        self._resumed_from = self.downloaded
+        if self.checksum:
+            self.hasher = StreamHasher(self.tmp, self.checksum)
+        self._started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=len(self._ranges), thread_name_prefix="segment") as pool:
+                futures = [pool.submit(self._fetch, i) for i in range(len(self._ranges))]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    # detener el resto de segmentos antes de esperar al pool
+                    self._stop.set()
+                    raise
+        except BaseException:
+            with self._lock:
+                self._save_state()
+            raise
+        digest = self.hasher.finish(self.tmp) if self.hasher is not None else None
+        os.replace(self.tmp, self.dest)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        self._report("finished", digest=digest)
+        return self.dest
+
+    def abort(self):
+        """Detener todos los segmentos; el avance queda guardado para reanudar."""
+        self._stop.set()
+
+    def discard(self):
+        """Borrar el `.part` y su estado (p. ej. al recurrir a otro método)."""
+        for path in (self.tmp, self.state_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _fetch(self, index: int):
+        start, end = self._ranges[index]
+        pos = self._pos[index]
+        attempt = 0
+        while pos <= end:
+            if self._stop.is_set():
+                raise DownloadAborted("download aborted")
+            headers = {**self.headers, "Range": f"bytes={pos}-{end}"}
+            try:
+                with self.opener(self.url, headers, self.timeout) as resp, open(self.tmp, "r+b") as f:
+                    if resp.status != 206:
+                        raise RangeNotSupported(f"HTTP {resp.status} for ranged request")
+                    f.seek(pos)
+                    while pos <= end:
+                        if self._stop.is_set():
+                            raise DownloadAborted("download aborted")
+                        chunk = resp.read(min(CHUNK_SIZE, end - pos + 1))
+                        if not chunk:
+                            break
+                        if self.bandwidth is not None:
+                            self.bandwidth.consume(len(chunk))
+                        f.write(chunk)
+                        if self.hasher is not None:
+                            # el .part está reservado con ceros: leer de él solo lo que ya ha llegado al sistema
+                            f.flush()
+                            self.hasher.feed(pos, chunk)
+                        pos += len(chunk)
+                        attempt = 0
+                        self._advance(index, pos, len(chunk))
+                if pos <= end:
+                    raise SegmentError(f"connection closed at byte {pos}")
+            except (RangeNotSupported, DownloadAborted):
+                raise
+            except (*self.network_errors, SegmentError) as exc:
+                attempt += 1
+                if attempt > self.retries:
+                    raise SegmentError(f"segment {start}-{end} failed: {exc}") from exc
+                if self.on_retry is not None:
+                    self.on_retry(f"segment {index}: {exc}")
+                time.sleep(min(2 ** attempt * 0.25, 5))
+
+    def _advance(self, index: int, pos: int, n: int):
+        with self._lock:
+            self.downloaded += n
+            self._pos[index] = pos
+            now = time.monotonic()
+            if now - self._saved_at >= STATE_SAVE_INTERVAL:
+                self._saved_at = now
+                self._save_state()
+            contiguous = self.total
+            if self.hasher is not None:
+                # hasta dónde está escrito el fichero sin huecos
+                for (start, end), p in zip(self._ranges, self._pos):
+                    if p <= end:
+                        contiguous = p
+                        break
+        if self.hasher is not None:
+            self.hasher.advance(contiguous)
+        self._report("downloading")
+
+    def _report(self, status: str, **extra):
+        if self.progress is None:
+            return
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        speed = (self.downloaded - self._resumed_from) / elapsed
+        eta = (self.total - self.downloaded) / speed if speed else None
+        self.progress({
+            "status": status,
+            "downloaded_bytes": self.downloaded,
+            "total_bytes": self.total,
+            "speed": speed,
+            "eta": eta,
+            "elapsed": elapsed,
+            "filename": self.dest,
+            **extra,
+        })
+
+
+def is_segmentable(info: dict, min_segment_size: int = MIN_SEGMENT_SIZE) -> bool:
+    size = info.get("filesize") or info.get("filesize_approx")
+    return (
+        info.get("protocol") in ("http", "https")
+        and not (size and size < 2 * min_segment_size)
+        and bool(info.get("url"))
+        and not info.get("fragments")
+        and not info.get("requested_formats")
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def ydl_class():
+    """Subclase de `YoutubeDL` con descarga segmentada (yt_dlp se importa aquí)."""
+    import yt_dlp
+
+    class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+        # yt_dlp anuncia sus reintentos (HTTP, fragmentos, extractores) solo como texto
+        def _report_retry(self, message):
+            for hook in self.params.get("retry_hooks") or []:
+                hook(message)
+            ticket = self.params.get("autotune")
+            if ticket is not None:
+                ticket.retry()
+
+        def _notify_retry(self, message):
+            if "Retrying" in str(message):
+                self._report_retry(message)
+
+        def to_screen(self, message, *args, **kwargs):
+            self._notify_retry(message)
+            return super().to_screen(message, *args, **kwargs)
+
+        def report_warning(self, message, *args, **kwargs):
+            self._notify_retry(message)
+            return super().report_warning(message, *args, **kwargs)
+
+        def dl(self, name, info, subtitle=False, test=False):
+            segments = int(self.params.get("segments") or 1)
+            ticket = None if subtitle or test else self.params.get("autotune")
+            kind = None
+            if ticket is not None:
+                if info.get("protocol") in FRAGMENT_PROTOCOLS:
+                    kind = "fragments"
+                    self.params["concurrent_fragment_downloads"] = ticket.begin(kind, DEFAULT_FRAGMENTS)
+                elif segments > 1 and is_segmentable(info):
+                    kind = "segments"
+                    segments = ticket.begin(kind, segments)
+            if kind is None:
+                return self._dl(name, info, segments, subtitle, test)
+            try:
+                result = self._dl(name, info, segments, subtitle, test)
+            except Exception:
+                ticket.end(0, failed=True)
+                raise
+            # (éxito, descarga real): un fichero que ya existía no dice nada del nivel
+            success, real = result if isinstance(result, tuple) else (result, True)
+            ticket.end(os.path.getsize(name) if success and real and os.path.exists(name) else 0, failed=not success)
+            return result
+
+        def _request_extensions(self, info) -> dict | None:
+            """Extensiones de petición como las de `HttpFD`; None si no se pueden reproducir."""
+            impersonate = info.get("impersonate")
+            if impersonate is None:
+                return {}
+            parse = getattr(self, "_parse_impersonate_targets", None)
+            target = parse(impersonate)[0] if parse is not None else None
+            # sin objetivo disponible, que yt_dlp avise y descargue a su manera
+            return {"impersonate": target} if target else None
+
+        def _opener(self, extensions: dict):
+            from yt_dlp.networking import Request
+
+            def _open(url, headers, timeout):
+                return self.urlopen(Request(url, headers=headers, extensions=dict(extensions, timeout=timeout)))
+            return _open
+
+        def _dl(self, name, info, segments, subtitle, test):
+            # un .part sin estado de segmentos es de yt_dlp: que lo continúe él
+            foreign_part = os.path.exists(name + ".part") and not os.path.exists(name + ".part.seg")
+            extensions = self._request_extensions(info)
+            if (segments > 1 and not subtitle and not test and name != "-" and not foreign_part and extensions is not None
+                    and not os.path.exists(name) and is_segmentable(info)):
+                from yt_dlp.networking.exceptions import RequestError
+
+                hooks = self.params.get("progress_hooks") or []
+                # cookies, proxy, certificados y dirección de origen los pone `urlopen`
+                download = SegmentedDownload(
+                    info["url"], name, headers=dict(info.get("http_headers") or {}), segments=segments,
+                    retries=int(self.params.get("retries") or DEFAULT_RETRIES),
+                    timeout=self.params.get("socket_timeout") or DEFAULT_TIMEOUT,
+                    progress=lambda d: [hook(dict(d, info_dict=info)) for hook in hooks],
+                    bandwidth=self.params.get("bandwidth"),
+                    on_retry=self._report_retry,
+                    checksum=self.params.get("checksum"),
+                    opener=self._opener(extensions),
+                    network_errors=(OSError, RequestError),
+                )
+                try:
+                    self.to_screen(f"[segmented] Downloading {name} over {segments} connections")
+                    download.run()
+                    return True, True
+                except RangeNotSupported as exc:
+                    self.to_screen(f"[segmented] {exc}; falling back to a single connection")
+                    download.discard()
+            return super().dl(name, info, subtitle=subtitle, test=test)
+
+    return SegmentedYoutubeDL
@@ -0,0 +1,172 @@
+"""Sesiones de yt_dlp reutilizables entre descargas.
+
+Construir un `YoutubeDL` carga extractores, el cookie jar y abre un director
+de peticiones HTTP nuevo. `YtdlSession` guarda instancias ya inicializadas por
+perfil de opciones (p. ej. "video a 720p" o "audio mp3") y las presta a los
+trabajos; así las conexiones keep-alive a los mismos hosts se reaprovechan.
+
+Una instancia de `YoutubeDL` no es segura entre hilos: cada préstamo es
+exclusivo y con varios hilos el pool crece hasta una instancia por hilo.
+"""
+import atexit
+import json
+import sys
+import threading
+from contextlib import contextmanager
+
+from .cache import extract_with_cache, extractor_classes
+from .segmented import ydl_class
+
+# Opciones que cambian por URL y se aplican sin reconstruir la sesión
+PER_JOB_KEYS = ("outtmpl", "progress_hooks", "postprocessor_hooks", "retry_hooks", "bandwidth", "autotune")
+
+MAX_IDLE_PER_PROFILE = 8
+
+
+def profile_key(opts: dict) -> str:
+    shared = {k: v for k, v in opts.items() if k not in PER_JOB_KEYS}
+    return json.dumps(shared, sort_keys=True, default=repr)
+
+
+class _Lease:
+    """Instancia de YoutubeDL con hooks redirigibles al trabajo actual."""
+
+    def __init__(self, opts: dict):
+        self.on_progress = None
+        self.on_postprocess = None
+        self.on_retry = None
+        self.bandwidth = None
+        params = {k: v for k, v in opts.items() if k not in PER_JOB_KEYS}
+        params["progress_hooks"] = [self._progress]
+        params["postprocessor_hooks"] = [self._postprocess]
+        params["retry_hooks"] = [self._retry]
+        self.ydl = ydl_class()(params)
+        self.default_outtmpl = dict(self.ydl.params.get("outtmpl") or {})
+
+    def _progress(self, d):
+        if self.on_progress:
+            self.on_progress(d)
+
+    def _postprocess(self, d):
+        if self.on_postprocess:
+            self.on_postprocess(d)
+
+    def _retry(self, message):
+        if self.on_retry:
+            self.on_retry(message)
+
+    def prepare(self, opts: dict):
+        outtmpl = dict(self.default_outtmpl)
+        override = opts.get("outtmpl")
+        if isinstance(override, dict):
+            outtmpl.update(override)
+        elif override is not None:
+            outtmpl["default"] = str(override)
+        self.ydl.params["outtmpl"] = outtmpl
+        hooks = opts.get("progress_hooks") or []
+        self.on_progress = (lambda d: [h(d) for h in hooks]) if hooks else None
+        pp_hooks = opts.get("postprocessor_hooks") or []
+        self.on_postprocess = (lambda d: [h(d) for h in pp_hooks]) if pp_hooks else None
+        retry_hooks = opts.get("retry_hooks") or []
+        self.on_retry = (lambda message: [h(message) for h in retry_hooks]) if retry_hooks else None
+        # parte del límite global de ancho de banda (ver ratelimit.py)
+        self.bandwidth = opts.get("bandwidth")
+        if self.bandwidth is not None:
+            self.ydl.params["bandwidth"] = self.bandwidth
+            self.bandwidth.bind(self.ydl.params)
+        # nivel de fragmentos/conexiones del trabajo (ver autotune.py)
+        if opts.get("autotune") is not None:
+            self.ydl.params["autotune"] = opts["autotune"]
+
+    def release(self):
+        self.on_progress = None
+        self.on_postprocess = None
+        self.on_retry = None
+        if self.bandwidth is not None:
+            self.bandwidth.unbind()
+            self.ydl.params.pop("bandwidth", None)
+            self.bandwidth = None
+        if self.ydl.params.pop("autotune", None) is not None:
+            self.ydl.params.pop("concurrent_fragment_downloads", None)
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+
+class YtdlSession:
+    def __init__(self, max_idle_per_profile: int = MAX_IDLE_PER_PROFILE):
+        self._lock = threading.Lock()
+        self._idle: dict[str, list[_Lease]] = {}
+        self._max_idle = max_idle_per_profile
+
+    @contextmanager
+    def acquire(self, opts: dict):
+        """Prestar un `YoutubeDL` configurado con `opts`.
+
+        Las claves de `PER_JOB_KEYS` se aplican sobre una instancia existente
+        del mismo perfil; el resto de opciones define el perfil.
+        """
+        key = profile_key(opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            lease = idle.pop() if idle else None
+        if lease is None:
+            lease = _Lease(opts)
+        try:
+            lease.prepare(opts)
+            yield lease.ydl
+        finally:
+            lease.release()
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self._max_idle:
+                    idle.append(lease)
+                    lease = None
+            if lease is not None:
+                lease.close()
+
+    def extract_info(self, url: str, opts: dict, download: bool = True, cache=None) -> dict | None:
+        """Extraer (y descargar) `url`; con `cache` se reutiliza la info guardada."""
+        with self.acquire(opts) as ydl:
+            return extract_with_cache(ydl, url, cache, download=download)
+
+    def close(self):
+        with self._lock:
+            leases = [lease for idle in self._idle.values() for lease in idle]
+            self._idle.clear()
+        for lease in leases:
+            lease.close()
+
+
+_default_session: YtdlSession | None = None
+_default_lock = threading.Lock()
+
+
+def get_session() -> YtdlSession:
+    """Sesión compartida por todo el proceso (GUI y CLI)."""
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = YtdlSession()
+            atexit.register(_default_session.close)
+        return _default_session
+
+
+def prewarm():
+    """Cargar yt_dlp y su registro de extractores en un hilo de fondo.
+
+    La GUI lo llama tras el primer pintado para que la ventana no espere a
+    yt_dlp y el primer trabajo lo encuentre ya importado.
+    """
+    def _load():
+        try:
+            extractor_classes()
+        except Exception as exc:
+            print("yt_dlp prewarm failed:", exc, file=sys.stderr)
+
+    thread = threading.Thread(target=_load, name="ytdlp-prewarm", daemon=True)
+    thread.start()
+    return thread
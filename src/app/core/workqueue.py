@@ -0,0 +1,379 @@
+"""Cola de trabajos duradera con arrendamientos (leases), compartida por varios procesos.
+
+Los productores (`main.py queue add`) escriben trabajos en la cola; cada
+`main.py worker` reclama trabajos con un arrendamiento de `lease` segundos,
+los descarga con su propio `DownloadManager` y lo renueva con latidos
+mientras tanto. Si un worker muere, su arrendamiento vence y el trabajo
+vuelve a la cola para otro; tras `max_attempts` reclamaciones vencidas se da
+por fallido (un trabajo que tumba a quien lo coge no tumba a todos).
+
+Cada reclamación lleva un `token` nuevo y solo el poseedor del token vigente
+puede renovar o cerrar el trabajo: si un worker se queda colgado y su trabajo
+pasa a otro, su resultado tardío se rechaza y el trabajo se cierra una sola
+vez. Quien pierde el arrendamiento cancela su descarga.
+
+`SQLiteJobQueue` es el backend por defecto: un fichero en la carpeta de
+datos o en un volumen compartido entre máquinas. Usa el diario de rollback
+de SQLite (no WAL, que necesita memoria compartida y no sirve en NFS/SMB) y
+transacciones `BEGIN IMMEDIATE`, así reclamar es atómico entre procesos.
+Otros backends implementan `JobQueue` y se registran en `BACKENDS` con su
+esquema de URL (ver `open_queue`).
+"""
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from .jobs import DEFAULT_AUDIO_FORMAT, DownloadJob, JobState, Priority
+from .paths import user_data_dir
+
+DEFAULT_LEASE = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+# espera entre consultas cuando la cola está vacía
+POLL_INTERVAL = 1.0
+# espera máxima entre reintentos cuando la cola da error (p. ej. "database is locked")
+MAX_BACKOFF = 30.0
+QUEUE_ENV = "VIDEOLEECH_QUEUE"
+
+
+@dataclass
+class Lease:
+    """Un trabajo reclamado: válido mientras `token` siga siendo el vigente."""
+    job: DownloadJob
+    token: str
+    owner: str
+    expires: float
+    attempts: int
+    claimed: float
+
+
+def job_spec(job: DownloadJob) -> dict:
+    """Lo necesario para reconstruir el trabajo en otro proceso u otra máquina."""
+    return {
+        "url": job.url, "is_video": job.is_video, "quality": job.quality, "download_dir": job.download_dir,
+        "options": job.options, "use_cache": job.use_cache, "use_archive": job.use_archive,
+        "rate_limit": job.rate_limit, "audio_format": job.audio_format,
+    }
+
+
+def job_from_spec(job_id: str, spec: dict, priority: int = Priority.NORMAL) -> DownloadJob:
+    return DownloadJob(
+        url=spec["url"], is_video=spec.get("is_video", True), quality=spec.get("quality"),
+        download_dir=spec.get("download_dir"), options=spec.get("options") or {},
+        use_cache=spec.get("use_cache", True), use_archive=spec.get("use_archive", True),
+        rate_limit=spec.get("rate_limit"), audio_format=spec.get("audio_format") or DEFAULT_AUDIO_FORMAT,
+        priority=priority, id=job_id,
+    )
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """Interfaz de una cola con arrendamientos. Todas las horas son `time.time()`."""
+
+    def put(self, job: DownloadJob) -> bool:
+        """Encolar; False si ya había un trabajo con ese id (enviar dos veces no duplica)."""
+        raise NotImplementedError
+
+    def claim(self, owner: str, lease: float = DEFAULT_LEASE) -> Lease | None:
+        """Reclamar el siguiente trabajo (vuelven antes a la cola los arrendamientos vencidos)."""
+        raise NotImplementedError
+
+    def heartbeat(self, lease: Lease, duration: float = DEFAULT_LEASE) -> bool:
+        """Renovar; False si el arrendamiento ya no es suyo."""
+        raise NotImplementedError
+
+    def complete(self, lease: Lease, state: str, error: str | None = None, result: dict | None = None) -> bool:
+        """Cerrar el trabajo con un estado final; False si el arrendamiento ya no es suyo."""
+        raise NotImplementedError
+
+    def release(self, lease: Lease) -> bool:
+        """Devolver el trabajo a la cola sin gastar un intento (p. ej. al parar un worker)."""
+        raise NotImplementedError
+
+    def requeue_expired(self) -> int:
+        """Devolver a la cola los arrendamientos vencidos; devuelve cuántos."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def counts(self) -> dict[str, int]:
+        """Trabajos por estado."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    def __init__(self, path=None, max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout: float = 30.0):
+        self.path = Path(path) if path else user_data_dir() / "queue.sqlite3"
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # autocommit: las transacciones se abren a mano con BEGIN IMMEDIATE
+        self._db = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, spec TEXT NOT NULL, priority INTEGER NOT NULL, state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, token TEXT, expires REAL,"
+            " error TEXT, result TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority DESC, created)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db, time.time())
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def put(self, job: DownloadJob) -> bool:
+        def _put(db, now):
+            return db.execute(
+                "INSERT OR IGNORE INTO jobs (id, spec, priority, state, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, json.dumps(job_spec(job), ensure_ascii=False), job.priority, JobState.QUEUED, now, now),
+            ).rowcount == 1
+        return self._transaction(_put)
+
+    def _requeue_expired(self, db, now) -> int:
+        db.execute(
+            "UPDATE jobs SET state=?, owner=NULL, token=NULL, expires=NULL, updated=?,"
+            " error='lease expired ' || attempts || ' times'"
+            " WHERE state=? AND expires < ? AND attempts >= ?",
+            (JobState.FAILED, now, JobState.RUNNING, now, self.max_attempts),
+        )
+        return db.execute(
+            "UPDATE jobs SET state=?, owner=NULL, token=NULL, expires=NULL, updated=? WHERE state=? AND expires < ?",
+            (JobState.QUEUED, now, JobState.RUNNING, now),
+        ).rowcount
+
+    def requeue_expired(self) -> int:
+        return self._transaction(self._requeue_expired)
+
+    def claim(self, owner: str, lease: float = DEFAULT_LEASE) -> Lease | None:
+        def _claim(db, now):
+            self._requeue_expired(db, now)
+            row = db.execute(
+                "SELECT id, spec, priority, attempts FROM jobs WHERE state=? ORDER BY priority DESC, created LIMIT 1",
+                (JobState.QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, spec, priority, attempts = row
+            token = uuid.uuid4().hex
+            db.execute(
+                "UPDATE jobs SET state=?, owner=?, token=?, expires=?, attempts=?, updated=? WHERE id=?",
+                (JobState.RUNNING, owner, token, now + lease, attempts + 1, now, job_id),
+            )
+            job = job_from_spec(job_id, json.loads(spec), priority)
+            return Lease(job=job, token=token, owner=owner, expires=now + lease, attempts=attempts + 1, claimed=now)
+        return self._transaction(_claim)
+
+    def heartbeat(self, lease: Lease, duration: float = DEFAULT_LEASE) -> bool:
+        def _heartbeat(db, now):
+            # uno vencido pero aún no reclamado por otro se puede renovar: sigue siendo suyo
+            ok = db.execute(
+                "UPDATE jobs SET expires=?, updated=? WHERE id=? AND token=? AND state=?",
+                (now + duration, now, lease.job.id, lease.token, JobState.RUNNING),
+            ).rowcount == 1
+            if ok:
+                lease.expires = now + duration
+            return ok
+        return self._transaction(_heartbeat)
+
+    def complete(self, lease: Lease, state: str, error: str | None = None, result: dict | None = None) -> bool:
+        if state not in JobState.FINAL:
+            raise ValueError(f"not a final state: {state!r}")
+
+        def _complete(db, now):
+            return db.execute(
+                "UPDATE jobs SET state=?, error=?, result=?, owner=NULL, token=NULL, expires=NULL, updated=?"
+                " WHERE id=? AND token=? AND state=?",
+                (state, error, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 now, lease.job.id, lease.token, JobState.RUNNING),
+            ).rowcount == 1
+        return self._transaction(_complete)
+
+    def release(self, lease: Lease) -> bool:
+        def _release(db, now):
+            return db.execute(
+                "UPDATE jobs SET state=?, owner=NULL, token=NULL, expires=NULL, attempts=MAX(attempts - 1, 0),"
+                " updated=? WHERE id=? AND token=? AND state=?",
+                (JobState.QUEUED, now, lease.job.id, lease.token, JobState.RUNNING),
+            ).rowcount == 1
+        return self._transaction(_release)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, spec, priority, state, attempts, owner, expires, error, result, created, updated"
+                " FROM jobs WHERE id=?", (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "spec", "priority", "state", "attempts", "owner", "expires", "error", "result", "created", "updated")
+        rec = dict(zip(keys, row))
+        rec["spec"] = json.loads(rec["spec"])
+        rec["result"] = json.loads(rec["result"]) if rec["result"] else None
+        return rec
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# esquema de URL -> clase; `open_queue("sqlite:///ruta")` o solo la ruta
+BACKENDS: dict[str, type] = {"sqlite": SQLiteJobQueue}
+
+
+def open_queue(spec: str | None = None, **kwargs) -> JobQueue:
+    """Abrir la cola de `spec` (o de `$VIDEOLEECH_QUEUE`, o la de la carpeta de datos)."""
+    spec = spec or os.environ.get(QUEUE_ENV)
+    if not spec:
+        return SQLiteJobQueue(**kwargs)
+    scheme = urlsplit(spec).scheme
+    # una ruta de Windows ("C:\...") no es un esquema
+    if len(scheme) <= 1:
+        return SQLiteJobQueue(spec, **kwargs)
+    if scheme not in BACKENDS:
+        raise ValueError(f"unknown queue backend: {scheme!r} (known: {', '.join(BACKENDS)})")
+    return BACKENDS[scheme](spec.split("://", 1)[1] or None, **kwargs)
+
+
+class QueueWorker:
+    """Reclama trabajos de una `JobQueue` y los ejecuta en un `DownloadManager`.
+
+    Mantiene reclamados como mucho `manager.max_workers` trabajos a la vez y
+    renueva sus arrendamientos cada `lease / 3` segundos desde un hilo propio;
+    si pierde uno, cancela esa descarga. `on_finished(lease, accepted)` se
+    llama desde los hilos del gestor con cada trabajo terminado; `accepted` es
+    False si la cola rechazó el resultado porque el trabajo ya era de otro.
+
+    El gestor tiene que poder cancelar trabajos en curso (runner "process"):
+    si no, quien pierde un arrendamiento seguiría descargando a la vez que
+    el nuevo poseedor.
+    """
+
+    def __init__(self, queue: JobQueue, manager, name: str | None = None, lease: float = DEFAULT_LEASE,
+                 poll: float = POLL_INTERVAL, on_finished=None):
+        if not manager.can_cancel_running:
+            raise ValueError("queue workers need a runner that can cancel running jobs (the process backend)")
+        self.queue = queue
+        self.manager = manager
+        self.name = name or worker_name()
+        self.lease = lease
+        self.poll = poll
+        self.on_finished = on_finished
+        self._lock = threading.Lock()
+        self._leases: dict[str, Lease] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def active(self) -> int:
+        with self._lock:
+            return len(self._leases)
+
+    def run(self, drain: bool = False):
+        """Trabajar hasta `stop()`; con `drain`, también hasta que no quede nada en la cola."""
+        self.manager.add_listener(self._on_event)
+        beat = threading.Thread(target=self._heartbeats, name="queue-heartbeat", daemon=True)
+        beat.start()
+        backoff = self.poll
+        try:
+            while not self._stop.is_set():
+                if self.active < self.manager.max_workers:
+                    try:
+                        lease = self.queue.claim(self.name, self.lease)
+                    except sqlite3.Error as exc:
+                        # cola compartida ocupada o inaccesible un momento: esperar cada vez más
+                        print(f"Queue claim failed ({exc}); retrying in {backoff:g}s", file=sys.stderr)
+                        self._stop.wait(backoff)
+                        backoff = min(backoff * 2, MAX_BACKOFF)
+                        continue
+                    backoff = self.poll
+                    if lease is not None:
+                        with self._lock:
+                            self._leases[lease.job.id] = lease
+                        self.manager.submit(job=lease.job)
+                        continue
+                    if drain and not self.active and not self._pending_elsewhere():
+                        return
+                self._wake.wait(self.poll)
+                self._wake.clear()
+        finally:
+            self._stop.set()
+            self._release_all()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _pending_elsewhere(self) -> bool:
+        # los trabajos de otros workers pueden volver a la cola si su arrendamiento vence
+        counts = self.queue.counts()
+        return bool(counts.get(JobState.QUEUED) or counts.get(JobState.RUNNING))
+
+    def _release_all(self):
+        # primero soltar: el gestor cancela lo pendiente al cerrarse y eso no debe cerrar trabajos en la cola
+        self.manager.remove_listener(self._on_event)
+        with self._lock:
+            leases, self._leases = list(self._leases.values()), {}
+        for lease in leases:
+            self.queue.release(lease)
+            self.manager.cancel(lease.job.id)
+
+    def _heartbeats(self):
+        while not self._stop.wait(self.lease / 3):
+            with self._lock:
+                leases = list(self._leases.values())
+            for lease in leases:
+                try:
+                    ok = self.queue.heartbeat(lease, self.lease)
+                except sqlite3.Error as exc:
+                    # la cola compartida puede fallar un momento; el arrendamiento da margen
+                    print("Queue heartbeat failed:", exc, file=sys.stderr)
+                    continue
+                if not ok:
+                    print(f"Lease lost for {lease.job.id}; cancelling", file=sys.stderr)
+                    with self._lock:
+                        self._leases.pop(lease.job.id, None)
+                    self.manager.cancel(lease.job.id)
+                    self._wake.set()
+
+    def _on_event(self, job_id: str, event: str, payload):
+        if event != "state" or payload not in JobState.FINAL:
+            return
+        with self._lock:
+            lease = self._leases.pop(job_id, None)
+        if lease is None:
+            return
+        job = lease.job
+        info = job.info or {}
+        result = {"title": info.get("title"), "file": info.get("filepath") or info.get("_filename"), "digest": info.get("digest"),
+                  "skipped": job.skipped, "audio": job.audio_mode, "worker": self.name,
+                  "elapsed": round(time.time() - lease.claimed, 3),
+                  "timings": {stage: round(secs, 3) for stage, secs in job.timings.items()}}
+        accepted = self.queue.complete(lease, payload, job.error, result)
+        self._wake.set()
+        if self.on_finished is not None:
+            self.on_finished(lease, accepted)
@@ -1,7 +1,10 @@
-from yt_dlp import YoutubeDL
+import functools
 import sys
 import os
 from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from app.core.engine import get_engine
+from app.core.jobs import DEFAULT_AUDIO_FORMAT, DownloadJob, JobState
 
 def _parse_xdg_user_dirs():
     cfg = Path.home() / ".config" / "user-dirs.dirs"
@@ -24,12 +27,15 @@ def _parse_xdg_user_dirs():
         return None
     return None
 
+@functools.lru_cache(maxsize=None)
 def default_download_dir():
     """
     Determina la carpeta de 'Downloads' de forma robusta:
     - En Windows prueba USERPROFILE/Downloads y otras variantes.
     - En Linux/mac intenta leer XDG_DOWNLOAD_DIR en ~/.config/user-dirs.dirs.
     - Si no hay coincidencias, cae a ~/Downloads (creándola si es necesario).
+
+    El resultado se memoriza: solo se calcula al primer uso, no al arrancar.
     """
     home = Path.home()
     candidates = []
@@ -70,64 +76,37 @@ def ensure_dir(path):
         path = Path.home()
     return path
 
+# las descargas de estos ayudantes muestran la salida de yt_dlp
+APP_OPTS = {
+    'quiet': False,
+    'no_warnings': False
+}
+
+def _run(job, label):
+    """Descargar con el motor compartido (reintentos, archivo y caché incluidos)."""
+    job = get_engine().run(job)
+    if job.state != JobState.DONE:
+        print(f"Error al descargar {label}:", job.error)
+    return job.state == JobState.DONE
+
 def download_video(video_url, quality=None, download_dir=None):
     if download_dir is None:
         download_dir = default_download_dir()
 
     download_dir = ensure_dir(download_dir)
-    format_str = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
-    if quality:
-        if isinstance(quality, str) and quality.lower() in ("max", "maximum quality", "maximum"):
-            format_str = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
-        elif isinstance(quality, str) and quality.endswith("p"):
-            # mantener compatibilidad: usar height<=N
-            try:
-                h = int(quality[:-1])
-                format_str = f"bestvideo[height<={h}]+bestaudio/best"
-            except Exception:
-                pass
-
-    opts = {
-        'format': format_str,
-        'outtmpl': str(Path(download_dir) / "%(title)s.%(ext)s"),
-        'merge_output_format': 'mp4',
-        'quiet': False,
-        'no_warnings': False
-    }
+    # "720p" limita la altura; None o "max" es la mejor calidad (ver jobs.video_format)
+    job = DownloadJob(url=video_url, quality=quality, download_dir=str(download_dir), options=dict(APP_OPTS))
+    return _run(job, "video")
 
-    try:
-        with YoutubeDL(opts) as yt:
-            yt.extract_info(video_url, download=True)
-        return True
-    except Exception as e:
-        print("Error al descargar video:", e)
-        return False
-
-def download_audio(audio_url, download_dir=None):
+def download_audio(audio_url, download_dir=None, audio_format=DEFAULT_AUDIO_FORMAT):
     if download_dir is None:
         download_dir = default_download_dir()
 
     download_dir = ensure_dir(download_dir)
-    opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': str(Path(download_dir) / "%(title)s.%(ext)s"),
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'quiet': False,
-        'javascript_helper': 'node',
-        'no_warnings': False
-    }
-
-    try:
-        with YoutubeDL(opts) as yt:
-            yt.extract_info(audio_url, download=True)
-        return True
-    except Exception as e:
-        print("Error al descargar audio:", e)
-        return False
+    # "original", "m4a", "opus" o "mp3": solo se recodifica si el códec no coincide
+    job = DownloadJob(url=audio_url, is_video=False, download_dir=str(download_dir), audio_format=audio_format,
+                      options=dict(APP_OPTS))
+    return _run(job, "audio")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -24,7 +24,30 @@ if hasattr(sys, '_MEIPASS'):
 else:
     BASE_DIR = Path(__file__).resolve().parent
 
-PATHS = {
+class _ResourcePaths(dict):
+    """Rutas de recursos que se comprueban al primer acceso y no al importar.
+
+    Si la ruta no existe se devuelve cadena vacía para evitar errores de QIcon/QPixmap.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checked = set()
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if key not in self._checked:
+            self._checked.add(key)
+            if value and not Path(value).exists():
+                value = ""
+                super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+PATHS = _ResourcePaths({
     "logo": str(BASE_DIR / "resources" / "logo.png"),
     "icon_menu_dark": str(BASE_DIR / "resources" / "menu_icon_dark.svg"),
     "icon_menu_light": str(BASE_DIR / "resources" / "menu_icon_light.svg"),
@@ -38,10 +61,4 @@ PATHS = {
     "github_icon_light": str(BASE_DIR / "resources" / "github_icon_light.svg"),
     "github_icon_dark": str(BASE_DIR / "resources" / "github_icon_dark.svg"),
 
-}
-
-# Normalizar: si la ruta no existe, devolver cadena vacía para evitar QIcon/QPixmap errores
-for k, v in list(PATHS.items()):
-    p = Path(v)
-    if not p.exists():
-        PATHS[k] = ""
\ No newline at end of file
+})
@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QComboBox,
+                               QTableView, QHeaderView, QAbstractItemView)
+from PySide6.QtCore import Qt, QTimer
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from app.core.jobmodel import ACTIVE_STATES, DownloadsModel, ProgressDelegate
+from app.core.jobs import JobState
+
+# texto del filtro -> estados mostrados (None = todos)
+STATE_FILTERS = {
+    "All": None,
+    "Active": ACTIVE_STATES,
+    "Queued": (JobState.QUEUED,),
+    "Running": (JobState.RUNNING, JobState.POSTPROCESSING),
+    "Done": (JobState.DONE,),
+    "Failed": (JobState.FAILED,),
+    "Cancelled": (JobState.CANCELLED,),
+}
+
+ROW_HEIGHT = 22
+
+
+class DownloadsPanel(QWidget):
+    """Lista de descargas de un `DownloadQueue`.
+
+    La tabla es una vista sobre `DownloadsModel` (ver `core/jobmodel.py`),
+    que también ordena y filtra: las filas no tienen widgets propios y solo
+    se pintan las visibles, así que aguanta decenas de miles de trabajos.
+    Altura de fila fija y columnas sin ajuste al contenido, que obligaría a
+    medir todas las filas.
+    """
+
+    def __init__(self, downloads, parent=None):
+        super().__init__(parent)
+        self.downloads = downloads
+        self.model = DownloadsModel(parent=self)
+
+        self.state_box = QComboBox()
+        self.state_box.addItems(list(STATE_FILTERS))
+        self.state_box.currentTextChanged.connect(self.set_state_filter)
+
+        self.search_line = QLineEdit()
+        self.search_line.setPlaceholderText("Filter downloads...")
+        self.search_line.textChanged.connect(self.model.set_text_filter)
+
+        self.btn_cancel = QPushButton("Cancel selected")
+        self.btn_cancel.clicked.connect(self.cancel_selected)
+        self.btn_clear = QPushButton("Clear finished")
+        self.btn_clear.clicked.connect(self.model.remove_finished)
+
+        self.summary_label = QLabel("")
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSortingEnabled(True)
+        self.view.sortByColumn(-1, Qt.AscendingOrder)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setWordWrap(False)
+        self.view.setShowGrid(False)
+        self.view.setAlternatingRowColors(True)
+        self.view.setItemDelegateForColumn(DownloadsModel.PROGRESS, ProgressDelegate(self.view))
+        vertical = self.view.verticalHeader()
+        vertical.setVisible(False)
+        vertical.setSectionResizeMode(QHeaderView.Fixed)
+        vertical.setDefaultSectionSize(ROW_HEIGHT)
+        header = self.view.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setStretchLastSection(True)
+        header.resizeSection(DownloadsModel.NAME, 220)
+        header.resizeSection(DownloadsModel.KIND, 50)
+        header.resizeSection(DownloadsModel.PROGRESS, 110)
+        for column in (DownloadsModel.STATE, DownloadsModel.SPEED, DownloadsModel.ETA, DownloadsModel.SIZE):
+            header.resizeSection(column, 80)
+
+        controls = QHBoxLayout()
+        controls.setContentsMargins(0, 0, 0, 0)
+        controls.addWidget(self.state_box)
+        controls.addWidget(self.search_line, 1)
+        controls.addWidget(self.btn_cancel)
+        controls.addWidget(self.btn_clear)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 6, 10, 6)
+        layout.addLayout(controls)
+        layout.addWidget(self.view)
+        layout.addWidget(self.summary_label)
+
+        # el resumen no necesita ir al ritmo de la tabla
+        self._summary_timer = QTimer(self)
+        self._summary_timer.setInterval(1000)
+        self._summary_timer.timeout.connect(self.update_summary)
+        self._summary_timer.start()
+
+        self.model.attach(downloads.manager)
+
+    def set_state_filter(self, label: str):
+        self.model.set_state_filter(STATE_FILTERS.get(label))
+
+    def selected_job_ids(self) -> list[str]:
+        rows = sorted(index.row() for index in self.view.selectionModel().selectedRows())
+        return [job_id for job_id in map(self.model.job_id, rows) if job_id]
+
+    def cancel_selected(self):
+        for job_id in self.selected_job_ids():
+            self.downloads.cancel(job_id)
+
+    def update_summary(self):
+        counts = self.model.counts()
+        if not counts:
+            self.summary_label.setText("")
+            return
+        active = sum(counts.get(state, 0) for state in ACTIVE_STATES)
+        self.summary_label.setText(
+            f"{sum(counts.values())} download(s): {active} active, {counts.get(JobState.DONE, 0)} done, "
+            f"{counts.get(JobState.FAILED, 0)} failed"
+        )
+
+    def shutdown(self):
+        self._summary_timer.stop()
+        self.model.detach()
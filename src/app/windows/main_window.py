@@ -3,25 +3,33 @@ from pathlib import Path
 import os
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QLineEdit, 
-                             QStackedWidget, QFrame, QComboBox, QFileDialog)
-from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QSize, QSettings, QThread
+                             QStackedWidget, QFrame, QComboBox, QFileDialog, QSpinBox, QMessageBox, QCheckBox,
+                             QSplitter)
+from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QSize, QSettings, QTimer
 from PySide6.QtGui import QPixmap, QIcon
 from .about_window import AboutWindow
+from .downloads_panel import DownloadsPanel
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 from app.styles import COLORS, PATHS
 from app.main import download_video, download_audio, default_download_dir
-from app.core.downloader import DownloadWorker
-
-home = Path.home()
-downloads_path = Path(default_download_dir())
-
-if not downloads_path.exists():
-    downloads_path = home
+from app.core.downloader import DownloadQueue, MetadataPrefetch
+from app.core.jobs import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT, JobState, Priority
+from app.core.manager import DEFAULT_MAX_WORKERS
+from app.core.journal import JobJournal, get_journal
+from app.core.playlist import looks_like_playlist
+from app.core.postprocess import AUDIO_MODE_LABELS
+from app.core.prefetch import looks_like_url, quality_labels
+from app.core.procpool import BACKENDS
+from app.core.ratelimit import get_limiter
+from app.core.remote import RemoteManager
 
 # ==========================================
 # MODULARS COMPONENTS
 # ==========================================
 
+DEFAULT_QUALITIES = ["Maximum Quality", "1080p", "720p", "480p"]
+
+
 class DownloadPage(QWidget):
     def __init__(self, title, placeholder, is_video=True):
         super().__init__()
@@ -51,6 +59,20 @@ class DownloadPage(QWidget):
         self.input_line = QLineEdit()
         self.input_line.setPlaceholderText(placeholder)
         self.input_line.setFixedWidth(450)
+
+        # al pegar una URL se extrae la info en segundo plano: el clic en Download la encuentra en caché
+        self.prefetch = MetadataPrefetch(parent=self)
+        self.prefetch.ready.connect(self._on_metadata)
+        self.input_line.textChanged.connect(self._on_url_changed)
+
+        # política de salida de audio: solo se recodifica si el códec no coincide
+        self.format_box = None
+        if not is_video:
+            self.format_box = QComboBox()
+            self.format_box.addItems(list(AUDIO_FORMATS))
+            self.format_box.setCurrentText(DEFAULT_AUDIO_FORMAT)
+            self.format_box.setToolTip("original keeps the source codec; m4a/opus are copied without re-encoding when the source already matches")
+            self.format_box.setFixedWidth(150)
         
         self.btn_action = QPushButton("Download")
         self.btn_action.setObjectName("btn_download")
@@ -60,6 +82,11 @@ class DownloadPage(QWidget):
         self.btn_action.setFixedWidth(150)
         self.btn_action.setFixedHeight(40)
         self.btn_action.clicked.connect(self.handle_download)
+
+        self.btn_cancel = QPushButton("Cancel")
+        self.btn_cancel.setFixedWidth(150)
+        self.btn_cancel.setVisible(False)
+        self.btn_cancel.clicked.connect(self.handle_cancel)
         
         self.status_label = QLabel("")
         self.status_label.setAlignment(Qt.AlignCenter)
@@ -70,8 +97,12 @@ class DownloadPage(QWidget):
         layout.addWidget(self.logo_label, alignment=Qt.AlignCenter)
         layout.addSpacing(20)
         layout.addWidget(self.input_line)
+        if self.format_box is not None:
+            layout.addSpacing(10)
+            layout.addWidget(self.format_box, alignment=Qt.AlignCenter)
         layout.addSpacing(30)
         layout.addWidget(self.btn_action, alignment=Qt.AlignCenter)
+        layout.addWidget(self.btn_cancel, alignment=Qt.AlignCenter)
         layout.addStretch()
         
     def handle_download(self):
@@ -82,10 +113,11 @@ class DownloadPage(QWidget):
             download_dir = parent.dir_input.text()
         if not download_dir:
             download_dir = str(default_download_dir())
+        audio_format = self.format_box.currentText() if self.format_box is not None else DEFAULT_AUDIO_FORMAT
         try:
             mw = self.window()
             if hasattr(mw, 'start_download'):
-                mw.start_download(url=url, is_video=self.is_video, quality=getattr(parent, 'quality_box', None) and parent.quality_box.currentText() or None, download_dir=download_dir)
+                mw.start_download(url=url, is_video=self.is_video, quality=getattr(parent, 'quality_box', None) and parent.quality_box.currentText() or None, download_dir=download_dir, audio_format=audio_format)
             else:
                 self.btn_action.setText("Downloading...")
                 self.status_label.setText("")
@@ -94,7 +126,7 @@ class DownloadPage(QWidget):
                 if self.is_video:
                     success = download_video(url, quality=None, download_dir=download_dir)
                 else:
-                    success = download_audio(url, download_dir=download_dir)
+                    success = download_audio(url, download_dir=download_dir, audio_format=audio_format)
                 if success:
                     carpeta = download_dir if download_dir else str(default_download_dir())
                     self.status_label.setText(f"Downloaded in {carpeta}")
@@ -105,18 +137,66 @@ class DownloadPage(QWidget):
             self.status_label.setText(f"Error: {e}")
             self.btn_action.setText("Download")
 
+    def _on_url_changed(self, text: str):
+        mw = self.window()
+        if looks_like_url(text):
+            self.prefetch.request(text)
+        else:
+            self.prefetch.cancel()
+        if self.is_video and hasattr(mw, 'set_available_qualities'):
+            mw.set_available_qualities(None)
+
+    def _on_metadata(self, url: str, summary):
+        if url != self.input_line.text().strip():
+            return
+        text = summary.get("title") or url
+        if summary.get("duration"):
+            minutes, seconds = divmod(int(summary["duration"]), 60)
+            hours, minutes = divmod(minutes, 60)
+            text += f" ({hours}:{minutes:02d}:{seconds:02d})" if hours else f" ({minutes}:{seconds:02d})"
+        self.status_label.setText(text)
+        mw = self.window()
+        if self.is_video and summary.get("heights") and hasattr(mw, 'set_available_qualities'):
+            mw.set_available_qualities(summary["heights"])
+
+    def handle_cancel(self):
+        mw = self.window()
+        if hasattr(mw, 'cancel_downloads'):
+            mw.cancel_downloads(self)
+
 
         
 class MainWindow(QMainWindow):
-    def __init__(self):
+    """Ventana principal.
+
+    Con `daemon` (un `remote.DaemonClient`) la ventana se conecta a ese
+    demonio en vez de descargar por su cuenta: los trabajos, la
+    configuración de la barra lateral y la reanudación son suyos.
+    """
+
+    def __init__(self, daemon=None):
         super().__init__()
         self.setWindowTitle("VideoLeech")
         self.setWindowIcon(QIcon(PATHS["logo_application"]))
-        self.resize(700, 450)
-        self.init_ui()
+        self.resize(800, 600)
         self.settings = QSettings("VideoLeech", "VideoLeech")
+        max_workers = int(self.settings.value("max_workers", DEFAULT_MAX_WORKERS))
+        backend = str(self.settings.value("backend", "process"))
+        self.remote = RemoteManager(daemon) if daemon is not None else None
+        self.downloads = DownloadQueue(max_workers=max_workers, parent=self,
+                                       backend=backend if backend in BACKENDS else "process", manager=self.remote)
+        self.downloads.job_state.connect(self._on_job_state)
+        self.downloads.playlist_progress.connect(self._on_playlist_progress)
+        self.downloads.job_finished.connect(self._on_job_finished)
+        self._job_widgets = {}
+        # el demonio lleva su propio diario y reanuda sus trabajos al arrancar
+        self.journal = get_journal() if self.remote is None else None
+        if self.journal is not None:
+            self.journal.attach(self.downloads.manager)
+        self.init_ui()
         saved = self.settings.value("theme", "dark")
         self.apply_theme(saved)
+        QTimer.singleShot(0, self.offer_resume)
         
     def setup_style(self):
         self.setStyleSheet(f"""
@@ -347,12 +427,22 @@ class MainWindow(QMainWindow):
         self.content_stack = QStackedWidget()
         self.page_video = DownloadPage("MP4", "Paste the url of the video here...", is_video=True)
         self.page_music = DownloadPage("MP3", "Paste the url of the song here...", is_video=False)
+        self.page_music.format_box.setCurrentText(str(self.settings.value("audio_format", DEFAULT_AUDIO_FORMAT)))
+        self.page_music.format_box.currentTextChanged.connect(lambda value: self.settings.setValue("audio_format", value))
         self.content_stack.addWidget(self.page_video)
         self.content_stack.addWidget(self.page_music)
 
         layout_body.addWidget(left_rail)
         layout_body.addWidget(self.sidebar)
-        layout_body.addWidget(self.content_stack)
+        # la página arriba y la lista de descargas (todas las colas) debajo
+        self.downloads_panel = DownloadsPanel(self.downloads)
+        content_split = QSplitter(Qt.Vertical)
+        content_split.addWidget(self.content_stack)
+        content_split.addWidget(self.downloads_panel)
+        content_split.setStretchFactor(0, 3)
+        content_split.setStretchFactor(1, 2)
+        content_split.setChildrenCollapsible(False)
+        layout_body.addWidget(content_split)
 
         main_layout.addWidget(top_bar)
         main_layout.addWidget(menu_row)
@@ -382,12 +472,43 @@ class MainWindow(QMainWindow):
         lbl.setObjectName("SidebarTitle-Config")
         
         self.quality_box = QComboBox()
-        self.quality_box.addItems(["Maximum Quality", "1080p", "720p", "480p"])
-        
+        self.quality_box.addItems(DEFAULT_QUALITIES)
+
+        lbl_workers = QLabel("Parallel downloads")
+        self.workers_box = QSpinBox()
+        self.workers_box.setRange(1, 16)
+        self.workers_box.setValue(self.downloads.manager.max_workers)
+        self.workers_box.valueChanged.connect(self.set_max_workers)
+
+        lbl_rate = QLabel("Bandwidth limit (KiB/s, 0 = off)")
+        self.rate_box = QSpinBox()
+        self.rate_box.setRange(0, 1024 * 1024)
+        self.rate_box.setSingleStep(256)
+        if self.remote is None:
+            self.rate_box.setValue(int(self.settings.value("rate_limit_kib", 0)))
+            self.set_rate_limit(self.rate_box.value())
+        else:
+            self.rate_box.setValue((self.remote.settings.get("limit_rate") or 0) // 1024)
+        self.rate_box.valueChanged.connect(self.set_rate_limit)
 
+        # cada descarga en su propio proceso: la GUI no se congela y Cancel corta al momento
+        self.process_box = QCheckBox("Run downloads in separate processes")
+        self.process_box.setChecked(self.downloads.backend == "process")
+        self.process_box.toggled.connect(self.set_process_backend)
+        if self.remote is not None:
+            self.process_box.setEnabled(False)
+            self.process_box.setToolTip(f"Downloads run in the daemon at {self.remote.client.url}")
 
         layout.addWidget(lbl)
         layout.addWidget(self.quality_box)
+        layout.addSpacing(10)
+        layout.addWidget(lbl_workers)
+        layout.addWidget(self.workers_box)
+        layout.addSpacing(10)
+        layout.addWidget(lbl_rate)
+        layout.addWidget(self.rate_box)
+        layout.addSpacing(10)
+        layout.addWidget(self.process_box)
         layout.addSpacing(20)
         layout.addStretch()
     
@@ -396,48 +517,141 @@ class MainWindow(QMainWindow):
         if folder:
             self.dir_input.setText(folder)
 
-    def start_download(self, url: str, is_video: bool = True, quality: str | None = None, download_dir: str | None = None):
-        """Crear QThread y DownloadWorker para ejecutar la descarga en background."""
+    def set_max_workers(self, value: int):
+        self.downloads.set_max_workers(value)
+        if self.remote is not None:
+            return
+        try:
+            self.settings.setValue("max_workers", value)
+        except Exception:
+            pass
+
+    def set_rate_limit(self, kib: int):
+        """Tope global de ancho de banda para todas las descargas en curso."""
+        if self.remote is not None:
+            self.remote.set_rate_limit(kib * 1024 if kib else None)
+            return
+        get_limiter().set_total(kib * 1024 if kib else None)
+        try:
+            self.settings.setValue("rate_limit_kib", kib)
+        except Exception:
+            pass
+
+    def set_available_qualities(self, heights):
+        """Rellenar `quality_box` con las alturas reales de la URL (None = opciones por defecto)."""
+        labels = quality_labels(heights) if heights else DEFAULT_QUALITIES
+        current = self.quality_box.currentText()
+        self.quality_box.clear()
+        self.quality_box.addItems(labels)
+        if current in labels:
+            self.quality_box.setCurrentText(current)
+
+    def set_process_backend(self, enabled: bool):
+        backend = "process" if enabled else "thread"
+        self.downloads.set_backend(backend)
+        try:
+            self.settings.setValue("backend", backend)
+        except Exception:
+            pass
+
+    def cancel_downloads(self, widget):
+        """Cancelar los trabajos de una página (los que están en curso solo con procesos)."""
+        for job_id, owner in list(self._job_widgets.items()):
+            if owner is widget:
+                self.downloads.cancel(job_id)
+
+    def start_download(self, url: str, is_video: bool = True, quality: str | None = None, download_dir: str | None = None,
+                       audio_format: str = DEFAULT_AUDIO_FORMAT):
+        """Encolar la descarga en el DownloadQueue compartido."""
         if not url:
             widget = self.content_stack.currentWidget()
             widget.status_label.setText("Please provide a URL")
             return
 
         widget = self.content_stack.currentWidget()
-        try:
-            widget.btn_action.setText("Downloading...")
-        except Exception:
-            pass
 
         if not download_dir:
             download_dir = str(default_download_dir())
 
-        thread = QThread()
-        worker = DownloadWorker(url=url, is_video=is_video, quality=quality, download_dir=download_dir)
-        worker.moveToThread(thread)
+        if looks_like_playlist(url):
+            # las entradas de una playlist no adelantan a lo que el usuario pega después
+            self.downloads.submit_playlist(url=url, is_video=is_video, quality=quality, download_dir=download_dir,
+                                           audio_format=audio_format, priority=Priority.BATCH)
+            widget.status_label.setText("Reading playlist...")
+            return
 
-        thread.started.connect(worker.run)
-        worker.progress.connect(lambda msg: widget.status_label.setText(msg))
+        job_id = self.downloads.submit(url=url, is_video=is_video, quality=quality, download_dir=download_dir,
+                                       audio_format=audio_format, priority=Priority.INTERACTIVE)
+        self._job_widgets[job_id] = widget
+        widget.status_label.setText("Queued")
+        self._update_action_text(widget)
 
-        def _on_finished_ui(success: bool):
-            try:
-                widget.btn_action.setText("Download")
-            except Exception:
-                pass
-            if success:
-                widget.status_label.setText("Download completed")
-            else:
-                widget.status_label.setText("Download failed")
+    def _on_job_state(self, job_id: str, state: str):
+        # trabajos creados fuera de start_download (entradas de playlist)
+        if job_id in self._job_widgets or state in JobState.FINAL:
+            return
+        job = self.downloads.manager.get(job_id)
+        if job is None:
+            return
+        widget = self.page_video if job.is_video else self.page_music
+        self._job_widgets[job_id] = widget
+        self._update_action_text(widget)
 
-        worker.finished.connect(_on_finished_ui)
-        worker.finished.connect(thread.quit)
-        worker.finished.connect(worker.deleteLater)
-        thread.finished.connect(thread.deleteLater)
+    def _on_playlist_progress(self, playlist_id: str, status):
+        widget = self.content_stack.currentWidget()
+        if status.get("error"):
+            widget.status_label.setText(f"Playlist error: {status['error']}")
+        elif status.get("done"):
+            widget.status_label.setText(f"Playlist: {status['queued']} item(s) queued")
+
+    def offer_resume(self):
+        """Ofrecer reanudar los trabajos que quedaron sin terminar en el diario."""
+        if self.journal is None:
+            return
+        unfinished = self.journal.unfinished()
+        if not unfinished:
+            return
+        answer = QMessageBox.question(
+            self, "Resume downloads",
+            f"{len(unfinished)} download(s) did not finish last time. Resume them?",
+        )
+        if answer != QMessageBox.Yes:
+            self.journal.discard(rec["id"] for rec in unfinished)
+            return
+        for rec in unfinished:
+            job = JobJournal.job_from_record(rec)
+            widget = self.page_video if job.is_video else self.page_music
+            self._job_widgets[self.downloads.submit_job(job)] = widget
+            widget.status_label.setText("Resuming...")
+            self._update_action_text(widget)
+
+    def _update_action_text(self, widget):
+        active = sum(1 for w in self._job_widgets.values() if w is widget)
+        try:
+            widget.btn_action.setText(f"Downloading ({active})..." if active else "Download")
+            widget.btn_cancel.setVisible(bool(active))
+        except Exception:
+            pass
 
-        self._dl_thread = thread
-        self._dl_worker = worker
+    def _on_job_finished(self, job_id: str, success: bool):
+        widget = self._job_widgets.pop(job_id, None)
+        if widget is None:
+            return
+        job = self.downloads.manager.get(job_id)
+        if success and job is not None and job.audio_mode:
+            widget.status_label.setText(f"Download completed ({AUDIO_MODE_LABELS.get(job.audio_mode, job.audio_mode)})")
+        elif success:
+            widget.status_label.setText("Download completed")
+        elif job is not None and job.state == JobState.CANCELLED:
+            widget.status_label.setText("Download cancelled")
+        else:
+            widget.status_label.setText("Download failed")
+        self._update_action_text(widget)
 
-        thread.start()
+    def closeEvent(self, event):
+        self.downloads_panel.shutdown()
+        self.downloads.shutdown()
+        super().closeEvent(event)
     
     def switch_page(self, index):
         self.content_stack.setCurrentIndex(index)
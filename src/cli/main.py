@@ -1,32 +1,477 @@
-from yt_dlp import YoutubeDL
+import argparse
+import asyncio
+import json
+import os
+import signal
 import sys
+import threading
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from app.core.archive import get_archive
+from app.core.autotune import get_autotuner
+from app.core.cache import get_info_cache
+from app.core.daemon import DEFAULT_HOST, DEFAULT_PORT, DaemonServer
+from app.core.engine import DownloadEngine, JobSourceError
+from app.core.jobs import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT, DownloadJob, JobState, Priority
+from app.core.journal import JobJournal, get_journal
+from app.core.manager import DEFAULT_MAX_WORKERS, KEEP_FINISHED, DownloadManager
+from app.core.metrics import get_metrics
+from app.core.procpool import BACKENDS, make_runner
+from app.core.playlist import iter_playlist_jobs, looks_like_playlist
+from app.core.ratelimit import get_limiter, parse_rate
+from app.core.remote import TOKEN_ENV
+from app.core.scheduler import DEFAULT_HOST_LIMIT
+from app.core.segmented import DEFAULT_SEGMENTS
+from app.core.workqueue import DEFAULT_LEASE, QueueWorker, open_queue
 
-def download_video(video_url):
+DEFAULT_URL = "https://www.youtube.com/watch?v=dYdEa1ejIUc"
+
+# ajustes de la CLI sobre las opciones comunes (formato, reintentos, etc. en jobs.build_ydl_opts)
+CLI_OPTS = {
+    'segments': DEFAULT_SEGMENTS,
+    'outtmpl': '%(title)s.%(ext)s',
+    'quiet': False,
+    'no_warnings': False
+}
+
+# topes de trabajos simultáneos por dominio/extractor (ver app.core.scheduler)
+SCHEDULE = {"host_limit": DEFAULT_HOST_LIMIT, "limits": {}}
+
+# las líneas JSON salen del bucle y del hilo que expande playlists
+_OUT_LOCK = threading.Lock()
+
+def job_kwargs(audio_format=None, **overrides):
+    """Argumentos de `DownloadJob` para la CLI; con `audio_format`, solo audio."""
+    options = dict(CLI_OPTS, **overrides)
+    if audio_format is None:
+        return {"options": options}
+    return {"options": options, "is_video": False, "audio_format": audio_format}
+
+def new_engine(jobs=DEFAULT_MAX_WORKERS, backend="thread", keep_finished=None):
+    """Motor cuyos trabajos quedan en el diario para poder reanudarlos."""
+    engine = DownloadEngine(max_workers=jobs, runner=make_runner(backend), keep_finished=keep_finished, **SCHEDULE)
+    journal = get_journal()
+    if journal is not None:
+        journal.attach(engine.manager)
+    return engine
+
+def download_video(video_url, engine=None, use_cache=True, use_archive=True, rate_limit=None, audio_format=None):
     """v0.0 - VideoLeech, El mejor descargador de video OpenSoruce"""
-    
-    opts = {
-        'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-        'outtmpl': '%(title)s.%(ext)s',
-        'merge_output_format': 'mp4',
-        'quiet': False,
-        'javascript_helper': 'node',
-        'no_warnings': False
-    }
-    
-    try:
-        with YoutubeDL(opts) as yt:
-            print(f"Descargando: {video_url}")
-            info = yt.extract_info(video_url, download=True)
-            print(f"✓ Descargado con exito: {info['title']}.{info['ext']}")
+    own_engine = engine is None
+    if own_engine:
+        engine = new_engine(jobs=1)
+
+    print(f"Descargando: {video_url}")
+    job = engine.run(DownloadJob(url=video_url, use_cache=use_cache, use_archive=use_archive, rate_limit=rate_limit,
+                                 **job_kwargs(audio_format)))
+    if own_engine:
+        engine.close()
+
+    if job.state == JobState.DONE:
+        info = job.info or {}
+        if job.skipped:
+            print(f"= Ya descargado: {info.get('filepath')}")
             return True
-    except Exception as e:
-        print(f"x Error al descargar: {e}")
-        return False
+        print(f"✓ Descargado con exito: {info.get('title')}.{info.get('ext')}" + (f" [{job.audio_mode}]" if job.audio_mode else ""))
+        return True
+    print(f"x Error al descargar: {job.error}")
+    return False
+
+def read_urls(source):
+    """Leer URLs de un fichero (o '-' para stdin), ignorando vacías y comentarios."""
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_batch(urls, jobs=DEFAULT_MAX_WORKERS, out=sys.stdout, use_cache=True, use_archive=True, rate_limit=None,
+              audio_format=None, autotune=False):
+    """Descargar muchas URLs en un solo proceso con un pool de `jobs` hilos.
+
+    Escribe una línea JSON por URL en cuanto termina y devuelve el número
+    de fallos. yt_dlp y sus extractores se cargan una única vez.
+    """
+    unexpanded = []
+
+    def _jobs():
+        for url in urls:
+            # yt_dlp escribe su salida por stdout: mantener stdout solo para JSON
+            kwargs = job_kwargs(audio_format, quiet=True, noprogress=True)
+            kwargs.update(use_cache=use_cache, use_archive=use_archive, rate_limit=rate_limit)
+            if not looks_like_playlist(url):
+                yield DownloadJob(url=url, **kwargs)
+                continue
+            try:
+                # las entradas se encolan según se resuelven las páginas
+                yield from iter_playlist_jobs(url, **kwargs)
+            except Exception as exc:
+                # una playlist que no se puede expandir no para el resto del lote
+                unexpanded.append(url)
+                write_record(out, failed_record(url, exc))
+
+    return run_jobs(_jobs(), jobs=jobs, out=out, autotune=autotune, unexpanded=unexpanded)
+
+def failed_record(url, error):
+    """Línea JSON de una URL que falló antes de ser un trabajo (p. ej. al expandir su playlist)."""
+    return {"url": url, "status": JobState.FAILED, "title": None, "file": None, "digest": None, "skipped": False,
+            "audio": None, "error": str(error), "elapsed": 0.0, "timings": {}}
+
+def write_record(out, record):
+    with _OUT_LOCK:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+def run_jobs(download_jobs, jobs=DEFAULT_MAX_WORKERS, out=sys.stdout, autotune=False, unexpanded=()):
+    """Ejecutar `DownloadJob`s ya construidos; ver `run_batch`.
+
+    Con `autotune`, `jobs` es el máximo: se empieza con un trabajo y el
+    autotuner sube o baja según el caudal y los reintentos. `unexpanded`
+    son las URLs que fallaron antes de llegar a ser trabajos; cuentan como
+    fallos en el resumen.
+    """
+    engine = new_engine(1 if autotune else jobs)
+    manager = engine.manager
+    tuner = get_autotuner() if autotune else None
+    if tuner is not None:
+        tuner.add_listener(_print_decision)
+        tuner.attach(manager, 1, jobs)
+    source_failed = 0
+    try:
+        asyncio.run(_report_jobs(engine, download_jobs, out))
+    except JobSourceError as exc:
+        source_failed = 1
+        print(f"Stopped reading jobs: {exc.__cause__!r}", file=sys.stderr)
+    stages = manager.stats()
+    if tuner is not None:
+        tuner.detach()
+        tuner.remove_listener(_print_decision)
+    engine.close()
+
+    jobs_done = manager.jobs()
+    failed = sum(1 for job in jobs_done if job.state != JobState.DONE) + len(unexpanded) + source_failed
+    skipped = sum(1 for job in jobs_done if job.skipped)
+    total = len(jobs_done) + len(unexpanded) + source_failed
+    summary = {"total": total, "ok": total - failed, "skipped": skipped, "failed": failed}
+    print(json.dumps({"summary": summary, "stages": stages}), file=sys.stderr)
+    return failed
+
+async def _report_jobs(engine, download_jobs, out):
+    """Enviar los trabajos y escribir una línea JSON por cada uno en cuanto termina."""
+    async def _report(handle):
+        job = await handle
+        info = job.info or {}
+        record = {
+            "url": job.url,
+            "status": job.state,
+            "title": info.get("title"),
+            "file": info.get("filepath") or info.get("_filename"),
+            "digest": info.get("digest"),
+            "skipped": job.skipped,
+            "audio": job.audio_mode,
+            "error": job.error,
+            "elapsed": round(handle.elapsed, 3),
+            "timings": {stage: round(secs, 3) for stage, secs in job.timings.items()},
+        }
+        write_record(out, record)
+
+    reports = []
+    try:
+        async for handle in engine.submit_many(download_jobs):
+            reports.append(asyncio.create_task(_report(handle)))
+    finally:
+        # lo ya enviado termina y se informa aunque el origen de trabajos falle
+        await asyncio.gather(*reports)
+        await engine.wait()
+
+def _print_decision(decision):
+    print(json.dumps({"autotune": decision}), file=sys.stderr, flush=True)
+
+def parse_limit(text):
+    key, sep, value = text.partition("=")
+    if not sep or not key.strip() or not value.strip().isdigit():
+        raise argparse.ArgumentTypeError(f"expected SITE=N, got {text!r}")
+    return key.strip(), int(value)
+
+def add_checksum_args(parser):
+    parser.add_argument("--no-checksum", action="store_true", help="do not hash files while they are written")
+    parser.add_argument("--checksum-file", action="store_true",
+                        help="write FILE.sha256 (or .blake3) next to each download, checkable with sha256sum -c")
+    parser.add_argument("--dedup-store", metavar="DIR", help="content-addressed store: identical downloads become "
+                        "hardlinks to one copy (DIR must be on the same file system)")
+
+def checksum_options(args) -> dict:
+    """Opciones de huella de `add_checksum_args` (ver app.core.integrity)."""
+    options = {}
+    if args.no_checksum:
+        options["checksum"] = None
+    if args.checksum_file:
+        options["checksum_sidecar"] = True
+    if args.dedup_store:
+        options["dedup_store"] = str(Path(args.dedup_store).expanduser().resolve())
+    return options
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="videoleech", description="VideoLeech command line downloader")
+    parser.add_argument("url", nargs="?", help="URL to download")
+    parser.add_argument("-b", "--batch", metavar="FILE", help="read URLs from FILE, one per line ('-' for stdin)")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_MAX_WORKERS, help="parallel downloads in batch mode")
+    parser.add_argument("-x", "--audio", action="store_true", help="download audio only (see --audio-format)")
+    parser.add_argument("--audio-format", choices=list(AUDIO_FORMATS), help="audio output: 'original' keeps the source codec; "
+                        "m4a/opus/mp3 are stream-copied when the source already matches (implies --audio, default mp3)")
+    parser.add_argument("--segments", type=int, metavar="N", help="connections per progressive file (1 disables segmented downloads)")
+    parser.add_argument("--fragments", type=int, metavar="N",
+                        help="parallel fragments per HLS/DASH download (default: tuned per site)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="tune parallel downloads between 1 and --jobs from throughput and retries")
+    parser.add_argument("--limit-rate", type=parse_rate, metavar="RATE", help="total bandwidth for all downloads, e.g. 5M or 500K")
+    parser.add_argument("--job-limit-rate", type=parse_rate, metavar="RATE", help="bandwidth cap for each download")
+    parser.add_argument("--per-host", type=int, metavar="N", help=f"parallel downloads per site (default {DEFAULT_HOST_LIMIT}, 0 = no limit)")
+    parser.add_argument("--limit", action="append", type=parse_limit, default=[], metavar="SITE=N",
+                        help="parallel downloads for one domain (youtube.com=2) or extractor (Youtube=2); repeatable")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the metadata cache")
+    parser.add_argument("--cache-ttl", type=float, metavar="SECONDS", help="lifetime of cached metadata")
+    parser.add_argument("--cache-size", type=int, metavar="MB", help="maximum size of the metadata cache")
+    parser.add_argument("--no-archive", action="store_true", help="download again even if the archive has the item")
+    parser.add_argument("--resume", action="store_true", help="resume unfinished jobs from previous runs")
+    parser.add_argument("--metrics-jsonl", metavar="FILE", help="append per-job phase timings and, at exit, all metrics as JSON lines")
+    parser.add_argument("--metrics-prom", metavar="FILE", help="write metrics in Prometheus text format at exit")
+    parser.add_argument("--rebuild-archive", metavar="DIR", help="rebuild the download archive by scanning DIR and exit")
+    add_checksum_args(parser)
+    return parser.parse_args(argv)
+
+def parse_serve_args(argv):
+    parser = argparse.ArgumentParser(prog="videoleech serve",
+                                     description="Run the download daemon with a local HTTP/JSON API")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default {DEFAULT_PORT}, 0 = any free port)")
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"require 'Authorization: Bearer TOKEN' (default ${TOKEN_ENV}; mandatory outside localhost)")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_MAX_WORKERS, help="parallel downloads")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="process",
+                        help="run each download in its own process (default; can be cancelled while running) or in a worker thread")
+    parser.add_argument("--limit-rate", type=parse_rate, metavar="RATE", help="total bandwidth for all downloads, e.g. 5M or 500K")
+    parser.add_argument("--per-host", type=int, metavar="N", help=f"parallel downloads per site (default {DEFAULT_HOST_LIMIT}, 0 = no limit)")
+    parser.add_argument("--limit", action="append", type=parse_limit, default=[], metavar="SITE=N",
+                        help="parallel downloads for one domain (youtube.com=2) or extractor (Youtube=2); repeatable")
+    parser.add_argument("--no-resume", action="store_true", help="do not resume unfinished jobs from previous runs")
+    return parser.parse_args(argv)
+
+def serve(args):
+    """`videoleech serve`: un demonio con un único motor para todos los clientes (ver app.core.daemon)."""
+    if args.per_host is not None:
+        SCHEDULE["host_limit"] = args.per_host
+    SCHEDULE["limits"] = dict(args.limit)
+    get_limiter().set_total(args.limit_rate)
+    engine = new_engine(jobs=args.jobs, backend=args.backend, keep_finished=KEEP_FINISHED)
+    try:
+        server = DaemonServer(engine, host=args.host, port=args.port, token=args.token)
+    except ValueError as exc:
+        print(f"videoleech serve: {exc}", file=sys.stderr)
+        return 2
+    journal = get_journal()
+    if journal is not None and not args.no_resume:
+        resumed = server.resume(journal)
+        if resumed:
+            print(f"Resuming {resumed} unfinished job(s)", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever())
+    except OSError as exc:
+        print(f"videoleech serve: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        # sin esperar: lo que quede a medias lo reanuda el próximo arranque
+        engine.close(wait=False)
+    return 0
+
+def parse_worker_args(argv):
+    parser = argparse.ArgumentParser(prog="videoleech worker",
+                                     description="Download jobs from a shared job queue (see 'videoleech queue')")
+    parser.add_argument("--queue", metavar="PATH", help="queue database (default $VIDEOLEECH_QUEUE or the data folder); "
+                        "put it on a shared volume to spread work over several machines")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_MAX_WORKERS, help="parallel downloads in this worker")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE, metavar="SECONDS",
+                        help=f"lease length; jobs of a worker that stops renewing return to the queue (default {DEFAULT_LEASE:g})")
+    parser.add_argument("--name", help="worker name shown in the queue (default host:pid)")
+    parser.add_argument("--drain", action="store_true", help="exit when the queue has no queued or running jobs left")
+    parser.add_argument("--limit-rate", type=parse_rate, metavar="RATE", help="total bandwidth for this worker, e.g. 5M or 500K")
+    parser.add_argument("--per-host", type=int, metavar="N", help=f"parallel downloads per site (default {DEFAULT_HOST_LIMIT}, 0 = no limit)")
+    parser.add_argument("--limit", action="append", type=parse_limit, default=[], metavar="SITE=N",
+                        help="parallel downloads for one domain (youtube.com=2) or extractor (Youtube=2); repeatable")
+    return parser.parse_args(argv)
+
+def worker(args):
+    """`videoleech worker`: reclamar trabajos de la cola compartida hasta SIGTERM (o vaciarla con --drain)."""
+    if args.per_host is not None:
+        SCHEDULE["host_limit"] = args.per_host
+    SCHEDULE["limits"] = dict(args.limit)
+    get_limiter().set_total(args.limit_rate)
+    queue = open_queue(args.queue)
+    # sin diario: la cola ya guarda los trabajos y los reparte si este proceso muere.
+    # Siempre en procesos: un trabajo cuyo arrendamiento se pierde tiene que poder pararse
+    manager = DownloadManager(max_workers=args.jobs, runner=make_runner("process"), keep_finished=KEEP_FINISHED, **SCHEDULE)
+    results = {"total": 0, "ok": 0, "skipped": 0, "failed": 0, "rejected": 0}
+    # `_report` se llama desde los hilos del gestor
+    results_lock = threading.Lock()
+
+    def _report(lease, accepted):
+        job = lease.job
+        info = job.info or {}
+        record = {
+            "id": job.id,
+            "url": job.url,
+            "status": job.state,
+            "title": info.get("title"),
+            "file": info.get("filepath") or info.get("_filename"),
+            "digest": info.get("digest"),
+            "skipped": job.skipped,
+            "error": job.error,
+            "attempt": lease.attempts,
+            "accepted": accepted,
+            "elapsed": round(time.time() - lease.claimed, 3),
+            "timings": {stage: round(secs, 3) for stage, secs in job.timings.items()},
+        }
+        with results_lock:
+            results["total"] += 1
+            results["ok" if job.state == JobState.DONE else "failed"] += 1
+            results["skipped"] += job.skipped
+            results["rejected"] += not accepted
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    runner = QueueWorker(queue, manager, name=args.name, lease=args.lease, on_finished=_report)
+    signal.signal(signal.SIGTERM, lambda *_: runner.stop())
+    print(f"Worker {runner.name} on {getattr(queue, 'path', args.queue)}", file=sys.stderr, flush=True)
+    try:
+        runner.run(drain=args.drain)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.shutdown(wait=False)
+        print(json.dumps({"summary": results, "queue": queue.counts()}), file=sys.stderr)
+        queue.close()
+    return 1 if results["failed"] else 0
+
+def parse_queue_args(argv):
+    parser = argparse.ArgumentParser(prog="videoleech queue", description="Add jobs to the shared job queue or show its state")
+    parser.add_argument("--queue", metavar="PATH", help="queue database (default $VIDEOLEECH_QUEUE or the data folder)")
+    actions = parser.add_subparsers(dest="action", required=True)
+    add = actions.add_parser("add", help="queue URLs; playlists are expanded into their entries")
+    add.add_argument("urls", nargs="*", metavar="URL")
+    add.add_argument("-b", "--batch", metavar="FILE", help="read URLs from FILE, one per line ('-' for stdin)")
+    add.add_argument("-o", "--download-dir", help="folder the workers save into (default: each worker's current folder)")
+    add.add_argument("-x", "--audio", action="store_true", help="download audio only (see --audio-format)")
+    add.add_argument("--audio-format", choices=list(AUDIO_FORMATS), help="audio output (implies --audio, default mp3)")
+    add.add_argument("--priority", type=int, default=Priority.BATCH, help="higher runs first (default: batch priority)")
+    add.add_argument("--no-archive", action="store_true", help="download again even if the archive has the item")
+    add_checksum_args(add)
+    actions.add_parser("status", help="print the number of jobs in each state as JSON")
+    return parser.parse_args(argv)
+
+def queue_command(args):
+    queue = open_queue(args.queue)
+    try:
+        if args.action == "status":
+            print(json.dumps(queue.counts()))
+            return 0
+        urls = list(args.urls) + (list(read_urls(args.batch)) if args.batch else [])
+        if not urls:
+            print("videoleech queue add: no URLs given", file=sys.stderr)
+            return 2
+        audio_format = args.audio_format or (DEFAULT_AUDIO_FORMAT if args.audio else None)
+        kwargs = job_kwargs(audio_format, quiet=True, noprogress=True, **checksum_options(args))
+        kwargs.update(use_archive=not args.no_archive, priority=args.priority)
+        if args.download_dir:
+            # la plantilla de la CLI es relativa a la carpeta actual del worker
+            kwargs["options"].pop("outtmpl", None)
+            kwargs["download_dir"] = str(Path(args.download_dir).resolve())
+        added = failed = 0
+        for url in urls:
+            jobs = iter_playlist_jobs(url, **kwargs) if looks_like_playlist(url) else [DownloadJob(url=url, **kwargs)]
+            try:
+                for job in jobs:
+                    added += queue.put(job)
+            except Exception as exc:
+                # las entradas ya añadidas se quedan; se sigue con la siguiente URL
+                failed += 1
+                print(json.dumps(failed_record(url, exc), ensure_ascii=False), file=sys.stderr)
+        print(json.dumps({"added": added, "failed": failed, "queue": queue.counts()}))
+        return 1 if failed else 0
+    finally:
+        queue.close()
+
+def configure_cache(args):
+    cache = get_info_cache() if not args.no_cache else None
+    if cache is None:
+        return
+    if args.cache_ttl is not None:
+        cache.ttl = args.cache_ttl
+    if args.cache_size is not None:
+        cache.max_bytes = args.cache_size * 1024 * 1024
+
+def export_metrics(args):
+    metrics = get_metrics()
+    if args.metrics_jsonl:
+        metrics.write_jsonl(args.metrics_jsonl)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["serve"]:
+        return serve(parse_serve_args(argv[1:]))
+    if argv[:1] == ["worker"]:
+        return worker(parse_worker_args(argv[1:]))
+    if argv[:1] == ["queue"]:
+        return queue_command(parse_queue_args(argv[1:]))
+    args = parse_args(argv)
+    if args.metrics_jsonl:
+        get_metrics().job_log = Path(args.metrics_jsonl)
+    try:
+        return run(args)
+    finally:
+        export_metrics(args)
+
+def run(args):
+    if args.rebuild_archive:
+        archive = get_archive()
+        if archive is None:
+            return 1
+        added = archive.rebuild(args.rebuild_archive)
+        print(f"Archive: {added} items indexed from {args.rebuild_archive} ({len(archive)} total)")
+        return 0
+    configure_cache(args)
+    CLI_OPTS.update(checksum_options(args))
+    if args.segments is not None:
+        CLI_OPTS['segments'] = args.segments
+    if args.fragments is not None:
+        # nivel fijo: sin ajuste automático de fragmentos (ver app.core.autotune)
+        CLI_OPTS['concurrent_fragment_downloads'] = args.fragments
+    if args.per_host is not None:
+        SCHEDULE["host_limit"] = args.per_host
+    SCHEDULE["limits"] = dict(args.limit)
+    get_limiter().set_total(args.limit_rate)
+    flags = {"use_cache": not args.no_cache, "use_archive": not args.no_archive, "rate_limit": args.job_limit_rate}
+    if args.audio or args.audio_format:
+        flags["audio_format"] = args.audio_format or DEFAULT_AUDIO_FORMAT
+    journal = get_journal()
+    unfinished = journal.unfinished() if journal is not None else []
+    if args.resume:
+        print(f"Resuming {len(unfinished)} unfinished job(s)", file=sys.stderr)
+        failed = run_jobs((JobJournal.job_from_record(rec) for rec in unfinished), jobs=args.jobs,
+                          autotune=args.autotune)
+        return 1 if failed else 0
+    if unfinished:
+        print(f"{len(unfinished)} unfinished job(s) from a previous run; use --resume to continue them", file=sys.stderr)
+    if args.batch or looks_like_playlist(args.url or ""):
+        urls = read_urls(args.batch) if args.batch else [args.url]
+        failed = run_batch(urls, jobs=args.jobs, autotune=args.autotune, **flags)
+        return 1 if failed else 0
+    return 0 if download_video(args.url or DEFAULT_URL, **flags) else 1
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        video_url = sys.argv[1]
-    else:
-        video_url = "https://www.youtube.com/watch?v=dYdEa1ejIUc"
-    
-    download_video(video_url)
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,466 @@
+"""Benchmarks de los caminos de descarga contra un servidor de medios local.
+
+Arranca `MediaServer` (tests/media_server.py) y ejecuta cada escenario en un
+proceso propio, para que el pico de memoria y el tiempo de CPU sean solo suyos:
+
+- worker:    `DownloadWorker.run()` (Qt), una URL tras otra.
+- app_video: `app.main.download_video`.
+- app_audio: `app.main.download_audio` (necesita ffmpeg; el servidor sirve
+             entonces un m4a real generado con ffmpeg).
+- playlist:  `DownloadManager.submit_playlist` sobre un feed RSS del servidor.
+- cli_batch: `src/cli/main.py --batch -` con todas las URLs.
+- faults:    como cli_batch, pero el servidor responde 503 a las dos primeras
+             peticiones de la mitad de las URLs y 429 con `Retry-After` a una
+             de cada cuatro; con reintentos ninguna debería fallar.
+- autotune:  `--autotune` de la CLI sobre listas HLS, contra un servidor
+             propio con techo de ancho de banda (`--ceiling`) y de conexiones
+             (`--max-connections`); informa también de las decisiones.
+- queue:     `main.py queue add` y `--workers` procesos `main.py worker --drain`
+             sobre una cola SQLite; el primero se mata con SIGKILL al poco de
+             empezar y sus trabajos deben volver a la cola al vencer el
+             arrendamiento. Informa de los reintentos y de los duplicados.
+
+Por escenario se informa en JSON: MB/s, TTFB y sobrecoste por trabajo
+(tiempo del trabajo menos el de transferencia que ve el servidor), pico de
+RSS y CPU del proceso. Carpetas de caché, datos y descargas van a un
+directorio temporal, así que no se toca la configuración del usuario.
+
+    python tests/bench.py                       # todos los escenarios
+    python tests/bench.py -s worker -s cli_batch --count 16 --rate 2M
+    python tests/bench.py --out new.json --baseline old.json   # exit 1 si empeora
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(SRC))
+
+from media_server import MediaServer  # noqa: E402
+
+SCENARIOS = ("worker", "app_video", "app_audio", "playlist", "cli_batch", "faults", "autotune", "queue")
+# peticiones de menos bytes son sondeos (yt_dlp lee la cabecera al extraer)
+PROBE_BYTES = 64 * 1024
+# arrendamiento de los workers del escenario queue y cuándo se mata al primero
+QUEUE_LEASE = 3.0
+QUEUE_KILL_AFTER = 1.5
+# métricas comparadas con --baseline y si más es mejor
+COMPARED = {"mb_s": True, "ttfb_s.mean": False, "overhead_s.mean": False, "cpu_s": False, "peak_rss_mb": False}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower().rstrip("b").rstrip("i")
+    mult = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}.get(text[-1:], 1)
+    return int(float(text.rstrip("kmg")) * mult)
+
+
+# ---- lado hijo: ejecutar un escenario dentro de su propio proceso ---------
+def _child_worker(urls, workdir):
+    from app.core.downloader import DownloadWorker
+
+    jobs = []
+    for url in urls:
+        worker = DownloadWorker(url, download_dir=workdir)
+        result = []
+        worker.finished.connect(result.append)
+        start = time.monotonic()
+        worker.run()
+        jobs.append({"url": url, "start": start, "end": time.monotonic(), "ok": bool(result and result[0])})
+    return jobs
+
+
+def _child_app(func, urls, workdir):
+    jobs = []
+    for url in urls:
+        start = time.monotonic()
+        ok = func(url, download_dir=workdir)
+        jobs.append({"url": url, "start": start, "end": time.monotonic(), "ok": bool(ok)})
+    return jobs
+
+
+def _child_playlist(urls, workdir):
+    from app.core.jobs import JobState
+    from app.core.manager import DownloadManager
+
+    # todas las URLs son del mismo servidor local: sin tope por dominio
+    manager = DownloadManager(host_limit=0)
+    started = {}
+    jobs = []
+
+    def _on_event(job_id, event, payload):
+        if event != "state":
+            return
+        if payload == JobState.RUNNING:
+            started[job_id] = time.monotonic()
+        elif payload in JobState.FINAL:
+            job = manager.get(job_id)
+            jobs.append({"url": job.url, "start": started.get(job_id), "end": time.monotonic(),
+                         "ok": payload == JobState.DONE})
+
+    manager.add_listener(_on_event)
+    manager.submit_playlist(urls[0], download_dir=workdir, use_archive=False, use_cache=False)
+    manager.wait()
+    manager.shutdown()
+    return jobs
+
+
+def run_child(args) -> int:
+    urls = json.loads(Path(args.urls).read_text())
+    workdir = args.workdir
+    result: dict = {}
+    try:
+        if args.child == "worker":
+            result["jobs"] = _child_worker(urls, workdir)
+        elif args.child == "app_video":
+            from app.main import download_video
+            result["jobs"] = _child_app(download_video, urls, workdir)
+        elif args.child == "app_audio":
+            from app.main import download_audio
+            result["jobs"] = _child_app(download_audio, urls, workdir)
+        elif args.child == "playlist":
+            result["jobs"] = _child_playlist(urls, workdir)
+    except ImportError as exc:
+        result = {"skipped": f"{exc.name or exc} not installed"}
+    Path(args.result).write_text(json.dumps(result))
+    return 0
+
+
+# ---- lado padre ----------------------------------------------------------
+def _wait(proc: subprocess.Popen) -> dict | None:
+    """Esperar al hijo y devolver su uso de recursos (solo Unix)."""
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {"cpu_s": round(usage.ru_utime + usage.ru_stime, 3), "peak_rss_mb": round(rss, 1)}
+
+
+def _child_env(workdir: Path) -> dict:
+    home = workdir / "home"
+    home.mkdir(exist_ok=True)
+    env = dict(os.environ, HOME=str(home), XDG_CACHE_HOME=str(home / "cache"), XDG_DATA_HOME=str(home / "data"),
+               LOCALAPPDATA=str(home / "local"), APPDATA=str(home / "roaming"), QT_QPA_PLATFORM="offscreen")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    return env
+
+
+def _spawn_child(name: str, urls: list[str], workdir: Path) -> tuple[dict, dict | None, float]:
+    urls_file = workdir / "urls.json"
+    result_file = workdir / "result.json"
+    urls_file.write_text(json.dumps(urls))
+    cmd = [sys.executable, __file__, "--child", name, "--urls", str(urls_file), "--result", str(result_file),
+           "--workdir", str(workdir / "downloads")]
+    began = time.monotonic()
+    with open(workdir / "output.log", "wb") as log:
+        proc = subprocess.Popen(cmd, env=_child_env(workdir), stdout=log, stderr=subprocess.STDOUT)
+        usage = _wait(proc)
+    elapsed = time.monotonic() - began
+    if proc.returncode != 0 or not result_file.exists():
+        tail = (workdir / "output.log").read_text(errors="replace")[-2000:]
+        return {"error": f"exit code {proc.returncode}", "log": tail}, usage, elapsed
+    return json.loads(result_file.read_text()), usage, elapsed
+
+
+def _spawn_cli(urls: list[str], workdir: Path, concurrency: int, extra=()) -> tuple[dict, dict | None, float]:
+    cmd = [sys.executable, str(SRC / "cli" / "main.py"), "--batch", "-", "--jobs", str(concurrency),
+           "--no-archive", "--no-cache", "--per-host", "0", *extra]
+    (workdir / "downloads").mkdir(exist_ok=True)
+    jobs = []
+    began = time.monotonic()
+    with open(workdir / "stderr.log", "wb") as err:
+        proc = subprocess.Popen(cmd, env=_child_env(workdir), cwd=workdir / "downloads",
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=err, text=True)
+        proc.stdin.write("\n".join(urls) + "\n")
+        proc.stdin.close()
+        for line in proc.stdout:
+            end = time.monotonic()
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            # la CLI informa la duración del trabajo; el inicio se deduce
+            jobs.append({"url": rec["url"], "start": end - (rec.get("elapsed") or 0), "end": end,
+                         "ok": rec.get("status") == "done"})
+        usage = _wait(proc)
+    return {"jobs": jobs}, usage, time.monotonic() - began
+
+
+def _spawn_queue(urls: list[str], workdir: Path, concurrency: int, workers: int) -> tuple[dict, dict | None, float]:
+    main = str(SRC / "cli" / "main.py")
+    queue = str(workdir / "queue.sqlite3")
+    downloads = workdir / "downloads"
+    downloads.mkdir(exist_ok=True)
+    env = _child_env(workdir)
+    subprocess.run([sys.executable, main, "queue", "--queue", queue, "add", "--batch", "-", "-o", str(downloads),
+                    "--no-archive"], input="\n".join(urls) + "\n", text=True, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    jobs, lock = [], threading.Lock()
+
+    def _read(proc):
+        for line in proc.stdout:
+            end = time.monotonic()
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            with lock:
+                jobs.append({"id": rec["id"], "url": rec["url"], "start": end - (rec.get("elapsed") or 0), "end": end,
+                             "ok": rec.get("status") == "done", "accepted": rec.get("accepted"),
+                             "attempt": rec.get("attempt")})
+
+    began = time.monotonic()
+    procs, readers = [], []
+    with open(workdir / "stderr.log", "wb") as err:
+        for i in range(workers):
+            cmd = [sys.executable, main, "worker", "--queue", queue, "--drain", "--jobs", str(concurrency),
+                   "--lease", str(QUEUE_LEASE), "--per-host", "0", "--name", f"w{i}"]
+            proc = subprocess.Popen(cmd, env=env, cwd=downloads, stdout=subprocess.PIPE, stderr=err, text=True)
+            procs.append(proc)
+            readers.append(threading.Thread(target=_read, args=(proc,), daemon=True))
+            readers[-1].start()
+        killed = False
+        if workers > 1:
+            time.sleep(QUEUE_KILL_AFTER)
+            killed = procs[0].poll() is None
+            procs[0].kill()
+        usages = [_wait(proc) for proc in procs]
+        for reader in readers:
+            reader.join()
+    elapsed = time.monotonic() - began
+    status = subprocess.run([sys.executable, main, "queue", "--queue", queue, "status"], env=env, text=True,
+                            capture_output=True)
+    accepted = [job["id"] for job in jobs if job["accepted"]]
+    usage = None
+    if all(usages):
+        usage = {"cpu_s": round(sum(u["cpu_s"] for u in usages), 3), "peak_rss_mb": max(u["peak_rss_mb"] for u in usages)}
+    return {
+        "jobs": [job for job in jobs if job["accepted"]],
+        "queue": json.loads(status.stdout or "{}"),
+        "workers": workers,
+        "killed": killed,
+        "recovered": sum(1 for job in jobs if job["accepted"] and (job["attempt"] or 1) > 1),
+        "rejected": len(jobs) - len(accepted),
+        "duplicates": len(accepted) - len(set(accepted)),
+    }, usage, elapsed
+
+
+def _autotune_decisions(workdir: Path) -> list[dict]:
+    decisions = []
+    for line in (workdir / "stderr.log").read_text(errors="replace").splitlines():
+        if line.startswith('{"autotune"'):
+            decisions.append(json.loads(line)["autotune"])
+    return decisions
+
+
+def _stats(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    return {"mean": round(statistics.mean(values), 4), "p50": round(statistics.median(values), 4),
+            "max": round(max(values), 4)}
+
+
+def summarize(result: dict, requests: list[dict], usage: dict | None, process_s: float) -> dict:
+    """Cruzar los tiempos de los trabajos con lo que vio el servidor."""
+    if "jobs" not in result:
+        return result
+    by_path: dict[str, list[dict]] = {}
+    for req in requests:
+        by_path.setdefault(req["path"], []).append(req)
+    jobs = [job for job in result["jobs"] if job.get("start") is not None]
+    ttfb, overhead = [], []
+    total_bytes = 0
+    for job in jobs:
+        path = urlsplit(job["url"]).path
+        reqs = by_path.get(path, [])
+        if path.endswith(".m3u8"):
+            # los fragmentos cuelgan de la ruta de la lista (ver MediaServer.hls_playlist)
+            prefix = path[:-len(".m3u8")] + "/"
+            reqs = reqs + [r for p, rs in by_path.items() if p.startswith(prefix) for r in rs]
+        reqs = [r for r in reqs if r["first_byte"] is not None]
+        total_bytes += sum(r["bytes"] for r in reqs)
+        if not reqs:
+            continue
+        ttfb.append(min(r["first_byte"] for r in reqs) - job["start"])
+        data = [r for r in reqs if r["bytes"] > PROBE_BYTES] or reqs
+        transfer = max(r["last_byte"] for r in data) - min(r["first_byte"] for r in data)
+        overhead.append(max(0.0, job["end"] - job["start"] - transfer))
+    wall = (max(j["end"] for j in jobs) - min(j["start"] for j in jobs)) if jobs else 0.0
+    summary = {
+        "jobs": len(result["jobs"]),
+        "failed": sum(1 for job in result["jobs"] if not job["ok"]),
+        "bytes": total_bytes,
+        "wall_s": round(wall, 3),
+        "process_s": round(process_s, 3),
+        "mb_s": round(total_bytes / wall / 1e6, 3) if wall else None,
+        "ttfb_s": _stats(ttfb),
+        "overhead_s": _stats(overhead),
+    }
+    summary.update(usage or {"cpu_s": None, "peak_rss_mb": None})
+    return summary
+
+
+def _make_audio_source(workdir: Path, seconds: int) -> Path | None:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return None
+    out = workdir / "source.m4a"
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                    "-c:a", "aac", "-b:a", "128k", str(out)], check=True)
+    return out
+
+
+def run_scenario(name: str, args, server: MediaServer, audio_server: MediaServer | None) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"vl-bench-{name}-") as tmp:
+        workdir = Path(tmp)
+        if name == "app_audio":
+            if audio_server is None:
+                return {"skipped": "ffmpeg not found"}
+            srv = audio_server
+            urls = [srv.url(f"/media/{name}-{i}.m4a") for i in range(args.count)]
+        else:
+            srv = server
+            urls = [srv.url(f"/media/{name}-{i}.mp4") for i in range(args.count)]
+        if name == "autotune":
+            srv = MediaServer(latency=args.latency, rate=args.rate or None, ceiling=args.ceiling,
+                              max_connections=args.max_connections).start()
+            urls = [srv.url(f"/hls/{name}-{i}.m3u8?frags={args.fragments}") for i in range(args.count)]
+        if name == "playlist":
+            urls = [srv.url(f"/playlist.rss?n={args.count}&prefix={name}-")]
+        if name == "faults":
+            urls = [url + ("?fail=1&status=429&retry_after=1" if i % 4 == 1 else "?fail=2" if i % 2 == 0 else "")
+                    for i, url in enumerate(urls)]
+        srv.reset()
+        try:
+            if name in ("cli_batch", "faults"):
+                result, usage, process_s = _spawn_cli(urls, workdir, args.concurrency)
+            elif name == "queue":
+                result, usage, process_s = _spawn_queue(urls, workdir, max(1, args.concurrency // 2), args.workers)
+            elif name == "autotune":
+                # --jobs es el máximo; el autotuner empieza con uno
+                result, usage, process_s = _spawn_cli(urls, workdir, args.concurrency * 4, extra=["--autotune"])
+            else:
+                result, usage, process_s = _spawn_child(name, urls, workdir)
+            summary = summarize(result, srv.requests(), usage, process_s)
+            if name == "queue":
+                summary.update({key: result[key] for key in ("workers", "killed", "recovered", "rejected", "duplicates", "queue")})
+        finally:
+            if srv is not server and srv is not audio_server:
+                srv.stop()
+        if name == "faults":
+            summary["injected_errors"] = sum(1 for req in srv.requests() if req["status"] >= 400)
+        if name == "autotune":
+            decisions = _autotune_decisions(workdir)
+            levels = {}
+            for decision in decisions:
+                levels[decision["kind"]] = decision["to"]
+            summary.update(ceiling_mb_s=round(args.ceiling / 1e6, 3), rejected=sum(1 for req in srv.requests()
+                           if req["status"] == 503), decisions=len(decisions), final_levels=levels)
+        return summary
+
+
+def _lookup(summary: dict, key: str):
+    value = summary
+    for part in key.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regresiones de `report` frente a `baseline` mayores que `tolerance`."""
+    problems = []
+    for name, summary in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        for key, higher_is_better in COMPARED.items():
+            new_value, old_value = _lookup(summary, key), _lookup(old, key)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                problems.append(f"{name}.{key}: {old_value} -> {new_value} ({change:+.0%})")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline download benchmarks (JSON report on stdout)")
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS, help="scenario to run (repeatable; default all)")
+    parser.add_argument("--count", type=int, default=8, help="URLs per scenario")
+    parser.add_argument("--size", type=parse_size, default=parse_size("8M"), help="synthetic file size, e.g. 8M")
+    parser.add_argument("--latency", type=float, default=0.05, help="server delay before the first byte (s)")
+    parser.add_argument("--rate", type=parse_size, default=parse_size("4M"), help="per-connection throttle in bytes/s (0 = off)")
+    parser.add_argument("--no-ranges", action="store_true", help="ignore Range requests")
+    parser.add_argument("--concurrency", type=int, default=4, help="--jobs for the CLI scenario")
+    parser.add_argument("--ceiling", type=parse_size, default=parse_size("16M"),
+                        help="total bytes/s of the autotune scenario's server")
+    parser.add_argument("--max-connections", type=int, default=12,
+                        help="transfers the autotune scenario's server accepts before answering 503")
+    parser.add_argument("--workers", type=int, default=3, help="worker processes in the queue scenario")
+    parser.add_argument("--fragments", type=int, default=24, help="HLS fragments per URL in the autotune scenario")
+    parser.add_argument("--audio-seconds", type=int, default=60, help="length of the generated audio source")
+    parser.add_argument("--out", help="also write the report to this file")
+    parser.add_argument("--baseline", help="previous report; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change against --baseline")
+    # uso interno: ejecución de un escenario en el proceso hijo
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--urls", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.child:
+        return run_child(args)
+    config = {"count": args.count, "size": args.size, "latency": args.latency, "rate": args.rate or None,
+              "ranges": not args.no_ranges, "concurrency": args.concurrency, "ceiling": args.ceiling,
+              "max_connections": args.max_connections}
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "time": time.time(), "config": config},
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="vl-bench-") as tmp:
+        source = _make_audio_source(Path(tmp), args.audio_seconds)
+        server = MediaServer(size=args.size, latency=args.latency, rate=args.rate or None, ranges=not args.no_ranges)
+        audio_server = MediaServer(latency=args.latency, rate=args.rate or None, ranges=not args.no_ranges,
+                                   source=source) if source else None
+        with server:
+            if audio_server is not None:
+                audio_server.start()
+            try:
+                for name in args.scenario or SCENARIOS:
+                    print(f"[bench] {name}...", file=sys.stderr)
+                    report["scenarios"][name] = run_scenario(name, args, server, audio_server)
+            finally:
+                if audio_server is not None:
+                    audio_server.stop()
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for problem in problems:
+            print(f"[bench] regression: {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+"""Configuración común de las pruebas: rutas de importación y servidor de medios local."""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(SRC))
+
+from media_server import MediaServer  # noqa: E402
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture
+def media():
+    """`MediaServer` con rangos, 6 MiB por fichero y sin límites de velocidad."""
+    with MediaServer(size=6 * MiB) as server:
+        yield server
@@ -0,0 +1,359 @@
+"""Servidor HTTP local que imita un CDN de medios, para pruebas sin internet.
+
+Sirve contenido sintético determinista y playlists:
+- `/media/<nombre>.<ext>`: fichero de `size` bytes (o el fichero `source`).
+- `/playlist.rss?n=N&ext=mp4`: feed RSS con N entradas `/media/item<i>.<ext>`
+  (el extractor genérico de yt_dlp lo trata como playlist).
+- `/hls/<nombre>.m3u8?frags=N`: lista HLS de N fragmentos
+  `/hls/<nombre>/<i>.ts` de `size` bytes cada uno (256 KiB por defecto), que
+  yt_dlp descarga con su FragmentFD (`concurrent_fragment_downloads`).
+
+Cada petición admite en la query `size`, `latency` (segundos antes del primer
+byte), `rate` (bytes/s por conexión) y `ranges=0`; sin ellos se usan los
+valores del servidor. `ceiling` (bytes/s) es el ancho de banda total del
+servidor, repartido entre todas las conexiones, y con `max_connections`
+las transferencias que pasen de ese número responden 503 (CDN saturado).
+
+Fallos inyectados, para probar reintentos y cortacircuitos:
+- `fail=N&status=503&retry_after=S`: las N primeras peticiones a esa URL
+  responden con `status` (503 por defecto) y, si se indica, `Retry-After`;
+- `reset=N`: las N primeras cortan la conexión a mitad del cuerpo;
+- `inject(path, ...)` hace lo mismo desde el código, y `down = True` hace que
+  todo `/media/` responda 503 (sitio caído). Se anota cada petición (inicio, primer y último byte,
+bytes enviados) con `time.monotonic()`, que en Linux, macOS y Windows es
+común a todos los procesos, para medir desde fuera TTFB y tiempo de
+transferencia.
+
+    with MediaServer(size=8 << 20, rate=2 << 20) as srv:
+        url = srv.url("/media/a.mp4")
+"""
+import http.server
+import mimetypes
+import random
+import re
+import socket
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+BLOCK_SIZE = 1024 * 1024
+HLS_FRAGMENT_SIZE = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _param(self, query, name, default, cast=float):
+        value = query.get(name, [None])[0]
+        return cast(value) if value not in (None, "") else default
+
+    def _serve(self, body: bool):
+        media: MediaServer = self.server.media
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if parts.path == "/playlist.rss":
+            return self._send_bytes(media.playlist(query), "application/rss+xml", body)
+        if parts.path.startswith("/hls/") and parts.path.endswith(".m3u8"):
+            return self._send_bytes(media.hls_playlist(parts.path, query), "application/vnd.apple.mpegurl", body)
+        if not parts.path.startswith(("/media/", "/hls/")):
+            self.send_error(404)
+            return
+        fault = media._fault(self.path, parts.path, query)
+        if fault is not None and fault["status"]:
+            media._begin(parts.path, fault["status"])
+            return self._send_error(fault["status"], fault["retry_after"], body)
+        size = media.size if media.source is None else media.source_size
+        if parts.path.startswith("/hls/"):
+            size = HLS_FRAGMENT_SIZE
+        size = self._param(query, "size", size, int)
+        latency = self._param(query, "latency", media.latency)
+        rate = self._param(query, "rate", media.rate)
+        ranges = self._param(query, "ranges", media.ranges, lambda v: v not in ("0", "false", "no"))
+
+        start, end, status = 0, size - 1, 200
+        header = self.headers.get("Range")
+        if header and ranges:
+            m = _RANGE_RE.match(header.strip())
+            if m and (m.group(1) or m.group(2)):
+                if m.group(1):
+                    start = int(m.group(1))
+                    end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+                else:
+                    start = max(0, size - int(m.group(2)))
+                if start >= size or start > end:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = 206
+
+        if body and not media._connect():
+            media._begin(parts.path, 503)
+            return self._send_error(503, None, body)
+        try:
+            self._send_body(media, parts.path, fault, status, start, end, size, latency, rate, ranges, body)
+        finally:
+            if body:
+                media._disconnect()
+
+    def _send_body(self, media, path, fault, status, start, end, size, latency, rate, ranges, body):
+        record = media._begin(path, status)
+        if latency:
+            time.sleep(latency)
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        pos = start
+        began = time.monotonic()
+        # con `reset`, cortar tras la mitad del cuerpo
+        cut = start + (end - start + 1) // 2 if fault is not None and fault["reset"] else None
+        try:
+            while pos <= end:
+                if cut is not None and pos >= cut:
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                n = min(CHUNK_SIZE, end - pos + 1)
+                if rate:
+                    # ritmo constante por conexión
+                    delay = began + (pos - start) / rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                media._throttle(n)
+                self.wfile.write(media.read(pos, n))
+                pos += n
+                media._sent(record, n)
+        except (BrokenPipeError, ConnectionResetError):
+            # el cliente cerró (p. ej. yt_dlp solo lee la cabecera al extraer)
+            self.close_connection = True
+
+    def _send_error(self, status: int, retry_after, body: bool):
+        data = f"injected {status}".encode()
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def _send_bytes(self, data: bytes, content_type: str, body: bool):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    media: "MediaServer"
+
+
+class MediaServer:
+    def __init__(self, size: int = 8 * 1024 * 1024, latency: float = 0.0, rate: float | None = None,
+                 ranges: bool = True, source=None, host: str = "127.0.0.1", port: int = 0, seed: int = 0,
+                 ceiling: float | None = None, max_connections: int = 0):
+        self.size = size
+        self.latency = latency
+        self.rate = rate
+        self.ranges = ranges
+        self.ceiling = ceiling
+        self.max_connections = max_connections
+        self._connections = 0
+        # reloj virtual del techo: instante en que queda libre el ancho de banda ya reservado
+        self._ceiling_free = 0.0
+        self.source = Path(source) if source else None
+        self._source_bytes = self.source.read_bytes() if self.source else b""
+        self.source_size = len(self._source_bytes)
+        self._block = random.Random(seed).randbytes(BLOCK_SIZE)
+        self._lock = threading.Lock()
+        self._requests: list[dict] = []
+        self.down = False
+        # clave (ruta, o ruta con query) -> fallos pendientes
+        self._faults: dict[str, dict] = {}
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.media = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def start(self) -> "MediaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="media-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- contenido -----------------------------------------------------
+    def read(self, pos: int, n: int) -> bytes:
+        if self.source is not None:
+            return self._source_bytes[pos:pos + n]
+        out = bytearray()
+        while n > 0:
+            offset = pos % BLOCK_SIZE
+            take = min(n, BLOCK_SIZE - offset)
+            out += self._block[offset:offset + take]
+            pos += take
+            n -= take
+        return bytes(out)
+
+    def playlist(self, query) -> bytes:
+        count = int(query.get("n", ["10"])[0])
+        ext = query.get("ext", ["mp4"])[0]
+        prefix = query.get("prefix", ["item"])[0]
+        extra = "&".join(f"{k}={v[0]}" for k, v in query.items() if k in ("size", "latency", "rate", "ranges"))
+        items = []
+        for i in range(count):
+            link = self.url(f"/media/{prefix}{i}.{ext}") + (f"?{extra}" if extra else "")
+            items.append(
+                f"<item><title>{prefix}{i}</title><link>{link}</link><guid>{prefix}{i}</guid>"
+                f'<enclosure url="{link}" type="{mimetypes.guess_type("x." + ext)[0]}"/></item>'
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f"<title>bench</title><link>{self.base_url}</link>{''.join(items)}</channel></rss>"
+        ).replace("&", "&amp;").encode()
+
+    def hls_playlist(self, path: str, query) -> bytes:
+        count = int(query.get("frags", ["16"])[0])
+        extra = "&".join(f"{k}={v[0]}" for k, v in query.items() if k in ("size", "latency", "rate", "fail", "status"))
+        base = path[:-len(".m3u8")]
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for i in range(count):
+            lines += ["#EXTINF:2.0,", self.url(f"{base}/{i}.ts") + (f"?{extra}" if extra else "")]
+        lines.append("#EXT-X-ENDLIST")
+        return ("\n".join(lines) + "\n").encode()
+
+    # ---- ancho de banda ------------------------------------------------
+    def _connect(self) -> bool:
+        with self._lock:
+            if self.max_connections and self._connections >= self.max_connections:
+                return False
+            self._connections += 1
+            return True
+
+    def _disconnect(self):
+        with self._lock:
+            self._connections -= 1
+
+    def _throttle(self, n: int):
+        """Esperar a que el techo global deje pasar `n` bytes más."""
+        if not self.ceiling:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._ceiling_free)
+            self._ceiling_free = start + n / self.ceiling
+        if start > now:
+            time.sleep(start - now)
+
+    # ---- fallos inyectados ---------------------------------------------
+    def inject(self, path: str, count: int = 1, status: int | None = 503, retry_after=None, reset: bool = False):
+        """Hacer fallar las `count` próximas peticiones a `path` (con `reset`, cortando la conexión)."""
+        with self._lock:
+            self._faults[path] = {"left": count, "status": None if reset else status,
+                                  "retry_after": retry_after, "reset": reset}
+
+    def _fault(self, full_path: str, path: str, query) -> dict | None:
+        with self._lock:
+            if self.down:
+                return {"status": 503, "retry_after": None, "reset": False}
+            if full_path not in self._faults and ("fail" in query or "reset" in query):
+                # fallos pedidos en la query: se cuentan por URL completa
+                reset = "reset" in query
+                self._faults[full_path] = {
+                    "left": int(query.get("reset" if reset else "fail")[0]),
+                    "status": None if reset else int(query.get("status", ["503"])[0]),
+                    "retry_after": query.get("retry_after", [None])[0],
+                    "reset": reset,
+                }
+            fault = self._faults.get(full_path) or self._faults.get(path)
+            if fault is None or fault["left"] <= 0:
+                return None
+            fault["left"] -= 1
+            return fault
+
+    # ---- estadísticas --------------------------------------------------
+    def _begin(self, path: str, status: int = 200) -> dict:
+        record = {"path": path, "status": status, "start": time.monotonic(), "first_byte": None, "last_byte": None,
+                  "bytes": 0}
+        with self._lock:
+            self._requests.append(record)
+        return record
+
+    def _sent(self, record: dict, n: int):
+        now = time.monotonic()
+        with self._lock:
+            if record["first_byte"] is None:
+                record["first_byte"] = now
+            record["last_byte"] = now
+            record["bytes"] += n
+
+    def requests(self, path: str | None = None) -> list[dict]:
+        with self._lock:
+            return [dict(r) for r in self._requests if path is None or r["path"] == path]
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve synthetic media for offline tests")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, help="bytes/s per connection")
+    parser.add_argument("--no-ranges", action="store_true")
+    parser.add_argument("--ceiling", type=float, help="total bytes/s for the whole server")
+    parser.add_argument("--max-connections", type=int, default=0, help="answer 503 above this many transfers")
+    args = parser.parse_args()
+    server = MediaServer(size=args.size, latency=args.latency, rate=args.rate, ranges=not args.no_ranges, port=args.port,
+                         ceiling=args.ceiling, max_connections=args.max_connections)
+    print(f"Serving on {server.base_url}  (try {server.url('/media/a.mp4')} or {server.url('/playlist.rss?n=5')})")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,91 @@
+"""Archivo de descargas (`app/core/archive.py`): solo se omite lo mismo, en la misma carpeta."""
+import sqlite3
+
+import pytest
+
+from app.core.archive import DownloadArchive
+from app.core.jobs import DownloadJob
+
+pytest.importorskip("yt_dlp")
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = DownloadArchive(tmp_path / "archive.sqlite3")
+    yield archive
+    archive.close()
+
+
+def media_file(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"media")
+    return path
+
+
+def test_job_profile():
+    assert DownloadJob(url=URL).profile == "best"
+    assert DownloadJob(url=URL, quality="720p").profile == "720p"
+    assert DownloadJob(url=URL, quality="Maximum Quality").profile == "best"
+    assert DownloadJob(url=URL, is_video=False, audio_format="m4a").profile == "m4a"
+    assert DownloadJob(url=URL, options={"format": "18"}).profile == "format:18"
+
+
+def test_job_output_dir(tmp_path):
+    assert DownloadJob(url=URL, download_dir=str(tmp_path)).output_dir() == tmp_path
+    job = DownloadJob(url=URL, options={"outtmpl": str(tmp_path / "%(uploader)s" / "%(title)s.%(ext)s")})
+    assert job.output_dir() == tmp_path
+
+
+def test_other_quality_or_audio_format_is_not_skipped(archive, tmp_path):
+    video = media_file(tmp_path / "a" / "video.mp4")
+    song = media_file(tmp_path / "a" / "song.mp3")
+    archive.add("Youtube", "dQw4w9WgXcQ", "video", str(video), profile="720p")
+    archive.add("Youtube", "dQw4w9WgXcQ", "audio", str(song), profile="mp3")
+
+    assert archive.find_url(URL, "video", "720p")["path"] == str(video)
+    assert archive.find_url(URL, "video", "best") is None
+    assert archive.find_url(URL, "audio", "mp3")["path"] == str(song)
+    assert archive.find_url(URL, "audio", "m4a") is None
+
+
+def test_other_folder_is_not_skipped(archive, tmp_path):
+    video = media_file(tmp_path / "a" / "video.mp4")
+    archive.add("Youtube", "dQw4w9WgXcQ", "video", str(video), profile="best")
+    assert archive.find_url(URL, "video", "best", tmp_path / "a") is not None
+    assert archive.find_url(URL, "video", "best", tmp_path / "b") is None
+    # la entrada sigue ahí para la carpeta original
+    assert len(archive) == 1
+
+
+def test_missing_file_is_forgotten(archive, tmp_path):
+    archive.add("Youtube", "dQw4w9WgXcQ", "video", str(tmp_path / "gone.mp4"), profile="best")
+    assert archive.find_url(URL, "video", "best") is None
+    assert len(archive) == 0
+
+
+def test_old_archive_is_migrated_without_profile(tmp_path):
+    path = tmp_path / "archive.sqlite3"
+    video = media_file(tmp_path / "video.mp4")
+    with sqlite3.connect(str(path)) as db:
+        db.execute("CREATE TABLE items (extractor TEXT NOT NULL, video_id TEXT NOT NULL, kind TEXT NOT NULL,"
+                   " path TEXT NOT NULL, size INTEGER, format TEXT, downloaded REAL NOT NULL,"
+                   " PRIMARY KEY (extractor, video_id, kind))")
+        db.execute("INSERT INTO items VALUES ('youtube', 'dQw4w9WgXcQ', 'video', ?, 5, '137+140', 0)", (str(video),))
+    archive = DownloadArchive(path)
+    try:
+        assert len(archive) == 1
+        # no se sabe qué calidad se pidió: no basta para omitir
+        assert archive.find_url(URL, "video", "best") is None
+        assert archive.lookup("Youtube", "dQw4w9WgXcQ", "video", "")["format"] == "137+140"
+    finally:
+        archive.close()
+
+
+def test_rebuild_records_audio_format_from_extension(archive, tmp_path):
+    song = media_file(tmp_path / "lib" / "song.m4a")
+    song.with_suffix(".info.json").write_text('{"extractor_key": "Youtube", "id": "dQw4w9WgXcQ"}')
+    assert archive.rebuild(tmp_path / "lib") == 1
+    assert archive.find_url(URL, "audio", "m4a", tmp_path / "lib") is not None
+    assert archive.find_url(URL, "audio", "mp3") is None
@@ -0,0 +1,87 @@
+"""Autotuner AIMD (`app/core/autotune.py`): baja con errores y no pasa del techo."""
+import time
+import urllib.request
+
+from app.core.autotune import AIMD, Autotuner
+from app.core.manager import DownloadManager
+from app.core.retry import CircuitBreaker, RetryPolicy
+from media_server import MediaServer
+
+
+def test_errors_decrease_multiplicatively_down_to_low():
+    ctl = AIMD(1, 16, start=8)
+    assert ctl.update(100.0, congested=True) == "errors"
+    assert ctl.level == 6
+    for _ in range(10):
+        ctl.update(100.0, congested=True)
+    assert ctl.level == 1
+
+
+def test_increase_stops_at_high():
+    ctl = AIMD(1, 4, start=1, hold=0)
+    rate = 100.0
+    for _ in range(20):
+        ctl.update(rate)
+        # cada paso rinde: el caudal sube con el nivel
+        rate *= 2
+        assert ctl.level <= 4
+    assert ctl.level == 4
+
+
+def test_plateau_undoes_the_step_and_holds():
+    ctl = AIMD(1, 16, start=4, hold=2)
+    assert ctl.update(100.0) == "increase" and ctl.level == 5
+    assert ctl.update(104.0) == "plateau" and ctl.level == 4
+    # en espera: no vuelve a probar enseguida
+    assert ctl.update(104.0) is None and ctl.update(104.0) is None and ctl.level == 4
+    assert ctl.update(104.0) == "increase"
+
+
+def test_settles_under_a_connection_ceiling():
+    # modelo de un servidor que admite 5 conexiones: por encima, sin caudal extra y con errores
+    ceiling = 5
+    ctl = AIMD(1, 16, start=1, hold=2)
+    levels = []
+    for _ in range(60):
+        level = ctl.level
+        ctl.update(min(level, ceiling) * 1e6, congested=level > ceiling)
+        levels.append(ctl.level)
+    assert max(levels) <= ceiling + 1
+    assert all(ceiling - 2 <= level <= ceiling + 1 for level in levels[-20:])
+
+
+def test_per_host_levels_drop_on_retries():
+    tuner = Autotuner(fragments=(1, 8))
+    assert tuner.level("cdn.example", "segments", 4) == 4
+    tuner.observe("cdn.example", "segments", 4, 8 << 20, 1.0, errors=2)
+    assert tuner.level("cdn.example", "segments", 4) == 3
+    assert tuner.level("other.example", "segments", 4) == 4
+    # una medida tomada con un nivel que ya cambió no cuenta
+    tuner.observe("cdn.example", "segments", 4, 8 << 20, 1.0, errors=2)
+    assert tuner.level("cdn.example", "segments", 4) == 3
+    assert [d["reason"] for d in tuner.decisions()] == ["errors"]
+
+
+def test_job_level_drops_when_server_rejects_connections():
+    with MediaServer(size=512 * 1024, rate=1024 * 1024, max_connections=2) as media:
+        def runner(job, emit):
+            urllib.request.urlopen(job.url, timeout=5).read()
+
+        manager = DownloadManager(max_workers=4, runner=runner, defer_postprocess=False, host_limit=0,
+                                  retry=RetryPolicy(max_attempts=50, base=0.01, max_delay=0.05),
+                                  breaker=CircuitBreaker(threshold=1000))
+        # sin hilo de medidas: los ajustes se piden a mano con `tick`
+        tuner = Autotuner(interval=3600)
+        tuner.attach(manager, 1, 6)
+        try:
+            for i in range(12):
+                manager.submit(url=media.url(f"/media/item{i}.mp4"))
+            time.sleep(0.6)
+            tuner.tick(0.6)
+            assert manager.max_workers < 4
+            assert tuner.decisions()[-1]["reason"] == "errors"
+            manager.wait()
+        finally:
+            tuner.detach()
+            manager.shutdown()
+        assert all(d["to"] <= 6 for d in tuner.decisions())
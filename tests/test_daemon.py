@@ -0,0 +1,115 @@
+"""Comprobaciones de acceso del demonio (`app/core/daemon.py`) con peticiones HTTP crudas."""
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+
+from app.core.daemon import DaemonServer
+from app.core.engine import DownloadEngine
+
+
+def runner(job, emit):
+    return {"title": "ok"}
+
+
+class Daemon:
+    """`DaemonServer` en su propio bucle, en un hilo."""
+
+    def __init__(self, token=None):
+        self.engine = DownloadEngine(max_workers=1, runner=runner, defer_postprocess=False)
+        self.server = DaemonServer(self.engine, host="127.0.0.1", port=0, token=token, discovery=False)
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.server.start())
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, headers=None, body=b""):
+        headers = {"Host": f"127.0.0.1:{self.server.port}", **(headers or {})}
+        if body and "Content-Length" not in headers:
+            headers["Content-Length"] = str(len(body))
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        with socket.create_connection(("127.0.0.1", self.server.port), timeout=5) as sock:
+            sock.sendall(head.encode("latin-1") + body)
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+        head, _, payload = data.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(payload) if payload else None
+
+    def post(self, path, payload, headers=None):
+        return self.request("POST", path, {"Content-Type": "application/json", **(headers or {})},
+                            json.dumps(payload).encode())
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.engine.close()
+
+
+@pytest.fixture
+def daemon():
+    daemon = Daemon()
+    yield daemon
+    daemon.close()
+
+
+@pytest.fixture
+def daemon_with_token():
+    daemon = Daemon(token="s3cret")
+    yield daemon
+    daemon.close()
+
+
+def test_local_request_is_served(daemon):
+    status, body = daemon.request("GET", "/api/health")
+    assert status == 200 and body["status"] == "ok"
+    assert daemon.request("GET", "/api/health", {"Host": "localhost"})[0] == 200
+
+
+def test_non_local_host_header_is_rejected(daemon):
+    # DNS rebinding: un dominio ajeno que resuelve a 127.0.0.1
+    status, body = daemon.request("GET", "/api/health", {"Host": "evil.example:8765"})
+    assert status == 403 and "Host" in body["error"]
+    assert daemon.request("GET", "/api/health", {"Host": ""})[0] == 403
+
+
+def test_token_required_outside_localhost(daemon):
+    with pytest.raises(ValueError):
+        DaemonServer(daemon.engine, host="0.0.0.0", port=0, discovery=False)
+    DaemonServer(daemon.engine, host="0.0.0.0", port=0, token="s3cret", discovery=False)
+
+
+def test_token_is_checked(daemon_with_token):
+    assert daemon_with_token.request("GET", "/api/health")[0] == 401
+    assert daemon_with_token.request("GET", "/api/health", {"Authorization": "Bearer wrong"})[0] == 401
+    assert daemon_with_token.request("GET", "/api/health", {"Authorization": "Bearer s3cret"})[0] == 200
+
+
+def test_body_must_be_json(daemon):
+    body = json.dumps({"url": "https://example.com/a.mp4"}).encode()
+    # lo que puede enviar un formulario sin consulta CORS
+    status, _ = daemon.request("POST", "/api/jobs", {"Content-Type": "text/plain"}, body)
+    assert status == 415
+    assert daemon.request("POST", "/api/jobs", {}, body)[0] == 415
+    assert daemon.post("/api/jobs", {"url": "https://example.com/a.mp4"})[0] == 201
+
+
+def test_only_allowed_options_are_accepted(daemon):
+    status, body = daemon.post("/api/jobs", {"url": "https://example.com/a.mp4",
+                                             "options": {"exec": "rm -rf ~", "format": "best"}})
+    assert status == 400 and "exec" in body["error"]
+    status, _ = daemon.post("/api/jobs", {"url": "https://example.com/b.mp4",
+                                          "options": {"postprocessors": [{"key": "Exec"}]}})
+    assert status == 400
+    status, body = daemon.post("/api/jobs", {"url": "https://example.com/c.mp4", "options": {"format": "best"}})
+    assert status == 201 and body["url"] == "https://example.com/c.mp4"
+
+
+@pytest.mark.parametrize("length", ["abc", "-1"])
+def test_bad_content_length(daemon, length):
+    status, body = daemon.request("POST", "/api/jobs", {"Content-Type": "application/json", "Content-Length": length})
+    assert status == 400 and body["error"] == "bad Content-Length"
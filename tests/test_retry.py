@@ -0,0 +1,184 @@
+"""Reintentos y cortacircuitos (`app/core/retry.py`), con fallos inyectados en el servidor de medios."""
+import random
+import urllib.error
+import urllib.request
+from email.utils import formatdate
+
+import pytest
+
+from app.core.jobs import DownloadJob, JobCancelled, JobState
+from app.core.manager import DownloadManager
+from app.core.retry import PROBE_POLL, CircuitBreaker, Failure, RetryPolicy, classify, parse_retry_after
+
+
+def http_error(media, path: str) -> urllib.error.HTTPError:
+    with pytest.raises(urllib.error.HTTPError) as info:
+        urllib.request.urlopen(media.url(path), timeout=5).read()
+    return info.value
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# ---- classify -----------------------------------------------------------
+def test_classify_server_error_with_retry_after(media):
+    failure = classify(http_error(media, "/media/a.mp4?fail=1&status=503&retry_after=3"))
+    assert failure.retryable and failure.status == 503 and failure.retry_after == 3.0
+    # el fallo inyectado era solo para la primera petición
+    assert urllib.request.urlopen(media.url("/media/a.mp4?fail=1&status=503&retry_after=3"), timeout=5).status == 200
+
+
+def test_classify_client_error_is_final(media):
+    failure = classify(http_error(media, "/media/b.mp4?fail=1&status=404"))
+    assert not failure.retryable and failure.status == 404
+
+
+def test_classify_rate_limit_and_wrapped_errors():
+    assert classify(Exception("ERROR: unable to download video data: HTTP Error 429: Too Many Requests")).retryable
+    try:
+        try:
+            raise ConnectionResetError("reset by peer")
+        except ConnectionResetError as exc:
+            raise RuntimeError("download failed") from exc
+    except RuntimeError as wrapped:
+        failure = classify(wrapped)
+    assert failure.retryable and failure.reason == "network"
+    assert not classify(JobCancelled("cancelled")).retryable
+    assert not classify(ValueError("Unsupported URL")).retryable
+
+
+def test_parse_retry_after_seconds_and_date():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(formatdate(1030.0, usegmt=True), now=1000.0) == pytest.approx(30.0)
+    assert parse_retry_after("soon") is None
+
+
+def test_classify_uses_failure_sent_by_worker_process():
+    from app.core.procpool import RemoteJobError
+
+    failure = classify(RemoteJobError("HTTP Error 503", Failure(True, 503, 7.0, "HTTP 503")))
+    assert failure.retryable and failure.retry_after == 7.0
+    # sin clasificación del hijo, solo queda el mensaje
+    assert classify(RemoteJobError("HTTP Error 503")).retry_after is None
+
+
+def test_worker_process_reports_retry_after(media, tmp_path):
+    pytest.importorskip("yt_dlp")
+    from app.core.procpool import JOB_FIELDS, _run_in_child
+
+    job = DownloadJob(url=media.url("/media/e.mp4?fail=5&status=503&retry_after=7"), download_dir=str(tmp_path),
+                      use_cache=False, use_archive=False)
+    sent = []
+    # lo que haría el proceso hijo, en este mismo proceso
+    _run_in_child({"job": {f: getattr(job, f) for f in JOB_FIELDS}}, sent.append)
+    done = sent[-1]
+    assert done["op"] == "done" and not done["ok"]
+    assert done["failure"] == {"retryable": True, "status": 503, "retry_after": 7.0, "reason": "HTTP 503"}
+
+
+# ---- RetryPolicy --------------------------------------------------------
+def test_delay_is_bounded_and_honours_retry_after():
+    policy = RetryPolicy(base=1.0, factor=2.0, max_delay=8.0, max_retry_after=60.0, rng=random.Random(1))
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt) <= min(8.0, 2 ** (attempt - 1))
+    assert policy.delay(1, retry_after=30) >= 30
+    assert policy.delay(1, retry_after=600) <= 60.0
+
+
+def test_should_retry_counts_attempts():
+    policy = RetryPolicy(max_attempts=3)
+    transient = Failure(True, 503)
+    assert policy.should_retry(transient, 2) and not policy.should_retry(transient, 3)
+    assert not policy.should_retry(Failure(False, 404), 1)
+
+
+def test_manager_requeues_transient_failures(media):
+    url = media.url("/media/c.mp4?fail=2&status=503")
+
+    def runner(job, emit):
+        urllib.request.urlopen(job.url, timeout=5).read()
+
+    manager = DownloadManager(max_workers=1, runner=runner, defer_postprocess=False,
+                              retry=RetryPolicy(base=0.01, max_delay=0.05), breaker=CircuitBreaker())
+    try:
+        job_id = manager.submit(url=url)
+        job = manager.wait_job(job_id, timeout=10)
+    finally:
+        manager.shutdown()
+    assert job.state == JobState.DONE and job.attempts == 3
+    assert [r["status"] for r in media.requests("/media/c.mp4")] == [503, 503, 200]
+
+
+# ---- CircuitBreaker -----------------------------------------------------
+def test_breaker_opens_after_threshold_and_probes_after_cooldown():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=3, cooldown=10.0, clock=clock)
+    transient = Failure(True, 503)
+    for _ in range(2):
+        breaker.record("example.com", transient)
+    assert breaker.state("example.com") == CircuitBreaker.CLOSED
+    breaker.record("example.com", transient)
+    assert breaker.state("example.com") == CircuitBreaker.OPEN
+    assert breaker.retry_in("example.com") == pytest.approx(10.0)
+    assert breaker.retry_in("other.org") == 0.0
+
+    clock.now += 10.0
+    assert breaker.retry_in("example.com") == 0.0
+    breaker.started("example.com")
+    assert breaker.state("example.com") == CircuitBreaker.HALF_OPEN
+    # solo pasa el trabajo de prueba
+    assert breaker.retry_in("example.com") == PROBE_POLL
+
+    # la prueba falla: la pausa se duplica
+    breaker.record("example.com", transient)
+    assert breaker.state("example.com") == CircuitBreaker.OPEN
+    assert breaker.retry_in("example.com") == pytest.approx(20.0)
+
+    clock.now += 20.0
+    breaker.started("example.com")
+    breaker.success("example.com")
+    assert breaker.state("example.com") == CircuitBreaker.CLOSED
+
+
+def test_breaker_ignores_final_errors_and_gives_up():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=1, cooldown=1.0, max_trips=2, clock=clock)
+    breaker.record("example.com", Failure(False, 404))
+    assert breaker.state("example.com") == CircuitBreaker.CLOSED
+
+    breaker.record("example.com", Failure(True, 503))
+    assert not breaker.gave_up("example.com")
+    clock.now += 1.0
+    breaker.started("example.com")
+    breaker.record("example.com", Failure(True, 503))
+    assert breaker.trips("example.com") == 2 and breaker.gave_up("example.com")
+
+
+def test_final_error_does_not_close_an_open_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=2, cooldown=10.0, clock=clock)
+    for _ in range(2):
+        breaker.record("example.com", Failure(True, 503))
+    # un fallo de ffmpeg de un trabajo que ya estaba en curso
+    breaker.record("example.com", Failure(False))
+    assert breaker.state("example.com") == CircuitBreaker.OPEN
+    assert breaker.retry_in("example.com") == pytest.approx(10.0)
+
+    clock.now += 10.0
+    breaker.started("example.com")
+    breaker.record("example.com", Failure(False))
+    # la prueba no dijo nada: sigue semiabierto y otro trabajo puede probar
+    assert breaker.state("example.com") == CircuitBreaker.HALF_OPEN
+    assert breaker.retry_in("example.com") == 0.0 and breaker.trips("example.com") == 1
+
+    # con el circuito cerrado, sí borra los fallos acumulados
+    breaker.success("example.com")
+    breaker.record("example.com", Failure(True, 503))
+    breaker.record("example.com", Failure(False, 404))
+    breaker.record("example.com", Failure(True, 503))
+    assert breaker.state("example.com") == CircuitBreaker.CLOSED
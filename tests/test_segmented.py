@@ -0,0 +1,98 @@
+"""Descarga segmentada (`app/core/segmented.py`) contra el servidor de medios local."""
+import hashlib
+import os
+
+import pytest
+
+from conftest import MiB
+from app.core.segmented import DownloadAborted, RangeNotSupported, SegmentedDownload, split_ranges
+
+
+def expected(media, size=6 * MiB) -> bytes:
+    return media.read(0, size)
+
+
+def test_split_ranges_cover_the_file():
+    ranges = split_ranges(10 * MiB, 4, min_size=MiB)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == 10 * MiB - 1
+    assert all(prev[1] + 1 == nxt[0] for prev, nxt in zip(ranges, ranges[1:]))
+
+
+def test_split_ranges_small_and_empty_files():
+    assert split_ranges(MiB, 8, min_size=2 * MiB) == [(0, MiB - 1)]
+    assert split_ranges(0, 4) == [(0, -1)]
+
+
+def test_segmented_download_matches_source_and_digest(media, tmp_path):
+    dest = str(tmp_path / "a.mp4")
+    events = []
+    download = SegmentedDownload(media.url("/media/a.mp4"), dest, segments=3, min_segment_size=MiB,
+                                 checksum="sha256", progress=events.append)
+    assert download.run() == dest
+
+    data = expected(media)
+    with open(dest, "rb") as f:
+        assert f.read() == data
+    assert not os.path.exists(dest + ".part") and not os.path.exists(dest + ".part.seg")
+    finished = [e for e in events if e["status"] == "finished"]
+    assert finished and finished[-1]["digest"] == "sha256:" + hashlib.sha256(data).hexdigest()
+    # sonda de 1 byte y una petición por segmento
+    ranged = [r for r in media.requests("/media/a.mp4") if r["status"] == 206]
+    assert len(ranged) == 4
+
+
+def test_server_without_ranges_is_rejected(media, tmp_path):
+    dest = str(tmp_path / "b.mp4")
+    download = SegmentedDownload(media.url("/media/b.mp4?ranges=0"), dest, segments=3, min_segment_size=MiB)
+    with pytest.raises(RangeNotSupported):
+        download.run()
+    download.discard()
+    assert not os.path.exists(dest + ".part")
+
+
+def test_ydl_falls_back_to_single_connection(media, tmp_path):
+    pytest.importorskip("yt_dlp")
+    from app.core.segmented import ydl_class
+
+    messages = []
+
+    class Logger:
+        def debug(self, msg):
+            messages.append(msg)
+        info = warning = error = debug
+
+    opts = {"segments": 4, "logger": Logger(), "outtmpl": str(tmp_path / "%(title)s.%(ext)s")}
+    with ydl_class()(opts) as ydl:
+        info = ydl.extract_info(media.url("/media/c.mp4?ranges=0"))
+    path = info["requested_downloads"][0]["filepath"]
+    with open(path, "rb") as f:
+        assert f.read() == expected(media)
+    assert any("falling back to a single connection" in m for m in messages)
+
+
+def test_interrupted_download_resumes_from_state_file(media, tmp_path):
+    url = media.url(f"/media/d.mp4?rate={MiB}")
+    dest = str(tmp_path / "d.mp4")
+
+    first = SegmentedDownload(url, dest, segments=3, min_segment_size=MiB, checksum="sha256")
+    first.progress = lambda d: first.abort() if d["downloaded_bytes"] >= MiB else None
+    with pytest.raises(DownloadAborted):
+        first.run()
+    assert os.path.exists(dest + ".part.seg")
+    done_before = first.downloaded
+    assert 0 < done_before < 6 * MiB
+
+    media.reset()
+    second = SegmentedDownload(url, dest, segments=3, min_segment_size=MiB, checksum="sha256")
+    events = []
+    second.progress = events.append
+    second.run()
+
+    data = expected(media)
+    with open(dest, "rb") as f:
+        assert f.read() == data
+    # solo se pide lo que faltaba (más la sonda)
+    fetched = sum(r["bytes"] for r in media.requests("/media/d.mp4"))
+    assert fetched <= 6 * MiB - done_before + 1
+    assert events[-1]["digest"] == "sha256:" + hashlib.sha256(data).hexdigest()
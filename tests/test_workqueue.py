@@ -0,0 +1,157 @@
+"""Cola compartida con arrendamientos (`app/core/workqueue.py`)."""
+import sqlite3
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from app.core.jobs import DownloadJob, JobCancelled, JobState
+from app.core.manager import DownloadManager
+from app.core.procpool import make_runner
+from app.core.workqueue import QueueWorker, SQLiteJobQueue
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return tmp_path / "queue.sqlite3"
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class Runner:
+    """Runner en hilos que se puede cancelar, como `ProcessBackend`, para `QueueWorker`."""
+
+    def __init__(self):
+        self.cancelled = set()
+
+    def __call__(self, job, emit):
+        with urllib.request.urlopen(job.url, timeout=5) as resp:
+            while resp.read(64 * 1024):
+                if job.id in self.cancelled:
+                    raise JobCancelled("cancelled")
+
+    def cancel(self, job_id):
+        self.cancelled.add(job_id)
+        return True
+
+
+# ---- SQLiteJobQueue -----------------------------------------------------
+def test_put_is_idempotent(queue_path):
+    queue = SQLiteJobQueue(queue_path)
+    job = DownloadJob(url="http://example.com/a.mp4")
+    assert queue.put(job) and not queue.put(job)
+    assert queue.counts() == {JobState.QUEUED: 1}
+
+
+def test_expired_lease_is_requeued_with_new_token(queue_path):
+    a, b = SQLiteJobQueue(queue_path), SQLiteJobQueue(queue_path)
+    job = DownloadJob(url="http://example.com/a.mp4")
+    a.put(job)
+    first = a.claim("worker-a", lease=0.05)
+    assert first.job.id == job.id and first.attempts == 1
+    assert b.claim("worker-b", lease=5) is None
+
+    time.sleep(0.1)
+    second = b.claim("worker-b", lease=5)
+    assert second is not None and second.job.id == job.id
+    assert second.attempts == 2 and second.token != first.token
+    assert b.get(job.id)["owner"] == "worker-b"
+
+
+def test_stale_token_cannot_heartbeat_or_complete(queue_path):
+    a, b = SQLiteJobQueue(queue_path), SQLiteJobQueue(queue_path)
+    a.put(DownloadJob(url="http://example.com/a.mp4"))
+    stale = a.claim("worker-a", lease=0.05)
+    time.sleep(0.1)
+    current = b.claim("worker-b", lease=5)
+
+    assert not a.heartbeat(stale)
+    assert not a.complete(stale, JobState.DONE, result={"file": "stale"})
+    assert b.heartbeat(current)
+    assert b.complete(current, JobState.DONE, result={"file": "fresh"})
+    rec = b.get(current.job.id)
+    assert rec["state"] == JobState.DONE and rec["result"] == {"file": "fresh"}
+    # cerrar dos veces tampoco vale
+    assert not b.complete(current, JobState.FAILED)
+
+
+def test_max_attempts_marks_job_failed(queue_path):
+    queue = SQLiteJobQueue(queue_path, max_attempts=2)
+    job = DownloadJob(url="http://example.com/a.mp4")
+    queue.put(job)
+    for _ in range(2):
+        assert queue.claim("worker", lease=0.05) is not None
+        time.sleep(0.1)
+    assert queue.claim("worker", lease=0.05) is None
+    rec = queue.get(job.id)
+    assert rec["state"] == JobState.FAILED and "lease expired" in rec["error"]
+
+
+def test_release_does_not_spend_an_attempt(queue_path):
+    queue = SQLiteJobQueue(queue_path, max_attempts=1)
+    queue.put(DownloadJob(url="http://example.com/a.mp4"))
+    lease = queue.claim("worker", lease=5)
+    assert queue.release(lease)
+    again = queue.claim("worker", lease=5)
+    assert again is not None and again.attempts == 1
+
+
+# ---- QueueWorker ----------------------------------------------------------
+def test_worker_refuses_runner_that_cannot_cancel(queue_path):
+    manager = DownloadManager(runner=make_runner("thread"))
+    try:
+        with pytest.raises(ValueError):
+            QueueWorker(SQLiteJobQueue(queue_path), manager)
+    finally:
+        manager.shutdown()
+
+
+def test_worker_drains_queue(media, queue_path):
+    queue = SQLiteJobQueue(queue_path)
+    for i in range(3):
+        queue.put(DownloadJob(url=media.url(f"/media/item{i}.mp4")))
+    finished = []
+    manager = DownloadManager(max_workers=2, runner=Runner(), defer_postprocess=False)
+    worker = QueueWorker(queue, manager, name="w1", lease=5, poll=0.05,
+                         on_finished=lambda lease, accepted: finished.append((lease.job.state, accepted)))
+    try:
+        worker.run(drain=True)
+    finally:
+        manager.shutdown()
+    assert sorted(finished) == [(JobState.DONE, True)] * 3
+    assert queue.counts() == {JobState.DONE: 3}
+
+
+def test_worker_cancels_download_when_lease_is_lost(media, queue_path):
+    queue = SQLiteJobQueue(queue_path)
+    job = DownloadJob(url=media.url("/media/slow.mp4?rate=262144"))
+    queue.put(job)
+    finished = []
+    runner = Runner()
+    manager = DownloadManager(max_workers=1, runner=runner, defer_postprocess=False)
+    worker = QueueWorker(queue, manager, name="w1", lease=0.6, poll=0.05,
+                         on_finished=lambda lease, accepted: finished.append((lease.job.state, accepted)))
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    try:
+        assert wait_until(lambda: manager.get(job.id) is not None and manager.get(job.id).state == JobState.RUNNING)
+        # otro worker se queda el trabajo: el token vigente ya no es el de w1
+        with sqlite3.connect(str(queue_path)) as db:
+            db.execute("UPDATE jobs SET token='other', owner='w2' WHERE id=?", (job.id,))
+        assert wait_until(lambda: job.id in runner.cancelled)
+        assert wait_until(lambda: manager.get(job.id).state == JobState.CANCELLED)
+    finally:
+        worker.stop()
+        thread.join(5)
+        manager.shutdown()
+    # su resultado no llega a la cola: el trabajo sigue siendo de w2
+    assert finished == []
+    assert queue.get(job.id)["owner"] == "w2"